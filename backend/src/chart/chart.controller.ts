@@ -1,5 +1,6 @@
 import { Controller, Get, Query, BadRequestException } from '@nestjs/common';
 import { getPool } from '../db';
+import { decodeSketch, emptySketch, mergeSketch, sketchQuantile } from './quantile-sketch';
 
 type AptPriceRow = {
   deal_year: number;
@@ -8,6 +9,26 @@ type AptPriceRow = {
   cnt: number;
 };
 
+type PriceIndexRow = {
+  method: string;
+  start_ym: string;
+  idx: (number | null)[];
+  cnt: number[];
+};
+
+type PriceSketchRow = {
+  metric: string;
+  sketch: Buffer;
+};
+
+const SKETCH_METRICS = ['sale', 'jeonse', 'deposit', 'monthly'];
+
+function addMonths(ym: string, n: number): string {
+  const y = Number(ym.slice(0, 4));
+  const m = Number(ym.slice(4, 6)) - 1 + n;
+  return String(y + Math.floor(m / 12)) + String((m % 12) + 1).padStart(2, '0');
+}
+
 @Controller('api/chart')
 export class ChartController {
   @Get('apt-price')
@@ -113,4 +134,83 @@ export class ChartController {
       })),
     };
   }
+
+  // ✅ 지역 가격지수 (ETL build_price_index.py, 반복매매 / 헤도닉)
+  @Get('region-index')
+  async regionIndex(@Query('lawdCd') lawdCd: string, @Query('umdNm') umdNm?: string) {
+    if (!lawdCd) throw new BadRequestException('lawdCd is required');
+
+    const pool = getPool();
+    const umd = (umdNm ?? '').trim();
+
+    const sql = `
+      SELECT method, start_ym, idx, cnt
+      FROM apt_price_index
+      WHERE level = $1 AND lawd_cd = $2 AND umd_nm = $3;
+    `;
+
+    const { rows } = await pool.query<PriceIndexRow>(sql, [umd ? 'umd' : 'sgg', lawdCd, umd]);
+    const r = rows[0];
+    if (!r) return { ok: true, method: null, series: [] };
+
+    return {
+      ok: true,
+      method: r.method,
+      series: r.idx.map((v, i) => ({
+        ym: addMonths(String(r.start_ym), i),
+        index: v === null ? null : Number(v),
+        cnt: Number(r.cnt[i] ?? 0),
+      })),
+    };
+  }
+
+  // ✅ 단지 임의 기간 분위수 (ETL build_price_sketch.py 월별 스케치 병합, 상대 오차 1%)
+  // areaBucket 생략 시 면적대 전체, fromYm/toYm 은 YYYYMM (포함)
+  @Get('complex-quantiles')
+  async complexQuantiles(
+    @Query('lawdCd') lawdCd: string,
+    @Query('aptNm') aptNm: string,
+    @Query('fromYm') fromYm: string,
+    @Query('toYm') toYm: string,
+    @Query('areaBucket') areaBucket?: string,
+  ) {
+    if (!lawdCd || !aptNm) throw new BadRequestException('lawdCd, aptNm are required');
+    if (!/^\d{6}$/.test(fromYm ?? '') || !/^\d{6}$/.test(toYm ?? '')) {
+      throw new BadRequestException('fromYm, toYm must be YYYYMM');
+    }
+    const bucket = areaBucket === undefined || areaBucket === '' ? null : Number(areaBucket);
+    if (bucket !== null && !Number.isInteger(bucket)) throw new BadRequestException('areaBucket must be an integer');
+
+    const pool = getPool();
+
+    const sql = `
+      SELECT metric, sketch
+      FROM apt_price_sketch
+      WHERE lawd_cd = $1
+        AND apt_nm = $2
+        AND ($3::smallint IS NULL OR area_bucket = $3)
+        AND ym BETWEEN $4 AND $5;
+    `;
+
+    const { rows } = await pool.query<PriceSketchRow>(sql, [lawdCd, aptNm, bucket, fromYm, toYm]);
+
+    const merged = new Map(SKETCH_METRICS.map((m) => [m, emptySketch()]));
+    for (const r of rows) {
+      merged.set(r.metric, mergeSketch(merged.get(r.metric) ?? emptySketch(), decodeSketch(r.sketch)));
+    }
+
+    return {
+      ok: true,
+      items: SKETCH_METRICS.map((metric) => {
+        const s = merged.get(metric) ?? emptySketch();
+        return {
+          metric,
+          n: s.n,
+          p10: sketchQuantile(s, 0.1),
+          p50: sketchQuantile(s, 0.5),
+          p90: sketchQuantile(s, 0.9),
+        };
+      }),
+    };
+  }
 }
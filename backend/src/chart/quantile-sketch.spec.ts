@@ -0,0 +1,23 @@
+import { decodeSketch, mergeSketch, sketchQuantile } from './quantile-sketch';
+
+// etl/tests/test_quantile_sketch.py 의 GOLDEN_* 와 같은 바이트 (Python 이 만든 스케치)
+const GOLDEN_A = '010401006ece0306010100000001'; // [0, 100, 103, 110]
+const GOLDEN_B = '0103006278cc030b0101000000000000000001'; // [101, 120, 98]
+
+describe('quantile-sketch', () => {
+  it('decodes sketches written by etl/quantile_sketch.py', () => {
+    const a = decodeSketch(Buffer.from(GOLDEN_A, 'hex'));
+    expect(a).toEqual({ n: 4, zero: 1, vmin: 0, vmax: 110, kmin: 231, counts: [1, 1, 0, 0, 0, 1] });
+  });
+
+  it('merges and reads quantiles like the Python side', () => {
+    const m = mergeSketch(decodeSketch(Buffer.from(GOLDEN_A, 'hex')), decodeSketch(Buffer.from(GOLDEN_B, 'hex')));
+    expect(m.n).toBe(7);
+    expect(m.zero).toBe(1);
+    expect(m.kmin).toBe(230);
+    expect(m.counts).toEqual([1, 2, 1, 0, 0, 0, 1, 0, 0, 0, 1]);
+    expect(sketchQuantile(m, 0)).toBe(0);
+    expect(sketchQuantile(m, 1)).toBe(120);
+    expect(sketchQuantile(m, 0.5)).toBeCloseTo(100.49456770856492, 9);
+  });
+});
@@ -0,0 +1,86 @@
+// ✅ 병합 가능한 분위수 스케치 (etl/quantile_sketch.py 와 같은 형식/상수)
+// u8 VERSION | varint n | varint zero | varint vmin | varint vmax | zigzag varint kmin | varint nb | varint count × nb
+
+const VERSION = 1;
+const ALPHA = 0.01;
+const GAMMA = (1 + ALPHA) / (1 - ALPHA);
+
+export type QuantileSketch = {
+  n: number;
+  zero: number;
+  vmin: number;
+  vmax: number;
+  kmin: number;
+  counts: number[];
+};
+
+export function emptySketch(): QuantileSketch {
+  return { n: 0, zero: 0, vmin: 0, vmax: 0, kmin: 0, counts: [] };
+}
+
+export function decodeSketch(buf: Buffer): QuantileSketch {
+  if (!buf.length || buf[0] !== VERSION) throw new Error(`unsupported sketch version: ${buf[0]}`);
+  let pos = 1;
+  const varint = () => {
+    let x = 0;
+    let mul = 1;
+    for (;;) {
+      const b = buf[pos++];
+      x += (b & 0x7f) * mul;
+      if (!(b & 0x80)) return x;
+      mul *= 128;
+    }
+  };
+  const n = varint();
+  const zero = varint();
+  const vmin = varint();
+  const vmax = varint();
+  const z = varint();
+  const kmin = z % 2 === 0 ? z / 2 : -(z + 1) / 2;
+  const nb = varint();
+  const counts = new Array<number>(nb);
+  for (let i = 0; i < nb; i++) counts[i] = varint();
+  return { n, zero, vmin, vmax, kmin, counts };
+}
+
+export function mergeSketch(a: QuantileSketch, b: QuantileSketch): QuantileSketch {
+  if (b.n === 0) return a;
+  if (a.n === 0) return b;
+  let kmin = a.kmin;
+  let counts = a.counts.slice();
+  if (!a.counts.length) {
+    kmin = b.kmin;
+    counts = b.counts.slice();
+  } else if (b.counts.length) {
+    kmin = Math.min(a.kmin, b.kmin);
+    const kmax = Math.max(a.kmin + a.counts.length, b.kmin + b.counts.length);
+    counts = new Array<number>(kmax - kmin).fill(0);
+    a.counts.forEach((c, i) => (counts[a.kmin - kmin + i] += c));
+    b.counts.forEach((c, i) => (counts[b.kmin - kmin + i] += c));
+  }
+  return {
+    n: a.n + b.n,
+    zero: a.zero + b.zero,
+    vmin: Math.min(a.vmin, b.vmin),
+    vmax: Math.max(a.vmax, b.vmax),
+    kmin,
+    counts,
+  };
+}
+
+// q (0~1) 분위수, 상대 오차 ALPHA
+export function sketchQuantile(s: QuantileSketch, q: number): number | null {
+  if (s.n === 0) return null;
+  if (q <= 0) return s.vmin;
+  if (q >= 1) return s.vmax;
+  const rank = q * (s.n - 1);
+  if (rank < s.zero) return 0;
+  let cum = s.zero;
+  let i = 0;
+  for (; i < s.counts.length - 1; i++) {
+    cum += s.counts[i];
+    if (cum > rank) break;
+  }
+  const v = (2 * Math.pow(GAMMA, s.kmin + i)) / (GAMMA + 1);
+  return Math.min(Math.max(v, s.vmin), s.vmax);
+}
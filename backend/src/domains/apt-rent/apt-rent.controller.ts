@@ -1,7 +1,15 @@
 // backend/src/domains/apt-rent/apt-rent.controller.ts
 import { Controller, Get, Query, BadRequestException } from '@nestjs/common';
 import { getPool } from '../../db';
-import { toNum, RENT_DATE_EXPR, JIBUN_OPT_FILTER_R, PARAM_DATE_EXPR } from '../apt/apt.shared';
+import {
+  toNum,
+  RENT_DATE_EXPR,
+  JIBUN_OPT_FILTER_R,
+  JIBUN_OPT_FILTER_RING,
+  PARAM_DATE_EXPR,
+  canUseRecentRing,
+  DEAL_DAY_EXPR,
+} from '../apt/apt.shared';
 
 type RentClusterRow = {
   lawd_cd: string;
@@ -26,6 +34,15 @@ type RecentRentRow = {
   floor: number | null;
 };
 
+type RecentRentRingRow = {
+  id: string;
+  deal_ymd: string;
+  deposit_manwon: number | null;
+  monthly_rent_manwon: number | null;
+  exclu_use_ar: number | null;
+  floor: number | null;
+};
+
 type AptInfoRow = {
   lawd_cd: string | null;
   umd_nm: string | null;
@@ -35,6 +52,19 @@ type AptInfoRow = {
 
 type RentLast3mRow = { avg_deposit: number | null; avg_monthly: number | null; cnt: number | null };
 type RentSeriesRow = { ym: string; avg_deposit: number | null; avg_monthly: number | null; cnt: number | null };
+type RentPredictionRow = {
+  area_bucket: number;
+  rent_type: string;
+  area_m2: string | null;
+  deposit: number | null;
+  deposit_p10: number | null;
+  deposit_p90: number | null;
+  monthly: number | null;
+  monthly_p10: number | null;
+  monthly_p90: number | null;
+  n_obs: number;
+  as_of_ym: string;
+};
 
 @Controller('api/map')
 export class AptRentController {
@@ -64,41 +94,26 @@ export class AptRentController {
 
     const pool = getPool();
 
+    // ✅ ETL(refresh_recent_snapshot.py)이 유지하는 단지별 최근 3개월 스냅샷을 바로 읽는다
     const sql = `
-      WITH rep_location AS (
-        SELECT DISTINCT ON (lawd_cd, apt_nm)
-          lawd_cd, apt_nm, umd_nm, lat, lng
-        FROM apt_location
-        WHERE lat IS NOT NULL AND lng IS NOT NULL
-        ORDER BY lawd_cd, apt_nm, id
-      )
       SELECT
-        r.lawd_cd,
-        rl.umd_nm,
-        r.apt_nm,
-        rl.lat,
-        rl.lng,
-        COUNT(*)::int AS rent_cnt,
-        MIN(r.deposit_manwon)::int AS min_deposit,
-        MAX(r.deposit_manwon)::int AS max_deposit,
-        MIN(COALESCE(r.monthly_rent_manwon, 0))::int AS min_monthly_rent,
-        MAX(COALESCE(r.monthly_rent_manwon, 0))::int AS max_monthly_rent,
-        MAX(r.deal_ymd) AS last_deal_ymd
-      FROM apt_trade_rent r
-      JOIN rep_location rl
-        ON r.lawd_cd = rl.lawd_cd
-       AND r.apt_nm = rl.apt_nm
+        s.lawd_cd,
+        s.umd_nm,
+        s.apt_nm,
+        s.lat,
+        s.lng,
+        s.rent_cnt,
+        s.min_deposit,
+        s.max_deposit,
+        s.min_monthly_rent,
+        s.max_monthly_rent,
+        s.last_deal_ymd
+      FROM apt_recent_rent_snapshot s
       WHERE
-        rl.lat BETWEEN $1 AND $2
-        AND rl.lng BETWEEN $3 AND $4
-        AND (${RENT_DATE_EXPR}) >= (CURRENT_DATE - INTERVAL '3 months')
-        AND (
-          $6 = 'all'
-          OR ($6 = 'jeonse' AND COALESCE(r.monthly_rent_manwon, 0) = 0)
-          OR ($6 = 'monthly' AND COALESCE(r.monthly_rent_manwon, 0) > 0)
-        )
-      GROUP BY r.lawd_cd, rl.umd_nm, r.apt_nm, rl.lat, rl.lng
-      ORDER BY MAX(${RENT_DATE_EXPR}) DESC NULLS LAST
+        s.lat BETWEEN $1 AND $2
+        AND s.lng BETWEEN $3 AND $4
+        AND s.rent_type = $6
+      ORDER BY s.last_deal_date DESC NULLS LAST
       LIMIT $5;
     `;
 
@@ -143,6 +158,43 @@ export class AptRentController {
 
     const pool = getPool();
 
+    // ✅ 패널 기본 조회(최근 3개월 + 몇 건)는 ETL(recent_ring.py)이 유지하는 링 테이블 PK 범위만 읽는다
+    // - 링은 jeonse / monthly 로 나뉘어 있어 all 은 두 범위를 합친다
+    if (canUseRecentRing(limit, fromYmd, toYmd)) {
+      const kinds = rentType === 'all' ? ['jeonse', 'monthly'] : [rentType];
+      const ringSql = `
+        SELECT
+          d.src_id::text AS id,
+          d.deal_ymd,
+          d.deposit_manwon,
+          d.monthly_rent_manwon,
+          d.exclu_use_ar,
+          d.floor
+        FROM apt_recent_deal d
+        WHERE
+          d.lawd_cd = $1
+          AND d.apt_nm = $2
+          AND ${JIBUN_OPT_FILTER_RING}
+          AND d.kind = ANY($5::text[])
+          AND d.deal_date >= (CURRENT_DATE - INTERVAL '3 months')
+        ORDER BY d.deal_date DESC, d.src_id DESC
+        LIMIT $4;
+      `;
+      const ring = await pool.query<RecentRentRingRow>(ringSql, [lawdCd, aptNm, jibun ?? '', limit, kinds]);
+
+      return {
+        ok: true,
+        items: ring.rows.map((r) => ({
+          id: r.id,
+          dealYmd: r.deal_ymd,
+          depositManwon: r.deposit_manwon,
+          monthlyRentManwon: r.monthly_rent_manwon,
+          excluUseAr: r.exclu_use_ar === null ? null : Number(r.exclu_use_ar),
+          floor: r.floor === null ? null : Number(r.floor),
+        })),
+      };
+    }
+
     // ✅ (핫픽스) DB에 컬럼이 없으면 500 터지는 문제 방지
     // - current_schema() 사용: public이 아닐 수도 있어서 안전
     const colSql = `
@@ -167,13 +219,14 @@ export class AptRentController {
       )
       SELECT
         r.id::text AS id,
-        r.deal_ymd,
+        COALESCE(to_char(r_d.deal_d, 'YYYYMMDD'), r.deal_ymd) AS deal_ymd,
         r.deposit_manwon,
         r.monthly_rent_manwon,
         ${excluSelect},
         ${floorSelect}
       FROM apt_trade_rent r
       CROSS JOIN p
+      CROSS JOIN LATERAL (SELECT ${DEAL_DAY_EXPR('r')} AS deal_d) r_d
       WHERE
         r.lawd_cd = $1
         AND r.apt_nm = $2
@@ -184,13 +237,13 @@ export class AptRentController {
           OR ($7 = 'monthly' AND COALESCE(r.monthly_rent_manwon, 0) > 0)
         )
         AND (
-          (p.from_d IS NULL AND p.to_d IS NULL AND (${RENT_DATE_EXPR}) >= (CURRENT_DATE - INTERVAL '3 months'))
+          (p.from_d IS NULL AND p.to_d IS NULL AND r_d.deal_d >= (CURRENT_DATE - INTERVAL '3 months'))
           OR (
-            (p.from_d IS NULL OR (${RENT_DATE_EXPR}) >= p.from_d)
-            AND (p.to_d IS NULL OR (${RENT_DATE_EXPR}) <= p.to_d)
+            (p.from_d IS NULL OR r_d.deal_d >= p.from_d)
+            AND (p.to_d IS NULL OR r_d.deal_d <= p.to_d)
           )
         )
-      ORDER BY (${RENT_DATE_EXPR}) DESC NULLS LAST, r.deal_ymd DESC
+      ORDER BY r_d.deal_d DESC NULLS LAST, r.id DESC
       LIMIT $4;
     `;
 
@@ -325,4 +378,40 @@ export class AptRentController {
       })),
     };
   }
+
+  // ✅ 전월세 예측 (ETL build_rent_prediction.py 가 미리 계산, 면적대 × 전세/월세)
+  @Get('apt/rent-prediction')
+  async rentPrediction(@Query('lawdCd') lawdCd: string, @Query('aptNm') aptNm: string) {
+    if (!lawdCd || !aptNm) throw new BadRequestException('lawdCd and aptNm are required');
+
+    const pool = getPool();
+
+    const sql = `
+      SELECT
+        area_bucket, rent_type, area_m2,
+        deposit, deposit_p10, deposit_p90,
+        monthly, monthly_p10, monthly_p90,
+        n_obs, as_of_ym
+      FROM apt_rent_prediction
+      WHERE lawd_cd = $1 AND apt_nm = $2
+      ORDER BY area_bucket, rent_type;
+    `;
+
+    const { rows } = await pool.query<RentPredictionRow>(sql, [lawdCd, aptNm]);
+    const band = (v: number | null, lo: number | null, hi: number | null) =>
+      v === null ? null : { value: Number(v), low: Number(lo), high: Number(hi) };
+
+    return {
+      ok: true,
+      items: rows.map((r) => ({
+        areaBucket: Number(r.area_bucket),
+        rentType: r.rent_type,
+        areaM2: r.area_m2 === null ? null : Number(r.area_m2),
+        deposit: band(r.deposit, r.deposit_p10, r.deposit_p90),
+        monthly: band(r.monthly, r.monthly_p10, r.monthly_p90),
+        nObs: Number(r.n_obs),
+        asOfYm: String(r.as_of_ym),
+      })),
+    };
+  }
 }
@@ -1,7 +1,15 @@
 // backend/src/domains/apt-trade/apt-trade.controller.ts
 import { Controller, Get, Query, BadRequestException } from '@nestjs/common';
 import { getPool } from '../../db';
-import { toNum, DEAL_DATE_EXPR, JIBUN_OPT_FILTER_T, PARAM_DATE_EXPR } from '../apt/apt.shared';
+import {
+  toNum,
+  DEAL_DATE_EXPR,
+  JIBUN_OPT_FILTER_T,
+  JIBUN_OPT_FILTER_RING,
+  PARAM_DATE_EXPR,
+  canUseRecentRing,
+  DEAL_DAY_EXPR,
+} from '../apt/apt.shared';
 
 type TradeClusterRow = {
   lawd_cd: string;
@@ -25,6 +33,16 @@ type RecentTradeRow = {
   rgst_date: string | null;
 };
 
+type RecentTradeRingRow = {
+  id: string;
+  deal_ymd: string;
+  amount_manwon: number | null;
+  exclu_use_ar: number | null;
+  floor: number | null;
+  deal_dong: string | null;
+  is_registered: boolean | null;
+};
+
 type AptInfoRow = {
   lawd_cd: string | null;
   umd_nm: string | null;
@@ -33,6 +51,16 @@ type AptInfoRow = {
 };
 
 type Last3mRow = { avg_price: number | null; cnt: number | null };
+type ComparableNeighbor = {
+  lawd_cd: string;
+  apt_nm: string;
+  distance_m: number;
+  score: number;
+  build_year: number | null;
+  area_m2: number | null;
+  price_per_m2: number | null;
+};
+type ComparableRow = { neighbors: ComparableNeighbor[] };
 type SeriesRow = { ym: string; avg_price: number | null; cnt: number | null };
 
 @Controller('api/map')
@@ -58,34 +86,23 @@ export class AptTradeController {
 
     const pool = getPool();
 
+    // ✅ ETL(refresh_recent_snapshot.py)이 유지하는 단지별 최근 3개월 스냅샷을 바로 읽는다
     const sql = `
-      WITH rep_location AS (
-        SELECT DISTINCT ON (lawd_cd, apt_nm)
-          lawd_cd, apt_nm, umd_nm, lat, lng
-        FROM apt_location
-        WHERE lat IS NOT NULL AND lng IS NOT NULL
-        ORDER BY lawd_cd, apt_nm, id
-      )
       SELECT
-        t.lawd_cd,
-        rl.umd_nm,
-        t.apt_nm,
-        rl.lat,
-        rl.lng,
-        COUNT(*)::int AS trade_cnt,
-        MIN(t.deal_amount_manwon)::int AS min_price,
-        MAX(t.deal_amount_manwon)::int AS max_price,
-        MAX(t.deal_ymd) AS last_trade_ymd
-      FROM apt_trade t
-      JOIN rep_location rl
-        ON t.lawd_cd = rl.lawd_cd
-       AND t.apt_nm = rl.apt_nm
+        s.lawd_cd,
+        s.umd_nm,
+        s.apt_nm,
+        s.lat,
+        s.lng,
+        s.trade_cnt,
+        s.min_price,
+        s.max_price,
+        s.last_trade_ymd
+      FROM apt_recent_trade_snapshot s
       WHERE
-        rl.lat BETWEEN $1 AND $2
-        AND rl.lng BETWEEN $3 AND $4
-        AND (${DEAL_DATE_EXPR}) >= (CURRENT_DATE - INTERVAL '3 months')
-      GROUP BY t.lawd_cd, rl.umd_nm, t.apt_nm, rl.lat, rl.lng
-      ORDER BY MAX(${DEAL_DATE_EXPR}) DESC NULLS LAST
+        s.lat BETWEEN $1 AND $2
+        AND s.lng BETWEEN $3 AND $4
+      ORDER BY s.last_deal_date DESC NULLS LAST
       LIMIT $5;
     `;
 
@@ -122,6 +139,43 @@ export class AptTradeController {
 
     const pool = getPool();
 
+    // ✅ 패널 기본 조회(최근 3개월 + 몇 건)는 ETL(recent_ring.py)이 유지하는 링 테이블 PK 범위만 읽는다
+    if (canUseRecentRing(limit, fromYmd, toYmd)) {
+      const ringSql = `
+        SELECT
+          d.src_id::text AS id,
+          d.deal_ymd,
+          d.amount_manwon,
+          d.exclu_use_ar,
+          d.floor,
+          d.deal_dong,
+          d.is_registered
+        FROM apt_recent_deal d
+        WHERE
+          d.lawd_cd = $1
+          AND d.apt_nm = $2
+          AND ${JIBUN_OPT_FILTER_RING}
+          AND d.kind = 'sale'
+          AND d.deal_date >= (CURRENT_DATE - INTERVAL '3 months')
+        ORDER BY d.deal_date DESC, d.src_id DESC
+        LIMIT $4;
+      `;
+      const ring = await pool.query<RecentTradeRingRow>(ringSql, [lawdCd, aptNm, jibun ?? '', limit]);
+
+      return {
+        ok: true,
+        items: ring.rows.map((r) => ({
+          id: r.id,
+          dealYmd: r.deal_ymd,
+          amountManwon: r.amount_manwon,
+          excluUseAr: r.exclu_use_ar === null ? null : Number(r.exclu_use_ar),
+          floor: r.floor === null ? null : Number(r.floor),
+          dealDong: r.deal_dong,
+          isRegistered: r.is_registered ? true : null,
+        })),
+      };
+    }
+
     const sql = `
       WITH p AS (
         SELECT
@@ -130,7 +184,7 @@ export class AptTradeController {
       )
       SELECT
         t.id::text AS id,
-        t.deal_ymd,
+        COALESCE(to_char(t_d.deal_d, 'YYYYMMDD'), t.deal_ymd) AS deal_ymd,
         t.deal_amount_manwon,
         t.exclu_use_ar,
         t.floor,
@@ -138,18 +192,19 @@ export class AptTradeController {
         NULLIF(btrim(t.rgst_date::text), '') AS rgst_date
       FROM apt_trade t
       CROSS JOIN p
+      CROSS JOIN LATERAL (SELECT ${DEAL_DAY_EXPR('t')} AS deal_d) t_d
       WHERE
         t.lawd_cd = $1
         AND t.apt_nm = $2
         AND ${JIBUN_OPT_FILTER_T}
         AND (
-          (p.from_d IS NULL AND p.to_d IS NULL AND (${DEAL_DATE_EXPR}) >= (CURRENT_DATE - INTERVAL '3 months'))
+          (p.from_d IS NULL AND p.to_d IS NULL AND t_d.deal_d >= (CURRENT_DATE - INTERVAL '3 months'))
           OR (
-            (p.from_d IS NULL OR (${DEAL_DATE_EXPR}) >= p.from_d)
-            AND (p.to_d IS NULL OR (${DEAL_DATE_EXPR}) <= p.to_d)
+            (p.from_d IS NULL OR t_d.deal_d >= p.from_d)
+            AND (p.to_d IS NULL OR t_d.deal_d <= p.to_d)
           )
         )
-      ORDER BY (${DEAL_DATE_EXPR}) DESC NULLS LAST, t.deal_ymd DESC
+      ORDER BY t_d.deal_d DESC NULLS LAST, t.id DESC
       LIMIT $4;
     `;
 
@@ -179,6 +234,36 @@ export class AptTradeController {
     };
   }
 
+  // ✅ 비교 단지 (ETL build_comparables.py 가 미리 계산한 이웃 목록 한 행)
+  @Get('apt/comparables')
+  async comparables(@Query('lawdCd') lawdCd: string, @Query('aptNm') aptNm: string) {
+    if (!lawdCd || !aptNm) throw new BadRequestException('lawdCd and aptNm are required');
+
+    const pool = getPool();
+
+    const sql = `
+      SELECT neighbors
+      FROM apt_comparable
+      WHERE lawd_cd = $1 AND apt_nm = $2;
+    `;
+
+    const { rows } = await pool.query<ComparableRow>(sql, [lawdCd, aptNm]);
+    const neighbors = rows[0]?.neighbors ?? [];
+
+    return {
+      ok: true,
+      items: neighbors.map((n) => ({
+        lawdCd: n.lawd_cd,
+        aptNm: n.apt_nm,
+        distanceM: Number(n.distance_m),
+        score: Number(n.score),
+        buildYear: n.build_year === null ? null : Number(n.build_year),
+        areaM2: n.area_m2 === null ? null : Number(n.area_m2),
+        pricePerM2: n.price_per_m2 === null ? null : Number(n.price_per_m2),
+      })),
+    };
+  }
+
   // ✅ 매매 요약 + 월별 추이 (기존 경로 유지)
   @Get('apt/summary')
   async summary(@Query('lawdCd') lawdCd: string, @Query('aptNm') aptNm: string, @Query('jibun') jibun: string) {
@@ -55,3 +55,25 @@ export const PARAM_DATE_EXPR = (idx: number) => `
     ELSE NULL
   END
 `;
+
+// ✅ 단지·지번·구분별 최근 N건 링 (ETL recent_ring.py 의 RING_SIZE 와 같아야 함)
+export const RECENT_RING_SIZE = 20;
+
+// ✅ 계약일 (일 단위): deal_ymd 는 YYYYMM 이라 일 단위 정렬/기간이 안 돼서 deal_year/month/day 로 만든다
+// - ETL recent_ring.py 의 DEAL_DATE 와 같은 식이어야 한다 (링 경로와 원본 경로가 같은 3개월 / 같은 순서)
+export const DEAL_DAY_EXPR = (alias: string) =>
+  `(make_date(${alias}.deal_year, ${alias}.deal_month, 1) + (GREATEST(${alias}.deal_day, 1) - 1))`;
+
+// ✅ 기간 미지정 + limit 이 링 크기 이하면 apt_recent_deal 만 읽어도 결과가 같다
+// - 두 경로 모두 DEAL_DAY_EXPR 로 최근 3개월을 자르고 (계약일, id) 내림차순으로 정렬한다
+export function canUseRecentRing(limit: number, fromYmd?: string, toYmd?: string): boolean {
+  return limit <= RECENT_RING_SIZE && !(fromYmd ?? '').trim() && !(toYmd ?? '').trim();
+}
+
+// ✅ jibun 옵셔널 필터 (링: jibun 은 btrim(COALESCE(jibun, '')) 로 저장됨)
+export const JIBUN_OPT_FILTER_RING = `
+  (
+    btrim(COALESCE($3, '')) = ''
+    OR d.jibun = btrim($3)
+  )
+`;
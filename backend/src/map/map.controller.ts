@@ -2,7 +2,16 @@
 import { Controller, Get, Query, BadRequestException, Param, Res } from '@nestjs/common';
 import type { Response } from 'express';
 import { getPool } from '../db';
-import { toInt, DEAL_DATE_EXPR, RENT_DATE_EXPR } from '../domains/apt/apt.shared';
+import { toInt } from '../domains/apt/apt.shared';
+
+// ✅ 저배율(z <= CELL_MAX_ZOOM)은 ETL이 미리 집계한 geohash 셀(map_cell_agg)을 그린다
+const CELL_MAX_ZOOM = 12;
+
+function cellPrecisionForZoom(z: number): number {
+  if (z <= 8) return 4;
+  if (z <= 10) return 5;
+  return 6;
+}
 
 @Controller('api/map')
 export class MapController {
@@ -35,24 +44,11 @@ export class MapController {
     const sqlTrades = `
       WITH
       bounds AS (SELECT ST_TileEnvelope($1, $2, $3) AS geom),
-      rep_location AS (
-        SELECT DISTINCT ON (lawd_cd, apt_nm)
-          lawd_cd, apt_nm, umd_nm, lat, lng
-        FROM apt_location
-        WHERE lat IS NOT NULL AND lng IS NOT NULL
-        ORDER BY lawd_cd, apt_nm, id
-      ),
       agg AS (
         SELECT
-          t.lawd_cd, rl.umd_nm, t.apt_nm, rl.lat, rl.lng,
-          COUNT(*)::int AS trade_cnt,
-          MIN(t.deal_amount_manwon)::int AS min_price,
-          MAX(t.deal_amount_manwon)::int AS max_price,
-          MAX(t.deal_ymd) AS last_trade_ymd
-        FROM apt_trade t
-        JOIN rep_location rl ON t.lawd_cd = rl.lawd_cd AND t.apt_nm = rl.apt_nm
-        WHERE (${DEAL_DATE_EXPR}) >= (CURRENT_DATE - INTERVAL '3 months')
-        GROUP BY t.lawd_cd, rl.umd_nm, t.apt_nm, rl.lat, rl.lng
+          lawd_cd, umd_nm, apt_nm, lat, lng,
+          trade_cnt, min_price, max_price, last_trade_ymd
+        FROM apt_recent_trade_snapshot
       )
       SELECT
         ST_AsMVT(tile, $4, $5, 'geom') AS mvt
@@ -78,31 +74,13 @@ export class MapController {
     const sqlRent = `
       WITH
       bounds AS (SELECT ST_TileEnvelope($1, $2, $3) AS geom),
-      rep_location AS (
-        SELECT DISTINCT ON (lawd_cd, apt_nm)
-          lawd_cd, apt_nm, umd_nm, lat, lng
-        FROM apt_location
-        WHERE lat IS NOT NULL AND lng IS NOT NULL
-        ORDER BY lawd_cd, apt_nm, id
-      ),
       base AS (
         SELECT
-          r.lawd_cd, rl.umd_nm, r.apt_nm, rl.lat, rl.lng,
-          COUNT(*)::int AS rent_cnt,
-          MIN(r.deposit_manwon)::int AS min_deposit,
-          MAX(r.deposit_manwon)::int AS max_deposit,
-          MIN(COALESCE(r.monthly_rent_manwon, 0))::int AS min_monthly_rent,
-          MAX(COALESCE(r.monthly_rent_manwon, 0))::int AS max_monthly_rent,
-          MAX(r.deal_ymd) AS last_deal_ymd
-        FROM apt_trade_rent r
-        JOIN rep_location rl ON r.lawd_cd = rl.lawd_cd AND r.apt_nm = rl.apt_nm
-        WHERE (${RENT_DATE_EXPR}) >= (CURRENT_DATE - INTERVAL '3 months')
-          AND (
-            $6 = 'all'
-            OR ($6 = 'jeonse' AND COALESCE(r.monthly_rent_manwon, 0) = 0)
-            OR ($6 = 'monthly' AND COALESCE(r.monthly_rent_manwon, 0) > 0)
-          )
-        GROUP BY r.lawd_cd, rl.umd_nm, r.apt_nm, rl.lat, rl.lng
+          lawd_cd, umd_nm, apt_nm, lat, lng,
+          rent_cnt, min_deposit, max_deposit,
+          min_monthly_rent, max_monthly_rent, last_deal_ymd
+        FROM apt_recent_rent_snapshot
+        WHERE rent_type = $6
       )
       SELECT
         ST_AsMVT(tile, $4, $5, 'geom') AS mvt
@@ -126,8 +104,47 @@ export class MapController {
       ) AS tile;
     `;
 
-    const sql = layer === 'trades' ? sqlTrades : sqlRent;
-    const params = layer === 'trades' ? [z, x, y, layer, extent] : [z, x, y, layer, extent, rentType];
+    const sqlCells = `
+      WITH bounds AS (SELECT ST_TileEnvelope($1, $2, $3) AS geom)
+      SELECT
+        ST_AsMVT(tile, $4, $5, 'geom') AS mvt
+      FROM (
+        SELECT
+          ST_AsMVTGeom(
+            ST_Transform(ST_SetSRID(ST_MakePoint(c.lng, c.lat), 4326), 3857),
+            bounds.geom,
+            $5,
+            256,
+            true
+          ) AS geom,
+          c.cell,
+          c.complex_cnt,
+          ${
+            layer === 'trades'
+              ? `c.deal_cnt AS trade_cnt, c.min_price, c.max_price, c.last_deal_ymd AS last_trade_ymd`
+              : `c.deal_cnt AS rent_cnt, c.min_price AS min_deposit, c.max_price AS max_deposit,
+                 c.min_monthly AS min_monthly_rent, c.max_monthly AS max_monthly_rent, c.last_deal_ymd`
+          }
+        FROM map_cell_agg c, bounds
+        WHERE c.layer = $4
+          AND c.rent_type = $6
+          AND c.precision = $7
+          AND ST_Intersects(
+            ST_Transform(ST_SetSRID(ST_MakePoint(c.lng, c.lat), 4326), 3857),
+            bounds.geom
+          )
+      ) AS tile;
+    `;
+
+    let sql: string;
+    let params: (string | number)[];
+    if (z <= CELL_MAX_ZOOM) {
+      sql = sqlCells;
+      params = [z, x, y, layer, extent, layer === 'trades' ? 'all' : rentType, cellPrecisionForZoom(z)];
+    } else {
+      sql = layer === 'trades' ? sqlTrades : sqlRent;
+      params = layer === 'trades' ? [z, x, y, layer, extent] : [z, x, y, layer, extent, rentType];
+    }
 
     const { rows } = await pool.query<{ mvt: Buffer | null }>(sql, params);
     const mvt = rows[0]?.mvt;
@@ -0,0 +1,362 @@
+"""오프라인 지오코딩용 지번 좌표 인덱스 (sqlite).
+
+전국 지번/건물 좌표 데이터(주소정보누리집 등에서 받은 파일)를
+정규화한 (시군구 코드, 읍면동, 지번) 키 -> 좌표 한 행으로 줄여 sqlite 파일 하나에 저장한다.
+geocode_kakao_fill_locations.py 가 이 인덱스로 먼저 찾고, 없는 것만 카카오에 묻는다.
+
+빌드: python etl/addr_index.py <파일 또는 디렉터리> ... [--crs utmk|wgs84] [--out 경로]
+
+입력 파일: 헤더가 있는 구분자 텍스트 (| , 탭), cp949 / utf-8 자동 판별.
+필요한 컬럼 (ADDR_COLUMNS 로 헤더 이름 변경 가능, "키=헤더,..."):
+  bjd_cd  법정동코드 (10자리, 앞 5자리 = lawd_cd)
+  umd_nm  읍면동명
+  ri_nm   리명 (없어도 됨)
+  san     산여부 (1 = 산)
+  main_no 지번본번
+  sub_no  지번부번
+  x, y    X좌표 / Y좌표 (기본 UTM-K, EPSG:5179)
+  sido_nm, sgg_nm  시도명 / 시군구명 (주소 문자열용, 없어도 됨)
+한 지번에 건물이 여러 개면 좌표 평균.
+"""
+import os
+import re
+import csv
+import math
+import sqlite3
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_PATH = REPO_ROOT / "data" / "addr_index.sqlite"
+INDEX_PATH = Path(os.environ.get("ADDR_INDEX_PATH", str(DEFAULT_PATH)).strip())
+
+DEFAULT_COLUMNS = {
+    "bjd_cd": "법정동코드",
+    "sido_nm": "시도명",
+    "sgg_nm": "시군구명",
+    "umd_nm": "읍면동명",
+    "ri_nm": "리명",
+    "san": "산여부",
+    "main_no": "지번본번",
+    "sub_no": "지번부번",
+    "x": "X좌표",
+    "y": "Y좌표",
+}
+REQUIRED = ("bjd_cd", "umd_nm", "main_no", "x", "y")
+
+BUILD_BATCH = 50000
+LOOKUP_BATCH = 500
+
+DDL = """
+CREATE TABLE IF NOT EXISTS addr (
+  k    TEXT PRIMARY KEY,
+  lat  REAL NOT NULL,
+  lng  REAL NOT NULL,
+  addr TEXT,
+  n    INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+RAW_DDL = """
+CREATE TEMP TABLE raw (k TEXT, lat REAL, lng REAL, addr TEXT, src TEXT);
+"""
+
+# src: 리 이름만으로 만든 키의 출처 읍면 (그 외 키는 NULL)
+# - 읍면+리 / 읍면동 전체 이름 키(src NULL)가 있으면 그 행들만 쓴다
+# - 리 이름만인 키는 같은 시군구 안에서 한 읍면에서만 나올 때만 남긴다
+#   (다른 읍면의 같은 이름 리를 평균 내면 엉뚱한 좌표가 된다)
+AGG_SQL = """
+INSERT INTO addr (k, lat, lng, addr, n)
+SELECT k,
+  CASE WHEN SUM(src IS NULL) > 0 THEN AVG(CASE WHEN src IS NULL THEN lat END) ELSE AVG(lat) END,
+  CASE WHEN SUM(src IS NULL) > 0 THEN AVG(CASE WHEN src IS NULL THEN lng END) ELSE AVG(lng) END,
+  CASE WHEN SUM(src IS NULL) > 0 THEN MIN(CASE WHEN src IS NULL THEN addr END) ELSE MIN(addr) END,
+  CASE WHEN SUM(src IS NULL) > 0 THEN SUM(src IS NULL) ELSE COUNT(*) END
+FROM raw
+GROUP BY k
+HAVING SUM(src IS NULL) > 0 OR COUNT(DISTINCT src) = 1
+"""
+
+AMBIGUOUS_SQL = """
+SELECT COUNT(*) FROM (
+  SELECT k FROM raw GROUP BY k
+  HAVING SUM(src IS NULL) = 0 AND COUNT(DISTINCT src) > 1
+)
+"""
+
+# -----------------------------
+# 키 정규화 (MOLIT 거래 행과 주소 데이터 양쪽에 같은 규칙)
+# -----------------------------
+_SPACE_RE = re.compile(r"\s+")
+_JIBUN_RE = re.compile(r"^(산)?\s*0*(\d+)(?:\s*-\s*0*(\d+))?")
+
+
+def norm_umd(umd_nm: str | None) -> str:
+    return _SPACE_RE.sub("", umd_nm or "")
+
+
+def norm_jibun(jibun: str | None) -> str | None:
+    """'0123-0004' / '123-4번지' / '산 12' -> '123-4' / '123-4' / '산12'. 해석 안 되면 None"""
+    s = (jibun or "").strip()
+    m = _JIBUN_RE.match(s)
+    if not m:
+        return None
+    san, main, sub = m.groups()
+    out = f"{'산' if san else ''}{int(main)}"
+    if sub and int(sub) != 0:
+        out += f"-{int(sub)}"
+    return out
+
+
+def make_key(lawd_cd: str, umd_nm: str | None, jibun: str | None) -> str | None:
+    j = norm_jibun(jibun)
+    umd = norm_umd(umd_nm)
+    if not (lawd_cd and umd and j):
+        return None
+    return f"{lawd_cd}|{umd}|{j}"
+
+
+def place_keys(lawd_cd: str, umd_nm: str | None, jibun: str | None) -> list[str]:
+    """거래 행 -> 조회할 키 후보. 읍면 + 리 로 들어온 경우 리 이름만으로도 찾는다."""
+    keys = []
+    k = make_key(lawd_cd, umd_nm, jibun)
+    if k:
+        keys.append(k)
+    parts = (umd_nm or "").split()
+    if len(parts) > 1:
+        k = make_key(lawd_cd, parts[-1], jibun)
+        if k and k not in keys:
+            keys.append(k)
+    return keys
+
+
+# -----------------------------
+# UTM-K (EPSG:5179, GRS80 TM) -> WGS84
+# GRS80 과 WGS84 타원체 차이는 지오코딩 용도에서 무시해도 되는 수준 (< 1mm)
+# -----------------------------
+_A = 6378137.0
+_F = 1 / 298.257222101
+_E2 = _F * (2 - _F)
+_EP2 = _E2 / (1 - _E2)
+_K0 = 0.9996
+_LAT0 = math.radians(38.0)
+_LON0 = math.radians(127.5)
+_FE = 1000000.0
+_FN = 2000000.0
+
+
+def _meridian_arc(phi):
+    e2, e4, e6 = _E2, _E2 ** 2, _E2 ** 3
+    return _A * (
+        (1 - e2 / 4 - 3 * e4 / 64 - 5 * e6 / 256) * phi
+        - (3 * e2 / 8 + 3 * e4 / 32 + 45 * e6 / 1024) * np.sin(2 * phi)
+        + (15 * e4 / 256 + 45 * e6 / 1024) * np.sin(4 * phi)
+        - (35 * e6 / 3072) * np.sin(6 * phi)
+    )
+
+
+_M0 = float(_meridian_arc(_LAT0))
+
+
+def utmk_to_wgs84(x, y):
+    """배열 입력 가능. 반환: (lat, lng) 도 단위."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    e2 = _E2
+    m = _M0 + (y - _FN) / _K0
+    mu = m / (_A * (1 - e2 / 4 - 3 * e2 ** 2 / 64 - 5 * e2 ** 3 / 256))
+    e1 = (1 - math.sqrt(1 - e2)) / (1 + math.sqrt(1 - e2))
+    phi1 = (
+        mu
+        + (3 * e1 / 2 - 27 * e1 ** 3 / 32) * np.sin(2 * mu)
+        + (21 * e1 ** 2 / 16 - 55 * e1 ** 4 / 32) * np.sin(4 * mu)
+        + (151 * e1 ** 3 / 96) * np.sin(6 * mu)
+        + (1097 * e1 ** 4 / 512) * np.sin(8 * mu)
+    )
+    sin1, cos1, tan1 = np.sin(phi1), np.cos(phi1), np.tan(phi1)
+    c1 = _EP2 * cos1 ** 2
+    t1 = tan1 ** 2
+    w = 1 - e2 * sin1 ** 2
+    n1 = _A / np.sqrt(w)
+    r1 = _A * (1 - e2) / w ** 1.5
+    d = (x - _FE) / (n1 * _K0)
+
+    lat = phi1 - (n1 * tan1 / r1) * (
+        d ** 2 / 2
+        - (5 + 3 * t1 + 10 * c1 - 4 * c1 ** 2 - 9 * _EP2) * d ** 4 / 24
+        + (61 + 90 * t1 + 298 * c1 + 45 * t1 ** 2 - 252 * _EP2 - 3 * c1 ** 2) * d ** 6 / 720
+    )
+    lon = _LON0 + (
+        d
+        - (1 + 2 * t1 + c1) * d ** 3 / 6
+        + (5 - 2 * c1 + 28 * t1 - 3 * c1 ** 2 + 8 * _EP2 + 24 * t1 ** 2) * d ** 5 / 120
+    ) / cos1
+    return np.degrees(lat), np.degrees(lon)
+
+
+# -----------------------------
+# 빌드
+# -----------------------------
+def _columns_from_env() -> dict[str, str]:
+    cols = dict(DEFAULT_COLUMNS)
+    spec = os.environ.get("ADDR_COLUMNS", "").strip()
+    for part in spec.split(","):
+        if "=" in part:
+            k, _, v = part.partition("=")
+            cols[k.strip()] = v.strip()
+    return cols
+
+
+def _open_text(path: Path):
+    with open(path, "rb") as f:
+        head = f.read(1 << 16)
+    for enc in ("utf-8-sig", "cp949"):
+        try:
+            head.decode(enc)
+            return open(path, encoding=enc, errors="replace", newline="")
+        except UnicodeDecodeError:
+            continue
+    return open(path, encoding="cp949", errors="replace", newline="")
+
+
+def _iter_files(paths: list[str]):
+    for p in map(Path, paths):
+        if p.is_dir():
+            yield from sorted(q for q in p.rglob("*") if q.is_file() and q.suffix.lower() in (".txt", ".csv"))
+        else:
+            yield p
+
+
+def _read_rows(path: Path, cols: dict[str, str]):
+    with _open_text(path) as f:
+        first = f.readline()
+        delim = max(("|", ",", "\t"), key=first.count)
+        header = [h.strip() for h in first.rstrip("\r\n").split(delim)]
+        pos = {k: header.index(v) for k, v in cols.items() if v in header}
+        missing = [k for k in REQUIRED if k not in pos]
+        if missing:
+            raise RuntimeError(f"{path}: 필요한 컬럼 없음 {[cols[k] for k in missing]} (ADDR_COLUMNS 로 지정)")
+        for rec in csv.reader(f, delimiter=delim):
+            if len(rec) < len(header):
+                continue
+            yield {k: rec[i].strip() for k, i in pos.items()}
+
+
+def _flush(db, keys, xs, ys, addrs, srcs, crs):
+    if not keys:
+        return
+    if crs == "utmk":
+        lat, lng = utmk_to_wgs84(xs, ys)
+    else:
+        lat, lng = np.asarray(ys, dtype=np.float64), np.asarray(xs, dtype=np.float64)
+    db.executemany(
+        "INSERT INTO raw (k, lat, lng, addr, src) VALUES (?, ?, ?, ?, ?)",
+        zip(keys, lat.tolist(), lng.tolist(), addrs, srcs),
+    )
+
+
+def build(paths: list[str], out: Path, crs: str = "utmk"):
+    cols = _columns_from_env()
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".building")
+    if tmp.exists():
+        tmp.unlink()
+
+    db = sqlite3.connect(str(tmp))
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+    db.executescript(DDL + RAW_DDL)
+
+    total = skipped = 0
+    for path in _iter_files(paths):
+        keys, xs, ys, addrs, srcs = [], [], [], [], []
+        n_file = 0
+        for r in _read_rows(path, cols):
+            n_file += 1
+            try:
+                x, y = float(r["x"]), float(r["y"])
+            except ValueError:
+                skipped += 1
+                continue
+            san = "산" if r.get("san") == "1" else ""
+            sub = r.get("sub_no") or "0"
+            jibun = f"{san}{r['main_no']}-{sub}"
+            ri = r.get("ri_nm")
+            umd = " ".join(p for p in (r["umd_nm"], ri) if p)
+            if ri:
+                # 읍면 + 리 전체 이름 키, 리 이름만인 키 (출처 읍면 기록)
+                cand = [
+                    (make_key(r["bjd_cd"][:5], r["umd_nm"] + ri, jibun), None),
+                    (make_key(r["bjd_cd"][:5], ri, jibun), norm_umd(r["umd_nm"])),
+                ]
+            else:
+                cand = [(make_key(r["bjd_cd"][:5], r["umd_nm"], jibun), None)]
+            if not cand[0][0]:
+                skipped += 1
+                continue
+            addr = " ".join(p for p in (r.get("sido_nm"), r.get("sgg_nm"), umd, norm_jibun(jibun)) if p)
+            for k, src in cand:
+                keys.append(k)
+                xs.append(x)
+                ys.append(y)
+                addrs.append(addr)
+                srcs.append(src)
+            if len(keys) >= BUILD_BATCH:
+                _flush(db, keys, xs, ys, addrs, srcs, crs)
+                keys, xs, ys, addrs, srcs = [], [], [], [], []
+        _flush(db, keys, xs, ys, addrs, srcs, crs)
+        db.commit()
+        total += n_file
+        print(f"[addr_index] {path.name}: rows={n_file}")
+
+    ambiguous = db.execute(AMBIGUOUS_SQL).fetchone()[0]
+    db.execute(AGG_SQL)
+    db.execute("DROP TABLE raw")
+    db.commit()
+    n_keys = db.execute("SELECT COUNT(*) FROM addr").fetchone()[0]
+    db.execute("VACUUM")
+    db.close()
+    os.replace(tmp, out)
+    print(f"[addr_index] Done. input_rows={total} skipped={skipped} keys={n_keys} ambiguous_ri_keys_dropped={ambiguous} -> {out}")
+
+
+# -----------------------------
+# 조회
+# -----------------------------
+class AddrIndex:
+    def __init__(self, path: Path = INDEX_PATH):
+        # 읽기 전용 (여러 프로세스가 같은 파일을 열어도 됨)
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+    @classmethod
+    def open_if_exists(cls, path: Path = INDEX_PATH):
+        return cls(path) if path.exists() else None
+
+    def lookup_many(self, keys) -> dict[str, tuple[float, float, str | None]]:
+        """키 -> (lat, lng, 주소). 없는 키는 빠진다."""
+        keys = list(dict.fromkeys(keys))
+        out = {}
+        for i in range(0, len(keys), LOOKUP_BATCH):
+            chunk = keys[i:i + LOOKUP_BATCH]
+            q = f"SELECT k, lat, lng, addr FROM addr WHERE k IN ({','.join('?' * len(chunk))})"
+            for k, lat, lng, addr in self.db.execute(q, chunk):
+                out[k] = (lat, lng, addr)
+        return out
+
+    def close(self):
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="오프라인 지오코딩 인덱스 빌드")
+    parser.add_argument("paths", nargs="+", help="지번 좌표 파일 또는 디렉터리")
+    parser.add_argument("--crs", choices=["utmk", "wgs84"], default="utmk", help="X/Y 좌표계 (기본 UTM-K)")
+    parser.add_argument("--out", default=str(INDEX_PATH), help=f"인덱스 파일 (기본 {INDEX_PATH})")
+    args = parser.parse_args()
+    build(args.paths, Path(args.out), args.crs)
+
+
+if __name__ == "__main__":
+    main()
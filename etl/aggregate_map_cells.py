@@ -0,0 +1,213 @@
+import os
+import db
+import profiling
+from dotenv import load_dotenv
+from pathlib import Path
+
+import geohash
+import stage_state
+from sql_common import window_start_expr
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+STAGE = "map_cells"
+# 1이면 전체 셀 재계산
+CELLS_FULL = os.environ.get("CELLS_FULL", "0").strip() == "1"
+
+PRECISIONS = list(geohash.CELL_PRECISIONS)
+
+# -----------------------------
+# SQL
+# -----------------------------
+# layer: trades | rent, rent_type: all | jeonse | monthly (trades 는 all 만)
+# first_deal_date: 셀 안에서 가장 오래된 거래일 -> 최근 구간 밖으로 밀려나면 재계산 대상
+DDL = """
+CREATE TABLE IF NOT EXISTS map_cell_agg (
+  layer           text     NOT NULL,
+  rent_type       text     NOT NULL,
+  precision       smallint NOT NULL,
+  cell            text     NOT NULL,
+  complex_cnt     int      NOT NULL,
+  deal_cnt        int      NOT NULL,
+  min_price       int,
+  max_price       int,
+  min_monthly     int,
+  max_monthly     int,
+  last_deal_ymd   text,
+  first_deal_date date,
+  lat             double precision NOT NULL,
+  lng             double precision NOT NULL,
+  updated_at      timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (layer, rent_type, precision, cell)
+);
+"""
+
+ENSURE_PREV_SQL = "ALTER TABLE apt_location ADD COLUMN IF NOT EXISTS prev_geohash text;"
+
+# 위치가 바뀐 단지: 새 셀과 예전 셀(prev_geohash) 둘 다 재계산
+MOVED_SQL = """
+SELECT id, geohash, prev_geohash FROM apt_location
+WHERE updated_at > %s OR prev_geohash IS NOT NULL;
+"""
+
+# 읽은 뒤 다시 옮겨진 행(prev_geohash 가 달라진 행)은 남겨 둔다
+CLEAR_PREV_SQL = """
+UPDATE apt_location l
+SET prev_geohash = NULL
+FROM unnest(%s::bigint[], %s::text[]) AS k(id, prev_geohash)
+WHERE l.id = k.id AND l.prev_geohash = k.prev_geohash;
+"""
+
+CLEAR_ALL_PREV_SQL = "UPDATE apt_location SET prev_geohash = NULL WHERE prev_geohash IS NOT NULL;"
+
+COMPLEX_GEOHASH_SQL = """
+SELECT DISTINCT l.geohash
+FROM apt_location l
+JOIN unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+  ON l.lawd_cd = k.lawd_cd AND l.apt_nm = k.apt_nm
+WHERE l.geohash IS NOT NULL;
+"""
+
+EXPIRED_SQL = f"""
+SELECT DISTINCT precision, cell FROM map_cell_agg
+WHERE first_deal_date < {window_start_expr()};
+"""
+
+ALL_CELLS_SQL = """
+SELECT DISTINCT geohash FROM apt_location
+WHERE geohash IS NOT NULL;
+"""
+
+DELETE_SQL = """
+DELETE FROM map_cell_agg a
+USING unnest(%s::smallint[], %s::text[]) AS c(precision, cell)
+WHERE a.precision = c.precision AND a.cell = c.cell;
+"""
+
+# 단지별 최근 3개월 집계(refresh_recent_snapshot.py)를 셀 단위로 한 번 더 묶는다
+TRADE_CELLS_SQL = """
+WITH target AS (SELECT * FROM unnest(%s::smallint[], %s::text[]) AS c(precision, cell))
+INSERT INTO map_cell_agg (
+  layer, rent_type, precision, cell,
+  complex_cnt, deal_cnt, min_price, max_price, min_monthly, max_monthly,
+  last_deal_ymd, first_deal_date, lat, lng
+)
+SELECT
+  'trades', 'all', c.precision, c.cell,
+  COUNT(*)::int, SUM(s.trade_cnt)::int, MIN(s.min_price), MAX(s.max_price), NULL, NULL,
+  MAX(s.last_trade_ymd), MIN(s.first_deal_date), AVG(s.lat), AVG(s.lng)
+FROM apt_recent_trade_snapshot s
+JOIN target c ON substr(s.geohash, 1, c.precision) = c.cell
+GROUP BY c.precision, c.cell;
+"""
+
+RENT_CELLS_SQL = """
+WITH target AS (SELECT * FROM unnest(%s::smallint[], %s::text[]) AS c(precision, cell))
+INSERT INTO map_cell_agg (
+  layer, rent_type, precision, cell,
+  complex_cnt, deal_cnt, min_price, max_price, min_monthly, max_monthly,
+  last_deal_ymd, first_deal_date, lat, lng
+)
+SELECT
+  'rent', s.rent_type, c.precision, c.cell,
+  COUNT(*)::int, SUM(s.rent_cnt)::int, MIN(s.min_deposit), MAX(s.max_deposit),
+  MIN(s.min_monthly_rent), MAX(s.max_monthly_rent),
+  MAX(s.last_deal_ymd), MIN(s.first_deal_date), AVG(s.lat), AVG(s.lng)
+FROM apt_recent_rent_snapshot s
+JOIN target c ON substr(s.geohash, 1, c.precision) = c.cell
+GROUP BY s.rent_type, c.precision, c.cell;
+"""
+
+
+# -----------------------------
+# main
+# -----------------------------
+def _cells_of(geohashes) -> set[tuple[int, str]]:
+    out = set()
+    for gh in geohashes:
+        out.update(geohash.cells(gh, PRECISIONS))
+    return out
+
+
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    conn.autocommit = False
+
+    try:
+        stage_state.ensure(conn)
+        with conn.cursor() as cur:
+            cur.execute(DDL)
+            cur.execute(ENSURE_PREV_SQL)
+        conn.commit()
+
+        last_run = None if CELLS_FULL else stage_state.last_run_at(conn, STAGE)
+        full = CELLS_FULL or last_run is None
+
+        with conn.cursor() as cur:
+            if full:
+                marks = {src: stage_state.max_id(conn, src) for src in stage_state.SOURCES + (stage_state.CHANGE_SOURCE,)}
+                cur.execute(ALL_CELLS_SQL)
+                target = _cells_of(r[0] for r in cur.fetchall())
+                cur.execute("TRUNCATE map_cell_agg;")
+                cur.execute(CLEAR_ALL_PREV_SQL)
+            else:
+                # 1) 새 거래가 들어온 단지의 셀  2) 위치가 바뀐 단지의 셀  3) 최근 구간에서 거래가 빠져나간 셀
+                complexes, marks = stage_state.pending(conn, STAGE)
+                cur.execute(COMPLEX_GEOHASH_SQL, ([c[0] for c in complexes], [c[1] for c in complexes]))
+                target = _cells_of(r[0] for r in cur.fetchall())
+                cur.execute(MOVED_SQL, (last_run,))
+                moved = cur.fetchall()
+                target |= _cells_of(gh for r in moved for gh in r[1:] if gh)
+                prev = [(r[0], r[2]) for r in moved if r[2]]
+                if prev:
+                    cur.execute(CLEAR_PREV_SQL, ([p[0] for p in prev], [p[1] for p in prev]))
+                cur.execute(EXPIRED_SQL)
+                target |= {(int(r[0]), r[1]) for r in cur.fetchall()}
+
+        target = sorted(target)
+        precs = [t[0] for t in target]
+        cells = [t[1] for t in target]
+        print(f"[cells] target cells={len(target)} full={full}")
+
+        with conn.cursor() as cur:
+            cur.execute(DELETE_SQL, (precs, cells))
+            cur.execute(TRADE_CELLS_SQL, (precs, cells))
+            n_trade = cur.rowcount
+            cur.execute(RENT_CELLS_SQL, (precs, cells))
+            n_rent = cur.rowcount
+        stage_state.commit_marks(conn, STAGE, marks)
+        conn.commit()
+
+        print(f"[cells] Done. trades cells={n_trade} rent cells={n_rent}")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, STAGE)
@@ -0,0 +1,310 @@
+import os
+import json
+import db
+import profiling
+import numpy as np
+from scipy.spatial import cKDTree
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from pathlib import Path
+
+import stage_state
+from sql_common import deal_date_expr, REP_LOCATION_CTE
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+STAGE = "comparables"
+# 1이면 전체 단지 재계산 (새 거래 없이 가격 기간 밖으로 밀려난 거래까지 반영하려면 가끔)
+COMPARABLES_FULL = os.environ.get("COMPARABLES_FULL", "0").strip() == "1"
+K = int(os.environ.get("COMPARABLE_K", "10"))
+RADIUS_M = float(os.environ.get("COMPARABLE_RADIUS_M", "3000"))
+# 트리에서 거리순으로 뽑는 후보 수 (이 중 유사도 상위 K)
+CANDIDATES = int(os.environ.get("COMPARABLE_CANDIDATES", "50"))
+PRICE_MONTHS = int(os.environ.get("COMPARABLE_PRICE_MONTHS", "12"))
+
+# 유사도 = exp(-0.5 * Σ w·z²), z = 항목별 차이 / 스케일
+YEAR_SCALE = 10.0        # 준공연도 10년
+LOG_RATIO_SCALE = 0.3    # 면적 / ㎡당가 약 ±35%
+WEIGHTS = {"dist": 1.0, "year": 1.0, "area": 1.0, "price": 1.0}
+# 속성이 없는 쪽은 스케일 1단위만큼 다르다고 본다
+MISSING_Z = 1.0
+
+EARTH_R = 6371008.8
+
+# -----------------------------
+# SQL
+# -----------------------------
+DDL = """
+CREATE TABLE IF NOT EXISTS apt_comparable (
+  lawd_cd    text  NOT NULL,
+  apt_nm     text  NOT NULL,
+  neighbors  jsonb NOT NULL,
+  updated_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (lawd_cd, apt_nm)
+);
+"""
+
+# 위치가 있는 모든 단지 + 준공연도 / 대표 면적 / 최근 ㎡당가 (해제 거래 제외)
+LOAD_SQL = f"""
+WITH
+{REP_LOCATION_CTE},
+attr AS (
+  SELECT
+    t.lawd_cd, t.apt_nm,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY t.build_year) AS build_year,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY t.exclu_use_ar::float8) AS area_m2,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY (t.deal_amount_manwon / t.exclu_use_ar)::float8)
+      FILTER (WHERE ({deal_date_expr("t")}) >= CURRENT_DATE - make_interval(months => %s)) AS price_per_m2
+  FROM apt_trade t
+  WHERE t.cdeal_type IS NULL
+    AND t.exclu_use_ar > 0
+    AND t.deal_amount_manwon IS NOT NULL
+  GROUP BY t.lawd_cd, t.apt_nm
+)
+SELECT rl.lawd_cd, rl.apt_nm, rl.lat, rl.lng, a.build_year, a.area_m2, a.price_per_m2
+FROM rep_location rl
+LEFT JOIN attr a ON a.lawd_cd = rl.lawd_cd AND a.apt_nm = rl.apt_nm;
+"""
+
+EXISTING_SQL = "SELECT lawd_cd, apt_nm FROM apt_comparable;"
+
+MOVED_SQL = """
+SELECT DISTINCT lawd_cd, apt_nm FROM apt_location
+WHERE updated_at > %s;
+"""
+
+# 바뀐/없어진 단지를 이웃 목록에 갖고 있는 단지 (옛 위치 주변)
+REFERRING_SQL = """
+SELECT c.lawd_cd, c.apt_nm
+FROM apt_comparable c
+WHERE EXISTS (
+  SELECT 1
+  FROM jsonb_array_elements(c.neighbors) e
+  JOIN unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+    ON e->>'lawd_cd' = k.lawd_cd AND e->>'apt_nm' = k.apt_nm
+);
+"""
+
+DELETE_SQL = """
+DELETE FROM apt_comparable s
+USING unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+WHERE s.lawd_cd = k.lawd_cd AND s.apt_nm = k.apt_nm;
+"""
+
+INSERT_SQL = """
+INSERT INTO apt_comparable (lawd_cd, apt_nm, neighbors)
+VALUES %s;
+"""
+
+
+# -----------------------------
+# 계산
+# -----------------------------
+def _project(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    """위경도 -> 평면 미터 (등거리 원통 투영, 중심 위도 기준). 후보 검색용."""
+    lat0 = np.radians(np.mean(lat)) if len(lat) else 0.0
+    x = EARTH_R * np.radians(lng) * np.cos(lat0)
+    y = EARTH_R * np.radians(lat)
+    return np.column_stack([x, y])
+
+
+def _haversine_m(lat1, lng1, lat2, lng2):
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dphi = p2 - p1
+    dl = np.radians(lng2 - lng1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_R * np.arcsin(np.sqrt(a))
+
+
+def _z(diff: np.ndarray) -> np.ndarray:
+    return np.where(np.isfinite(diff), diff, MISSING_Z)
+
+
+def nearest_comparables(tree, xy, attrs, targets: np.ndarray):
+    """targets(단지 인덱스)별 유사도 상위 K 이웃. 반환: (idx, dist_m, score) 각각 (len(targets), K), 빈 칸은 -1 / nan"""
+    n = len(xy)
+    k_query = min(CANDIDATES + 1, n)
+    d, j = tree.query(xy[targets], k=k_query, distance_upper_bound=RADIUS_M)
+    d = d.reshape(len(targets), k_query)
+    j = j.reshape(len(targets), k_query)
+
+    valid = (j < n) & (j != targets[:, None])
+    jj = np.where(valid, j, 0)
+    ti = targets[:, None]
+
+    year, area, ppm = attrs["build_year"], attrs["area_m2"], attrs["price_per_m2"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z_dist = d / RADIUS_M
+        z_year = _z((year[jj] - year[ti]) / YEAR_SCALE)
+        z_area = _z(np.log(area[jj] / area[ti]) / LOG_RATIO_SCALE)
+        z_price = _z(np.log(ppm[jj] / ppm[ti]) / LOG_RATIO_SCALE)
+        score = np.exp(-0.5 * (
+            WEIGHTS["dist"] * z_dist ** 2
+            + WEIGHTS["year"] * z_year ** 2
+            + WEIGHTS["area"] * z_area ** 2
+            + WEIGHTS["price"] * z_price ** 2
+        ))
+    score = np.where(valid, score, -np.inf)
+
+    k = min(K, k_query)
+    order = np.argsort(-score, axis=1, kind="stable")[:, :k]
+    top_j = np.take_along_axis(jj, order, axis=1)
+    top_score = np.take_along_axis(score, order, axis=1)
+    ok = np.isfinite(top_score)
+    top_j = np.where(ok, top_j, -1)
+
+    lat, lng = attrs["lat"], attrs["lng"]
+    safe = np.where(ok, top_j, 0)
+    dist_m = _haversine_m(lat[ti], lng[ti], lat[safe], lng[safe])
+    return top_j, np.where(ok, dist_m, np.nan), np.where(ok, top_score, np.nan)
+
+
+def _num_or_none(v, nd=1):
+    return round(float(v), nd) if np.isfinite(v) else None
+
+
+def build_rows(keys, attrs, targets, top_j, dist_m, score):
+    out = []
+    for r, i in enumerate(targets):
+        neighbors = []
+        for c in range(top_j.shape[1]):
+            j = top_j[r, c]
+            if j < 0:
+                continue
+            lawd_cd, apt_nm = keys[j]
+            neighbors.append({
+                "lawd_cd": lawd_cd,
+                "apt_nm": apt_nm,
+                "distance_m": int(round(float(dist_m[r, c]))),
+                "score": round(float(score[r, c]), 4),
+                "build_year": None if not np.isfinite(attrs["build_year"][j]) else int(attrs["build_year"][j]),
+                "area_m2": _num_or_none(attrs["area_m2"][j]),
+                "price_per_m2": _num_or_none(attrs["price_per_m2"][j]),
+            })
+        lawd_cd, apt_nm = keys[i]
+        out.append((lawd_cd, apt_nm, json.dumps(neighbors, ensure_ascii=False)))
+    return out
+
+
+def _arrays(rows):
+    keys = [(r[0], r[1]) for r in rows]
+
+    def col(i):
+        return np.array([np.nan if r[i] is None else float(r[i]) for r in rows], dtype=np.float64)
+
+    attrs = {
+        "lat": col(2),
+        "lng": col(3),
+        "build_year": col(4),
+        "area_m2": col(5),
+        "price_per_m2": col(6),
+    }
+    return keys, attrs
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    conn.autocommit = False
+
+    try:
+        stage_state.ensure(conn)
+        with conn.cursor() as cur:
+            cur.execute(DDL)
+        conn.commit()
+
+        last_run = None if COMPARABLES_FULL else stage_state.last_run_at(conn, STAGE)
+        full = COMPARABLES_FULL or last_run is None
+        # 지난 실행 이후 거래가 들어오거나 고쳐진 단지 -> 준공연도 / 면적 / ㎡당가가 바뀌었을 수 있다
+        if full:
+            pending = set()
+            marks = {src: stage_state.max_id(conn, src) for src in stage_state.SOURCES + (stage_state.CHANGE_SOURCE,)}
+        else:
+            pending, marks = stage_state.pending(conn, STAGE)
+
+        with conn.cursor() as cur:
+            cur.execute(LOAD_SQL, (PRICE_MONTHS,))
+            rows = cur.fetchall()
+            cur.execute(EXISTING_SQL)
+            existing = {(r[0], r[1]) for r in cur.fetchall()}
+
+        keys, attrs = _arrays(rows)
+        index = {k: i for i, k in enumerate(keys)}
+        xy = _project(attrs["lat"], attrs["lng"])
+        tree = cKDTree(xy) if len(keys) else None
+        gone = existing - set(index)
+
+        if full:
+            targets = np.arange(len(keys))
+        else:
+            # 1) 새 단지 / 위치가 바뀐 단지 / 거래가 들어온 단지  2) 그 주변 RADIUS_M 안
+            # 3) 그 단지(또는 없어진 단지)를 이웃으로 갖던 단지 (이웃 jsonb 에 속성 값이 들어 있다)
+            with conn.cursor() as cur:
+                cur.execute(MOVED_SQL, (last_run,))
+                changed = {(r[0], r[1]) for r in cur.fetchall()} | pending
+            changed = {k for k in changed if k in index} | (set(index) - existing)
+
+            affected = set(changed)
+            if changed and tree is not None:
+                pts = xy[[index[k] for k in changed]]
+                for near in tree.query_ball_point(pts, r=RADIUS_M):
+                    affected.update(keys[i] for i in near)
+            ref = sorted(changed | gone)
+            if ref:
+                with conn.cursor() as cur:
+                    cur.execute(REFERRING_SQL, ([k[0] for k in ref], [k[1] for k in ref]))
+                    affected.update((r[0], r[1]) for r in cur.fetchall() if (r[0], r[1]) in index)
+            targets = np.array(sorted(index[k] for k in affected), dtype=np.int64)
+
+        print(f"[comparables] complexes={len(keys)} targets={len(targets)} gone={len(gone)} full={full}")
+
+        out = []
+        if len(targets) and tree is not None:
+            top_j, dist_m, score = nearest_comparables(tree, xy, attrs, targets)
+            out = build_rows(keys, attrs, targets, top_j, dist_m, score)
+
+        with conn.cursor() as cur:
+            if full:
+                cur.execute("TRUNCATE apt_comparable;")
+            else:
+                dels = [keys[i] for i in targets] + sorted(gone)
+                cur.execute(DELETE_SQL, ([k[0] for k in dels], [k[1] for k in dels]))
+            if out:
+                execute_values(cur, INSERT_SQL, out, page_size=1000)
+        stage_state.commit_marks(conn, STAGE, marks)
+        conn.commit()
+        print(f"[comparables] Done. rows={len(out)}")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, STAGE)
@@ -0,0 +1,262 @@
+import os
+import db
+import profiling
+import numpy as np
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from pathlib import Path
+
+import stage_state
+from stats_common import (
+    PYEONG_M2,
+    area_bucket,
+    ym_to_index,
+    index_to_ym,
+    encode,
+    combine_keys,
+    group_sum,
+    group_count,
+    group_quantiles,
+)
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+STAGE = "complex_stats"
+# 1이면 워터마크 무시하고 전체 단지 재계산
+STATS_FULL = os.environ.get("STATS_FULL", "0").strip() == "1"
+# 한 번에 메모리에 올릴 단지 수
+CHUNK = int(os.environ.get("STATS_CHUNK", "2000"))
+
+QS = (0.10, 0.25, 0.50, 0.75, 0.90)
+
+# -----------------------------
+# SQL
+# -----------------------------
+DDL = """
+CREATE TABLE IF NOT EXISTS apt_complex_stats (
+  lawd_cd          text     NOT NULL,
+  apt_nm           text     NOT NULL,
+  area_bucket      smallint NOT NULL,
+  ym               char(6)  NOT NULL,
+  trade_cnt        int      NOT NULL DEFAULT 0,
+  price_avg        int,
+  price_p10        int,
+  price_p25        int,
+  price_p50        int,
+  price_p75        int,
+  price_p90        int,
+  price_per_m2     numeric(10,1),
+  price_per_pyeong numeric(10,1),
+  jeonse_cnt       int      NOT NULL DEFAULT 0,
+  jeonse_p50       int,
+  jeonse_ratio     numeric(6,3),
+  updated_at       timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (lawd_cd, apt_nm, area_bucket, ym)
+);
+"""
+
+# 해제(취소)된 거래는 통계에서 제외
+LOAD_TRADE_SQL = """
+SELECT t.lawd_cd, t.apt_nm, substr(t.deal_ymd, 1, 6), t.exclu_use_ar, t.deal_amount_manwon
+FROM apt_trade t
+JOIN unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+  ON t.lawd_cd = k.lawd_cd AND t.apt_nm = k.apt_nm
+WHERE t.deal_amount_manwon IS NOT NULL
+  AND t.exclu_use_ar > 0
+  AND t.cdeal_type IS NULL;
+"""
+
+LOAD_JEONSE_SQL = """
+SELECT r.lawd_cd, r.apt_nm, substr(r.deal_ymd, 1, 6), r.exclu_use_ar, r.deposit_manwon
+FROM apt_trade_rent r
+JOIN unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+  ON r.lawd_cd = k.lawd_cd AND r.apt_nm = k.apt_nm
+WHERE r.deposit_manwon IS NOT NULL
+  AND COALESCE(r.monthly_rent_manwon, 0) = 0;
+"""
+
+DELETE_SQL = """
+DELETE FROM apt_complex_stats s
+USING unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+WHERE s.lawd_cd = k.lawd_cd AND s.apt_nm = k.apt_nm;
+"""
+
+INSERT_SQL = """
+INSERT INTO apt_complex_stats (
+  lawd_cd, apt_nm, area_bucket, ym,
+  trade_cnt, price_avg, price_p10, price_p25, price_p50, price_p75, price_p90,
+  price_per_m2, price_per_pyeong,
+  jeonse_cnt, jeonse_p50, jeonse_ratio
+) VALUES %s;
+"""
+
+
+# -----------------------------
+# 계산
+# -----------------------------
+def _arrays(rows):
+    if not rows:
+        return None
+    lawd, apt, ym, ar, amt = zip(*rows)
+    return {
+        "complex": np.array([f"{a}\x1f{b}" for a, b in zip(lawd, apt)], dtype=object),
+        "ym": ym_to_index(np.array(ym)),
+        "area": np.array([np.nan if v is None else float(v) for v in ar], dtype=np.float64),
+        "amount": np.array(amt, dtype=np.float64),
+    }
+
+
+def _int_or_none(v):
+    return int(round(float(v))) if np.isfinite(v) else None
+
+
+def _round1_or_none(v):
+    return round(float(v), 1) if np.isfinite(v) else None
+
+
+def compute_stats(trade_rows, jeonse_rows):
+    """(단지, 면적대, 월) 그룹별 매매 가격 분포 + 전세가율.
+
+    전세는 매매와 같은 (단지, 면적대, 월) 키로 맞춰 전세 중위 보증금 / 매매 중위가를 구한다.
+    """
+    t = _arrays(trade_rows)
+    j = _arrays(jeonse_rows)
+    parts = [x for x in (t, j) if x is not None]
+    if not parts:
+        return []
+
+    complex_uniq, complex_code = encode(np.concatenate([p["complex"] for p in parts]))
+    ym_all = np.concatenate([p["ym"] for p in parts])
+    ym_min = int(ym_all.min())
+    ym_span = int(ym_all.max()) - ym_min + 1
+    bucket_all = np.concatenate([area_bucket(p["area"]) for p in parts]) + 1  # -1(면적없음) -> 0
+
+    key_all = combine_keys(complex_code, bucket_all, ym_all - ym_min, sizes=[len(complex_uniq), 7, ym_span])
+    keys, inv_all = np.unique(key_all, return_inverse=True)
+    g = len(keys)
+
+    n_t = len(t["amount"]) if t is not None else 0
+    inv_t = inv_all[:n_t]
+    inv_j = inv_all[n_t:]
+
+    trade_cnt = group_count(inv_t, g)
+    jeonse_cnt = group_count(inv_j, g)
+
+    if n_t:
+        price_avg = group_sum(inv_t, t["amount"], g) / np.maximum(trade_cnt, 1)
+        price_q = group_quantiles(inv_t, t["amount"], g, QS)
+        ppm2 = group_sum(inv_t, t["amount"] / t["area"], g) / np.maximum(trade_cnt, 1)
+        price_avg[trade_cnt == 0] = np.nan
+        ppm2[trade_cnt == 0] = np.nan
+    else:
+        price_avg = np.full(g, np.nan)
+        price_q = np.full((g, len(QS)), np.nan)
+        ppm2 = np.full(g, np.nan)
+
+    if j is not None:
+        jeonse_p50 = group_quantiles(inv_j, j["amount"], g, (0.5,))[:, 0]
+    else:
+        jeonse_p50 = np.full(g, np.nan)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = jeonse_p50 / price_q[:, 2]
+
+    # 키 분해
+    ym_idx = keys % ym_span + ym_min
+    rest = keys // ym_span
+    bucket = rest % 7 - 1
+    cidx = rest // 7
+    ym_str = index_to_ym(ym_idx)
+
+    out = []
+    for i in range(g):
+        lawd_cd, apt_nm = complex_uniq[cidx[i]].split("\x1f", 1)
+        out.append((
+            lawd_cd, apt_nm, int(bucket[i]), ym_str[i],
+            int(trade_cnt[i]),
+            _int_or_none(price_avg[i]),
+            *(_int_or_none(v) for v in price_q[i]),
+            _round1_or_none(ppm2[i]),
+            _round1_or_none(ppm2[i] * PYEONG_M2),
+            int(jeonse_cnt[i]),
+            _int_or_none(jeonse_p50[i]),
+            None if not np.isfinite(ratio[i]) else round(float(ratio[i]), 3),
+        ))
+    return out
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    conn.autocommit = False
+
+    try:
+        stage_state.ensure(conn)
+        with conn.cursor() as cur:
+            cur.execute(DDL)
+        conn.commit()
+
+        complexes, marks = stage_state.pending(conn, STAGE, full=STATS_FULL)
+        complexes = sorted(complexes)
+        print(f"[stats] touched complexes={len(complexes)} full={STATS_FULL}")
+
+        total_rows = 0
+        for i in range(0, len(complexes), CHUNK):
+            chunk = complexes[i:i + CHUNK]
+            lawds = [c[0] for c in chunk]
+            apts = [c[1] for c in chunk]
+
+            with conn.cursor() as cur:
+                cur.execute(LOAD_TRADE_SQL, (lawds, apts))
+                trade_rows = cur.fetchall()
+                cur.execute(LOAD_JEONSE_SQL, (lawds, apts))
+                jeonse_rows = cur.fetchall()
+
+            stats = compute_stats(trade_rows, jeonse_rows)
+
+            with conn.cursor() as cur:
+                cur.execute(DELETE_SQL, (lawds, apts))
+                if stats:
+                    execute_values(cur, INSERT_SQL, stats, page_size=1000)
+            conn.commit()
+
+            total_rows += len(stats)
+            print(f"[stats] complexes={i + len(chunk)}/{len(complexes)} rows={len(stats)}")
+
+        stage_state.commit_marks(conn, STAGE, marks)
+        conn.commit()
+        print(f"[stats] Done. rows={total_rows} marks={marks}")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, STAGE)
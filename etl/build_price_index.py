@@ -0,0 +1,268 @@
+import os
+import db
+import profiling
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import lsqr
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from pathlib import Path
+
+import stage_state
+from stats_common import ym_to_index, index_to_ym, encode, combine_keys
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+STAGE = "price_index"
+# 1이면 전체 시군구 재계산
+PRICE_INDEX_FULL = os.environ.get("PRICE_INDEX_FULL", "0").strip() == "1"
+# 반복매매 쌍이 이보다 적으면 헤도닉 회귀로
+MIN_PAIRS = int(os.environ.get("PRICE_INDEX_MIN_PAIRS", "50"))
+# 헤도닉도 거래가 이보다 적으면 지수를 만들지 않음
+MIN_SALES = int(os.environ.get("PRICE_INDEX_MIN_SALES", "30"))
+
+# 같은 호(unit)로 보는 기준: 단지 + 전용면적(0.1㎡) + 층 구간
+FLOOR_BAND = 5
+# 두 거래 가격비가 e^1(약 2.7배) 넘게 차이 나면 다른 물건/오입력으로 보고 제외
+MAX_PAIR_LOG_DIFF = 1.0
+LSQR_ATOL = 1e-8
+
+# -----------------------------
+# SQL
+# -----------------------------
+# level: sgg (lawd_cd 전체, umd_nm = '') | umd (법정동)
+# idx: start_ym 부터 한 달 간격 지수 (start_ym = 100, 관측이 없는 달은 NULL)
+# cnt: 월별 관측 수 (repeat: 그 달에 끝나거나 시작하는 쌍, hedonic: 거래)
+DDL = """
+CREATE TABLE IF NOT EXISTS apt_price_index (
+  level      text    NOT NULL,
+  lawd_cd    text    NOT NULL,
+  umd_nm     text    NOT NULL DEFAULT '',
+  method     text    NOT NULL,
+  start_ym   char(6) NOT NULL,
+  idx        real[]  NOT NULL,
+  cnt        int[]   NOT NULL,
+  n_obs      int     NOT NULL,
+  updated_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (level, lawd_cd, umd_nm)
+);
+"""
+
+ALL_LAWD_SQL = "SELECT DISTINCT lawd_cd FROM apt_trade;"
+
+# 해제(취소)된 거래는 제외
+LOAD_SQL = """
+SELECT umd_nm, apt_nm, substr(deal_ymd, 1, 6), exclu_use_ar, floor, build_year, deal_amount_manwon
+FROM apt_trade
+WHERE lawd_cd = %s
+  AND cdeal_type IS NULL
+  AND exclu_use_ar > 0
+  AND deal_amount_manwon > 0;
+"""
+
+DELETE_SQL = "DELETE FROM apt_price_index WHERE lawd_cd = ANY(%s::text[]);"
+
+INSERT_SQL = """
+INSERT INTO apt_price_index (level, lawd_cd, umd_nm, method, start_ym, idx, cnt, n_obs)
+VALUES %s;
+"""
+
+
+# -----------------------------
+# 계산
+# -----------------------------
+def _arrays(rows):
+    umd, apt, ym, ar, fl, by, amt = zip(*rows)
+    area = np.array(ar, dtype=np.float64)
+    floor = np.array([np.nan if v is None else float(v) for v in fl], dtype=np.float64)
+    _, apt_code = encode(apt)
+    band = np.where(np.isfinite(floor), np.maximum(floor, 0) // FLOOR_BAND, -1).astype(np.int64) + 1
+    area_code = np.round(area * 10).astype(np.int64)
+    unit = combine_keys(apt_code, area_code, band, sizes=[int(apt_code.max()) + 1, int(area_code.max()) + 1, int(band.max()) + 1])
+    umd_uniq, umd_code = encode(umd)
+    return {
+        "umd_uniq": umd_uniq,
+        "umd": umd_code,
+        "unit": unit,
+        "t": ym_to_index(np.array(ym)),
+        "logp": np.log(np.array(amt, dtype=np.float64)),
+        "log_area": np.log(area),
+        "floor": floor,
+        "build_year": np.array([np.nan if v is None else float(v) for v in by], dtype=np.float64),
+    }
+
+
+def repeat_pairs(unit, t, logp):
+    """같은 unit 의 연속된 두 거래 -> (t1, t2, log 가격비). 같은 달 거래쌍은 제외."""
+    order = np.lexsort((t, unit))
+    u, tt, lp = unit[order], t[order], logp[order]
+    same = (u[1:] == u[:-1]) & (tt[1:] > tt[:-1])
+    t1, t2, dy = tt[:-1][same], tt[1:][same], lp[1:][same] - lp[:-1][same]
+    keep = np.abs(dy) <= MAX_PAIR_LOG_DIFF
+    return t1[keep], t2[keep], dy[keep]
+
+
+def _series(months, coef, counts, t0, span):
+    """관측이 있는 달의 로그 계수 -> start 부터 span 개월 지수 (기준 = 첫 달 100)."""
+    idx = np.full(span, np.nan)
+    idx[months - t0] = 100.0 * np.exp(coef - coef[0])
+    cnt = np.zeros(span, dtype=np.int64)
+    cnt[months - t0] = counts
+    return idx, cnt
+
+
+def repeat_sales_index(t1, t2, dy):
+    """BMN 반복매매: dy = β[t2] - β[t1], 첫 달 β = 0. 반환: (months, coef, counts)"""
+    months, inv = np.unique(np.concatenate([t1, t2]), return_inverse=True)
+    n = len(dy)
+    c1, c2 = inv[:n], inv[n:]
+    rows = np.arange(n)
+    a = sparse.csr_matrix(
+        (np.concatenate([-np.ones(n), np.ones(n)]), (np.concatenate([rows, rows]), np.concatenate([c1, c2]))),
+        shape=(n, len(months)),
+    )
+    beta = lsqr(a[:, 1:], dy, atol=LSQR_ATOL, btol=LSQR_ATOL)[0]
+    coef = np.concatenate([[0.0], beta])
+    counts = np.bincount(c1, minlength=len(months)) + np.bincount(c2, minlength=len(months))
+    return months, coef, counts
+
+
+def _std(x):
+    """결측은 평균으로 채우고 표준화 (lsqr 수렴용)."""
+    x = np.where(np.isfinite(x), x, np.nanmean(x) if np.isfinite(x).any() else 0.0)
+    s = x.std()
+    return (x - x.mean()) / s if s > 0 else np.zeros_like(x)
+
+
+def hedonic_index(t, logp, log_area, floor, build_year):
+    """log p = Σ 월 더미 + 면적 + 층 + 준공연도. 반환: (months, coef, counts)"""
+    months, inv = np.unique(t, return_inverse=True)
+    n = len(logp)
+    dummies = sparse.csr_matrix((np.ones(n), (np.arange(n), inv)), shape=(n, len(months)))
+    x = np.column_stack([_std(log_area), _std(floor), _std(build_year)])
+    a = sparse.hstack([dummies, sparse.csr_matrix(x)], format="csr")
+    beta = lsqr(a, logp, atol=LSQR_ATOL, btol=LSQR_ATOL)[0]
+    return months, beta[:len(months)], np.bincount(inv, minlength=len(months))
+
+
+def region_index(d, mask):
+    """한 지역(mask)의 지수. 반환: (method, start, idx, cnt, n_obs) 또는 None"""
+    t = d["t"][mask]
+    t1, t2, dy = repeat_pairs(d["unit"][mask], t, d["logp"][mask])
+    if len(dy) >= MIN_PAIRS:
+        method, n_obs = "repeat", len(dy)
+        months, coef, counts = repeat_sales_index(t1, t2, dy)
+    elif mask.sum() >= MIN_SALES:
+        method, n_obs = "hedonic", int(mask.sum())
+        months, coef, counts = hedonic_index(
+            t, d["logp"][mask], d["log_area"][mask], d["floor"][mask], d["build_year"][mask]
+        )
+    else:
+        return None
+    t0 = int(months[0])
+    span = int(months[-1]) - t0 + 1
+    idx, cnt = _series(months, coef, counts, t0, span)
+    return method, t0, idx, cnt, n_obs
+
+
+def _row(level, lawd_cd, umd_nm, res):
+    method, t0, idx, cnt, n_obs = res
+    return (
+        level, lawd_cd, umd_nm, method, index_to_ym([t0])[0],
+        [None if not np.isfinite(v) else round(float(v), 2) for v in idx],
+        [int(c) for c in cnt],
+        n_obs,
+    )
+
+
+def compute_lawd(lawd_cd, rows):
+    if not rows:
+        return []
+    d = _arrays(rows)
+    out = []
+    res = region_index(d, np.ones(len(d["t"]), dtype=bool))
+    if res is not None:
+        out.append(_row("sgg", lawd_cd, "", res))
+    for code, umd_nm in enumerate(d["umd_uniq"]):
+        res = region_index(d, d["umd"] == code)
+        if res is not None:
+            out.append(_row("umd", lawd_cd, str(umd_nm), res))
+    return out
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    conn.autocommit = False
+
+    try:
+        stage_state.ensure(conn)
+        with conn.cursor() as cur:
+            cur.execute(DDL)
+        conn.commit()
+
+        if PRICE_INDEX_FULL:
+            marks = {src: stage_state.max_id(conn, src) for src in stage_state.SOURCES + (stage_state.CHANGE_SOURCE,)}
+            with conn.cursor() as cur:
+                cur.execute(ALL_LAWD_SQL)
+                lawds = sorted(r[0] for r in cur.fetchall())
+        else:
+            # 새 거래/변경이 있는 단지의 시군구만 (법정동 지수도 시군구 단위로 같이)
+            complexes, marks = stage_state.pending(conn, STAGE)
+            lawds = sorted({c[0] for c in complexes})
+        print(f"[price_index] target sgg={len(lawds)} full={PRICE_INDEX_FULL}")
+
+        total = 0
+        for lawd_cd in lawds:
+            with conn.cursor() as cur:
+                cur.execute(LOAD_SQL, (lawd_cd,))
+                rows = cur.fetchall()
+
+            out = compute_lawd(lawd_cd, rows)
+
+            with conn.cursor() as cur:
+                cur.execute(DELETE_SQL, ([lawd_cd],))
+                if out:
+                    execute_values(cur, INSERT_SQL, out, page_size=500)
+            conn.commit()
+            total += len(out)
+            methods = [r[3] for r in out]
+            print(f"[price_index {lawd_cd}] sales={len(rows)} series={len(out)} repeat={methods.count('repeat')} hedonic={methods.count('hedonic')}")
+
+        stage_state.commit_marks(conn, STAGE, marks)
+        conn.commit()
+        print(f"[price_index] Done. series={total}")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, STAGE)
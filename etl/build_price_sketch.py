@@ -0,0 +1,200 @@
+"""(단지, 면적대, 월, 지표)별 병합 가능한 분위수 스케치 (apt_price_sketch).
+
+apt_complex_stats 의 월별 p50 은 합칠 수 없어서(중위수의 중위수 != 중위수)
+"최근 7개월 중위가" 같은 임의 기간 요청은 원본 행을 다시 읽어야 했다.
+월별로 quantile_sketch 를 저장해 두면 API 는 기간 안 스케치를 더해서 p10/p50/p90 을 낸다.
+
+지표(metric): sale(매매가) | jeonse(전세 보증금) | deposit(월세 보증금) | monthly(월세)
+
+python etl/build_price_sketch.py
+"""
+import os
+import db
+import profiling
+import numpy as np
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from pathlib import Path
+
+import stage_state
+import quantile_sketch
+from stats_common import area_bucket, ym_to_index, index_to_ym, encode, combine_keys
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+STAGE = "price_sketch"
+# 1이면 워터마크 무시하고 전체 단지 재계산
+PRICE_SKETCH_FULL = os.environ.get("PRICE_SKETCH_FULL", "0").strip() == "1"
+# 한 번에 메모리에 올릴 단지 수
+CHUNK = int(os.environ.get("PRICE_SKETCH_CHUNK", "2000"))
+
+METRICS = ["sale", "jeonse", "deposit", "monthly"]
+
+# -----------------------------
+# SQL
+# -----------------------------
+# area_bucket: stats_common.area_bucket (-1 = 면적 없음), 백엔드는 면적대 전체면 버킷을 모두 합친다
+# PK 순서를 (단지, 지표, 면적대, 월) 로 둬서 기간 조회가 PK 범위 한 번
+DDL = """
+CREATE TABLE IF NOT EXISTS apt_price_sketch (
+  lawd_cd     text     NOT NULL,
+  apt_nm      text     NOT NULL,
+  metric      text     NOT NULL,
+  area_bucket smallint NOT NULL,
+  ym          char(6)  NOT NULL,
+  n           int      NOT NULL,
+  sketch      bytea    NOT NULL,
+  updated_at  timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (lawd_cd, apt_nm, metric, area_bucket, ym)
+);
+"""
+
+# 해제(취소)된 거래는 제외 (apt_complex_stats 와 같은 기준)
+LOAD_TRADE_SQL = """
+SELECT t.lawd_cd, t.apt_nm, substr(t.deal_ymd, 1, 6), t.exclu_use_ar, 'sale', t.deal_amount_manwon
+FROM apt_trade t
+JOIN unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+  ON t.lawd_cd = k.lawd_cd AND t.apt_nm = k.apt_nm
+WHERE t.deal_amount_manwon > 0
+  AND t.cdeal_type IS NULL;
+"""
+
+# 월세 한 행 -> deposit + monthly 두 값
+LOAD_RENT_SQL = """
+SELECT r.lawd_cd, r.apt_nm, substr(r.deal_ymd, 1, 6), r.exclu_use_ar, v.metric, v.value
+FROM apt_trade_rent r
+JOIN unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+  ON r.lawd_cd = k.lawd_cd AND r.apt_nm = k.apt_nm
+CROSS JOIN LATERAL (VALUES
+  (CASE WHEN COALESCE(r.monthly_rent_manwon, 0) > 0 THEN 'deposit' ELSE 'jeonse' END, r.deposit_manwon),
+  ('monthly', CASE WHEN COALESCE(r.monthly_rent_manwon, 0) > 0 THEN r.monthly_rent_manwon END)
+) AS v(metric, value)
+WHERE v.value IS NOT NULL;
+"""
+
+DELETE_SQL = """
+DELETE FROM apt_price_sketch s
+USING unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+WHERE s.lawd_cd = k.lawd_cd AND s.apt_nm = k.apt_nm;
+"""
+
+INSERT_SQL = """
+INSERT INTO apt_price_sketch (lawd_cd, apt_nm, metric, area_bucket, ym, n, sketch)
+VALUES %s;
+"""
+
+
+# -----------------------------
+# 계산
+# -----------------------------
+def compute_sketches(rows):
+    """원본 행 -> (단지, 지표, 면적대, 월) 그룹별 스케치 행."""
+    if not rows:
+        return []
+    lawd, apt, ym, ar, metric, value = zip(*rows)
+
+    complex_uniq, complex_code = encode(np.array([f"{a}\x1f{b}" for a, b in zip(lawd, apt)], dtype=object))
+    metric_code = np.array([METRICS.index(m) for m in metric], dtype=np.int64)
+    bucket = area_bucket(np.array([np.nan if v is None else float(v) for v in ar], dtype=np.float64)) + 1
+    ym_idx = ym_to_index(np.array(ym))
+    ym_min = int(ym_idx.min())
+    ym_span = int(ym_idx.max()) - ym_min + 1
+
+    key = combine_keys(
+        complex_code, metric_code, bucket.astype(np.int64), ym_idx - ym_min,
+        sizes=[len(complex_uniq), len(METRICS), 7, ym_span],
+    )
+    keys, inv = np.unique(key, return_inverse=True)
+    counts = np.bincount(inv, minlength=len(keys))
+    blobs = quantile_sketch.build_groups(inv, np.array(value, dtype=np.float64), len(keys))
+
+    # 키 분해
+    ym_str = index_to_ym(keys % ym_span + ym_min)
+    rest = keys // ym_span
+    b = rest % 7 - 1
+    rest = rest // 7
+    m = rest % len(METRICS)
+    cidx = rest // len(METRICS)
+
+    out = []
+    for i in range(len(keys)):
+        lawd_cd, apt_nm = complex_uniq[cidx[i]].split("\x1f", 1)
+        out.append((lawd_cd, apt_nm, METRICS[m[i]], int(b[i]), ym_str[i], int(counts[i]), blobs[i]))
+    return out
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    conn.autocommit = False
+
+    try:
+        stage_state.ensure(conn)
+        with conn.cursor() as cur:
+            cur.execute(DDL)
+        conn.commit()
+
+        complexes, marks = stage_state.pending(conn, STAGE, full=PRICE_SKETCH_FULL)
+        complexes = sorted(complexes)
+        print(f"[price_sketch] touched complexes={len(complexes)} full={PRICE_SKETCH_FULL}")
+
+        total_rows = 0
+        for i in range(0, len(complexes), CHUNK):
+            chunk = complexes[i:i + CHUNK]
+            lawds = [c[0] for c in chunk]
+            apts = [c[1] for c in chunk]
+
+            with conn.cursor() as cur:
+                cur.execute(LOAD_TRADE_SQL, (lawds, apts))
+                rows = cur.fetchall()
+                cur.execute(LOAD_RENT_SQL, (lawds, apts))
+                rows += cur.fetchall()
+
+            out = compute_sketches(rows)
+
+            with conn.cursor() as cur:
+                cur.execute(DELETE_SQL, (lawds, apts))
+                if out:
+                    execute_values(cur, INSERT_SQL, out, page_size=1000)
+            conn.commit()
+
+            total_rows += len(out)
+            print(f"[price_sketch] complexes={i + len(chunk)}/{len(complexes)} values={len(rows)} sketches={len(out)}")
+
+        stage_state.commit_marks(conn, STAGE, marks)
+        conn.commit()
+        print(f"[price_sketch] Done. sketches={total_rows}")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, STAGE)
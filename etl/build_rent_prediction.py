@@ -0,0 +1,348 @@
+import os
+import db
+import profiling
+import numpy as np
+from datetime import datetime
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from pathlib import Path
+
+import stage_state
+from stats_common import area_bucket, encode, combine_keys, group_sum, group_count, group_quantiles
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+STAGE = "rent_prediction"
+# 1이면 전체 단지 재계산
+RENT_PRED_FULL = os.environ.get("RENT_PRED_FULL", "0").strip() == "1"
+# 학습에 쓰는 최근 개월 수
+WINDOW_MONTHS = int(os.environ.get("RENT_PRED_MONTHS", "24"))
+# 시군구 모델을 만들 최소 계약 수
+MIN_ROWS = int(os.environ.get("RENT_PRED_MIN_ROWS", "50"))
+
+# 예측 구간 (로그 정규 가정, 10% ~ 90%)
+Z_BAND = 1.2816
+
+# rent_type 별 (예측 대상 컬럼, 로그 변환)
+# 월세 계약의 보증금은 0 일 수 있어 log1p, 전세는 보증금 0 인 행을 학습에서 뺀다 (log(0) = -inf)
+TARGETS = {
+    "jeonse": {"deposit": np.log},
+    "monthly": {"monthly": np.log, "deposit": np.log1p},
+}
+_INVERSE = {np.log: np.exp, np.log1p: np.expm1}
+
+# 워터마크는 전월세만 본다 (매매만 들어온 단지는 다시 계산하지 않음)
+SOURCES = ("apt_trade_rent", stage_state.CHANGE_SOURCE)
+
+# -----------------------------
+# SQL
+# -----------------------------
+DDL = """
+CREATE TABLE IF NOT EXISTS apt_rent_prediction (
+  lawd_cd      text     NOT NULL,
+  apt_nm       text     NOT NULL,
+  area_bucket  smallint NOT NULL,
+  rent_type    text     NOT NULL,
+  area_m2      numeric(6,2),
+  deposit      int,
+  deposit_p10  int,
+  deposit_p90  int,
+  monthly      int,
+  monthly_p10  int,
+  monthly_p90  int,
+  n_obs        int      NOT NULL,
+  model_n      int      NOT NULL,
+  as_of_ym     char(6)  NOT NULL,
+  updated_at   timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (lawd_cd, apt_nm, area_bucket, rent_type)
+);
+"""
+
+ALL_LAWD_SQL = "SELECT DISTINCT lawd_cd FROM apt_trade_rent;"
+
+# 전월세 API 에는 준공연도가 없어 매매 거래의 준공연도(단지별 중앙값)를 붙인다
+# 갱신 계약: contract_type = '갱신' 이거나 종전 보증금이 있는 계약 (5% 상한이라 신규보다 낮다)
+LOAD_SQL = """
+WITH by AS (
+  SELECT apt_nm, percentile_disc(0.5) WITHIN GROUP (ORDER BY build_year) AS build_year
+  FROM apt_trade
+  WHERE lawd_cd = %s AND build_year IS NOT NULL
+  GROUP BY apt_nm
+)
+SELECT
+  r.umd_nm, r.apt_nm, r.deal_year * 12 + r.deal_month - 1,
+  r.exclu_use_ar, r.floor, b.build_year,
+  r.deposit_manwon, COALESCE(r.monthly_rent_manwon, 0),
+  (COALESCE(r.contract_type, '') = '갱신' OR r.pre_deposit_manwon IS NOT NULL)
+FROM apt_trade_rent r
+LEFT JOIN by b ON b.apt_nm = r.apt_nm
+WHERE r.lawd_cd = %s
+  AND r.exclu_use_ar > 0
+  AND r.deposit_manwon IS NOT NULL
+  AND r.deal_year * 12 + r.deal_month - 1 >= %s;
+"""
+
+DELETE_SQL = """
+DELETE FROM apt_rent_prediction s
+USING unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+WHERE s.lawd_cd = k.lawd_cd AND s.apt_nm = k.apt_nm;
+"""
+
+INSERT_SQL = """
+INSERT INTO apt_rent_prediction (
+  lawd_cd, apt_nm, area_bucket, rent_type, area_m2,
+  deposit, deposit_p10, deposit_p90, monthly, monthly_p10, monthly_p90,
+  n_obs, model_n, as_of_ym
+) VALUES %s;
+"""
+
+
+# -----------------------------
+# 모델
+# -----------------------------
+def _arrays(rows):
+    umd, apt, t, ar, fl, by, dep, mon, renewal = zip(*rows)
+
+    def f64(vals):
+        return np.array([np.nan if v is None else float(v) for v in vals], dtype=np.float64)
+
+    _, umd_code = encode(umd)
+    apt_uniq, apt_code = encode(apt)
+    return {
+        "apt_uniq": apt_uniq,
+        "apt": apt_code,
+        "umd": umd_code,
+        "t": np.array(t, dtype=np.int64),
+        "area": f64(ar),
+        "floor": f64(fl),
+        "build_year": f64(by),
+        "deposit": f64(dep),
+        "monthly": f64(mon),
+        "renewal": np.array(renewal, dtype=bool),
+    }
+
+
+def _fill(x, fill):
+    return np.where(np.isfinite(x), x, fill)
+
+
+class _Design:
+    """설계 행렬: 상수, log 면적, 층, 연식, 시간 추세(년), 갱신 여부, 법정동 더미."""
+
+    def __init__(self, d, t_ref):
+        self.t_ref = t_ref
+        self.n_umd = int(d["umd"].max()) + 1
+        self.floor_fill = float(np.nanmedian(d["floor"])) if np.isfinite(d["floor"]).any() else 0.0
+        age = t_ref / 12 - d["build_year"]
+        self.age_fill = float(np.nanmedian(age)) if np.isfinite(age).any() else 0.0
+
+    def build(self, area, floor, build_year, t, renewal, umd):
+        n = len(area)
+        floor = np.clip(_fill(floor, self.floor_fill), -1, 50)
+        age = _fill(self.t_ref / 12 - build_year, self.age_fill)
+        x = np.zeros((n, 6 + self.n_umd - 1))
+        x[:, 0] = 1.0
+        x[:, 1] = np.log(area)
+        x[:, 2] = floor / 10
+        x[:, 3] = age / 10
+        x[:, 4] = (t - self.t_ref) / 12
+        x[:, 5] = renewal
+        # 첫 법정동이 기준
+        rows = np.nonzero(umd > 0)[0]
+        x[rows, 6 + umd[rows] - 1] = 1.0
+        return x
+
+
+def fit(x, y, group, n_groups):
+    """최소제곱 + 단지 효과(경험적 베이즈 축소).
+
+    반환: beta, 단지 효과 u, 단지별 관측 수, 단지 내 분산 s2w, 단지 간 분산 tau2
+    """
+    beta, *_ = np.linalg.lstsq(x, y, rcond=None)
+    resid = y - x @ beta
+    n_c = group_count(group, n_groups)
+    mean_c = group_sum(group, resid, n_groups) / np.maximum(n_c, 1)
+    dof = max(len(y) - x.shape[1] - int((n_c > 0).sum()), 1)
+    s2w = float(((resid - mean_c[group]) ** 2).sum() / dof)
+    has = n_c > 0
+    tau2 = max(float(np.var(mean_c[has]) - np.mean(s2w / n_c[has])), 1e-6) if has.any() else 1e-6
+    u = mean_c * n_c / (n_c + s2w / tau2)
+    return beta, u, n_c, s2w, tau2
+
+
+def _grid(d, mask):
+    """예측할 (단지, 면적대): 대표 면적 / 층 = 그 단지·면적대 계약의 중앙값."""
+    bucket = area_bucket(d["area"][mask]).astype(np.int64)
+    apt = d["apt"][mask]
+    n_apt = len(d["apt_uniq"])
+    key = combine_keys(apt, bucket, sizes=[n_apt, 6])
+    keys, inv = np.unique(key, return_inverse=True)
+    g = len(keys)
+    area = group_quantiles(inv, d["area"][mask], g, (0.5,))[:, 0]
+    floor_v = d["floor"][mask]
+    fin = np.isfinite(floor_v)
+    floor = group_quantiles(inv[fin], floor_v[fin], g, (0.5,))[:, 0] if fin.any() else np.full(g, np.nan)
+    # 단지 속성(법정동, 준공연도)은 첫 계약 값
+    _, first_pos = np.unique(inv, return_index=True)
+    first = np.nonzero(mask)[0][first_pos]
+    return {
+        "apt": keys // 6,
+        "bucket": keys % 6,
+        "area": area,
+        "floor": floor,
+        "build_year": d["build_year"][first],
+        "umd": d["umd"][first],
+        "n_obs": group_count(inv, g),
+    }
+
+
+def predict_lawd(lawd_cd, rows, targets: set[str] | None, t_ref: int):
+    """시군구 하나: rent_type 별 모델 학습 후 targets(단지명 집합, None 이면 전체) 예측 행."""
+    if not rows:
+        return []
+    d = _arrays(rows)
+    design = _Design(d, t_ref)
+    n_apt = len(d["apt_uniq"])
+    as_of = f"{t_ref // 12:04d}{t_ref % 12 + 1:02d}"
+
+    kinds = {
+        "jeonse": (d["monthly"] == 0) & (d["deposit"] > 0),
+        "monthly": d["monthly"] > 0,
+    }
+    out = {}
+    for kind, mask in kinds.items():
+        if mask.sum() < MIN_ROWS:
+            continue
+        x = design.build(
+            d["area"][mask], d["floor"][mask], d["build_year"][mask],
+            d["t"][mask], d["renewal"][mask], d["umd"][mask],
+        )
+        grid = _grid(d, mask)
+        gx = design.build(
+            grid["area"], grid["floor"], grid["build_year"],
+            np.full(len(grid["apt"]), t_ref), np.zeros(len(grid["apt"])), grid["umd"],
+        )
+        preds = {}
+        for col, fwd in TARGETS[kind].items():
+            y = fwd(d[col][mask])
+            beta, u, n_c, s2w, tau2 = fit(x, y, d["apt"][mask], n_apt)
+            mu = gx @ beta + u[grid["apt"]]
+            # 새 계약 하나의 예측 분산 = 단지 내 분산 + 단지 효과 추정 분산
+            var = s2w + tau2 * s2w / (n_c[grid["apt"]] * tau2 + s2w)
+            sd = np.sqrt(var)
+            inv = _INVERSE[fwd]
+            preds[col] = (inv(mu), inv(mu - Z_BAND * sd), inv(mu + Z_BAND * sd))
+
+        for i in range(len(grid["apt"])):
+            apt_nm = str(d["apt_uniq"][grid["apt"][i]])
+            if targets is not None and apt_nm not in targets:
+                continue
+            # 값이 이상해 예측이 inf/NaN 이 된 칸은 건너뛴다 (int 변환에서 스테이지 전체가 죽지 않게)
+            if not all(np.isfinite(v[i]) for p in preds.values() for v in p):
+                continue
+
+            def iv(col, j):
+                return int(round(float(preds[col][j][i]))) if col in preds else None
+
+            out[(apt_nm, int(grid["bucket"][i]), kind)] = (
+                lawd_cd, apt_nm, int(grid["bucket"][i]), kind,
+                round(float(grid["area"][i]), 2),
+                iv("deposit", 0), iv("deposit", 1), iv("deposit", 2),
+                iv("monthly", 0), iv("monthly", 1), iv("monthly", 2),
+                int(grid["n_obs"][i]), int(mask.sum()), as_of,
+            )
+    return list(out.values())
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    conn.autocommit = False
+
+    try:
+        stage_state.ensure(conn)
+        with conn.cursor() as cur:
+            cur.execute(DDL)
+        conn.commit()
+
+        last = {source: stage_state.get_last_id(conn, STAGE, source) for source in SOURCES}
+        marks = {source: stage_state.max_id(conn, source) for source in SOURCES}
+        # 처음 실행이면 전체
+        full = RENT_PRED_FULL or not any(last.values())
+        touched: set[tuple[str, str]] = set()
+        if not full:
+            for source in SOURCES:
+                touched |= stage_state.touched_complexes(conn, source, last[source], marks[source])
+
+        if full:
+            with conn.cursor() as cur:
+                cur.execute(ALL_LAWD_SQL)
+                by_lawd = {r[0]: None for r in cur.fetchall()}
+        else:
+            by_lawd: dict[str, set[str] | None] = {}
+            for lawd_cd, apt_nm in touched:
+                by_lawd.setdefault(lawd_cd, set()).add(apt_nm)
+        print(f"[rent_pred] target sgg={len(by_lawd)} complexes={'all' if full else len(touched)} full={full}")
+
+        now = datetime.now()
+        t_ref = now.year * 12 + now.month - 1
+        t_min = t_ref - WINDOW_MONTHS + 1
+
+        total = 0
+        for lawd_cd in sorted(by_lawd):
+            targets = by_lawd[lawd_cd]
+            with conn.cursor() as cur:
+                cur.execute(LOAD_SQL, (lawd_cd, lawd_cd, t_min))
+                rows = cur.fetchall()
+
+            out = predict_lawd(lawd_cd, rows, targets, t_ref)
+
+            with conn.cursor() as cur:
+                if targets is None:
+                    cur.execute("DELETE FROM apt_rent_prediction WHERE lawd_cd = %s;", (lawd_cd,))
+                else:
+                    apts = sorted(targets)
+                    cur.execute(DELETE_SQL, ([lawd_cd] * len(apts), apts))
+                if out:
+                    execute_values(cur, INSERT_SQL, out, page_size=1000)
+            conn.commit()
+            total += len(out)
+            print(f"[rent_pred {lawd_cd}] contracts={len(rows)} rows={len(out)}")
+
+        stage_state.commit_marks(conn, STAGE, marks)
+        conn.commit()
+        print(f"[rent_pred] Done. rows={total}")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, STAGE)
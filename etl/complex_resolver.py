@@ -0,0 +1,157 @@
+"""단지명 정규화 / 단지 식별(entity resolution).
+
+같은 단지가 띄어쓰기, 괄호, "아파트"/"제1단지"/"101동" 같은 표기 차이로 여러 apt_nm 으로 들어온다.
+각 표기가 따로 v_apt_places 에 잡혀서 지오코딩, 지도 포인트, 차트 이력이 모두 쪼개진다.
+
+- name_key(apt_nm): 비교용 정규화 키
+- apt_complex_alias: (lawd_cd, umd_nm, apt_nm, jibun) 원래 표기 -> canon_apt_nm (대표 표기)
+- Resolver: 수집 시 적재 직전에 items 의 apt_nm 을 대표 표기로 바꾸고, 처음 본 표기는 alias 로 저장
+
+매칭 순서 (같은 lawd_cd, umd_nm 안에서만)
+  1) 이미 본 표기
+  2) name_key 가 같은 단지
+  3) 지번이 같고 일반 접미어("단지", "주상복합")만 떼면 name_key 가 같은 단지
+     (지번 없이 이름만 비슷한 경우, 단지/차 번호가 다른 경우는 합치지 않음)
+  4) 없으면 새 단지 (자기 자신이 대표)
+위치 기반 병합은 지오코딩 후 resolve_complexes.py 에서 한다.
+"""
+import re
+import unicodedata
+
+from psycopg2.extras import execute_values
+
+ALIAS_DDL = """
+CREATE TABLE IF NOT EXISTS apt_complex_alias (
+  lawd_cd      text NOT NULL,
+  umd_nm       text NOT NULL,
+  apt_nm       text NOT NULL,
+  jibun        text NOT NULL DEFAULT '',
+  name_key     text NOT NULL,
+  canon_apt_nm text NOT NULL,
+  method       text NOT NULL,
+  updated_at   timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (lawd_cd, umd_nm, apt_nm, jibun)
+);
+CREATE INDEX IF NOT EXISTS apt_complex_alias_canon_idx ON apt_complex_alias (lawd_cd, canon_apt_nm);
+"""
+
+LOAD_SQL = """
+SELECT lawd_cd, umd_nm, apt_nm, jibun, name_key, canon_apt_nm
+FROM apt_complex_alias
+WHERE %s::text[] IS NULL OR lawd_cd = ANY(%s::text[]);
+"""
+
+INSERT_SQL = """
+INSERT INTO apt_complex_alias (lawd_cd, umd_nm, apt_nm, jibun, name_key, canon_apt_nm, method)
+VALUES %s
+ON CONFLICT (lawd_cd, umd_nm, apt_nm, jibun) DO NOTHING;
+"""
+
+_BRACKETS_RE = re.compile(r"[()\[\]{}<>]")
+_PUNCT_RE = re.compile(r"[\s\-_.,·ㆍ'\"/&~]+")
+_DANJI_RE = re.compile(r"제(\d+)(단지|차)")
+_DONG_RE = re.compile(r"\d{1,4}동$")
+_APT_WORD_RE = re.compile(r"(아파트|apartment|apt)")
+# 번호 없이 붙는 일반 접미어 ("한라단지" = "한라"). "1단지"/"2차" 같은 번호는 떼지 않는다.
+_GENERIC_SUFFIX_RE = re.compile(r"(?<!\d)(단지|주상복합)$")
+
+
+def name_key(apt_nm: str) -> str:
+    """'한라 아파트(제1단지)' -> '한라1단지'"""
+    s = unicodedata.normalize("NFKC", apt_nm or "").lower()
+    s = _BRACKETS_RE.sub("", s)
+    s = _PUNCT_RE.sub("", s)
+    s = _DANJI_RE.sub(r"\1\2", s)
+    # 동 번호는 단지명이 남아 있을 때만 뗀다 ("101동" 자체가 이름이면 그대로)
+    t = _DONG_RE.sub("", s)
+    if len(t) >= 2:
+        s = t
+    t = _APT_WORD_RE.sub("", s)
+    if len(t) >= 2:
+        s = t
+    return s or (apt_nm or "").strip()
+
+
+def _core_key(key: str) -> str:
+    t = _GENERIC_SUFFIX_RE.sub("", key)
+    return t if len(t) >= 2 else key
+
+
+def related(a: str, b: str) -> bool:
+    """지번/위치가 같을 때 같은 단지로 볼 만한 이름인지.
+
+    name_key 가 같거나 일반 접미어만 다를 때만 True.
+    '한라' / '한라2차', '부영' / '부영3차' 처럼 번호가 붙은 이름은 옆 단지(다른 차수)일 수 있어서 합치지 않는다.
+    """
+    if not a or not b:
+        return False
+    return a == b or _core_key(a) == _core_key(b)
+
+
+class Resolver:
+    """적재 스레드에서 한 실행 동안 쓰는 alias 캐시."""
+
+    def __init__(self, conn, lawd_cds: list[str] | None = None):
+        self.alias: dict[tuple, str] = {}
+        self.by_key: dict[tuple, str] = {}
+        self.by_jibun: dict[tuple, list[tuple[str, str]]] = {}
+        self.pending: list[tuple] = []
+
+        with conn.cursor() as cur:
+            cur.execute(ALIAS_DDL)
+            cur.execute(LOAD_SQL, (lawd_cds, lawd_cds))
+            rows = cur.fetchall()
+        conn.commit()
+
+        for lawd_cd, umd_nm, apt_nm, jibun, key, canon in rows:
+            self._remember(lawd_cd, umd_nm, apt_nm, jibun, key, canon)
+
+    def _remember(self, lawd_cd, umd_nm, apt_nm, jibun, key, canon):
+        self.alias[(lawd_cd, umd_nm, apt_nm, jibun)] = canon
+        self.by_key.setdefault((lawd_cd, umd_nm, key), canon)
+        if jibun:
+            cands = self.by_jibun.setdefault((lawd_cd, umd_nm, jibun), [])
+            if (key, canon) not in cands:
+                cands.append((key, canon))
+
+    def resolve(self, lawd_cd: str, umd_nm: str, apt_nm: str, jibun: str | None) -> str:
+        jibun = jibun or ""
+        k = (lawd_cd, umd_nm, apt_nm, jibun)
+        canon = self.alias.get(k)
+        if canon is not None:
+            return canon
+
+        key = name_key(apt_nm)
+        method = "name"
+        canon = self.by_key.get((lawd_cd, umd_nm, key))
+        if canon is None and jibun:
+            method = "jibun"
+            for other_key, other_canon in self.by_jibun.get((lawd_cd, umd_nm, jibun), []):
+                if related(key, other_key):
+                    canon = other_canon
+                    break
+        if canon is None:
+            method = "self"
+            canon = apt_nm
+
+        self._remember(lawd_cd, umd_nm, apt_nm, jibun, key, canon)
+        self.pending.append((lawd_cd, umd_nm, apt_nm, jibun, key, canon, method))
+        return canon
+
+    def apply(self, cur, items: list[dict]) -> list[dict]:
+        """items 의 apt_nm 을 대표 표기로 바꾸고 새 alias 를 같은 트랜잭션에 저장."""
+        for it in items:
+            if not it.get("apt_nm") or not it.get("umd_nm"):
+                continue
+            canon = self.resolve(it["lawd_cd"], it["umd_nm"], it["apt_nm"], it.get("jibun"))
+            if canon != it["apt_nm"]:
+                it["apt_nm"] = canon
+                # apt_nm 은 자연키 지문(row_fp)에 들어가므로 적재 직전에 다시 계산하게 한다
+                it.pop("row_fp", None)
+        self.flush(cur)
+        return items
+
+    def flush(self, cur):
+        if self.pending:
+            execute_values(cur, INSERT_SQL, self.pending, page_size=1000)
+            self.pending.clear()
@@ -0,0 +1,77 @@
+"""ETL 공용 DB 접속.
+
+스크립트를 단독 실행하면 매번 새 커넥션을 연다.
+스케줄러(scheduler.py)처럼 한 프로세스에서 여러 번 실행할 때는 install_pool() 로
+커넥션 풀을 깔아 두면 connect() 가 풀에서 꺼낸 커넥션을 돌려주고,
+close() 는 실제로 끊지 않고 풀에 반납한다.
+"""
+import os
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+_pool: ThreadedConnectionPool | None = None
+
+
+def dsn_from_env() -> dict:
+    return {
+        "host": os.environ.get("PGHOST", "localhost").strip(),
+        "port": int(os.environ.get("PGPORT", "5432").strip()),
+        "dbname": os.environ.get("PGDATABASE", "proptech").strip(),
+        "user": os.environ.get("PGUSER", "postgres").strip(),
+        "password": os.environ.get("PGPASSWORD", "").strip(),
+    }
+
+
+class _PooledConnection:
+    """풀 커넥션 래퍼: close() = 롤백 후 풀 반납, 나머지는 원래 커넥션에 위임."""
+
+    def __init__(self, pool: ThreadedConnectionPool, conn):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def close(self):
+        conn = self._conn
+        if conn is None:
+            return
+        object.__setattr__(self, "_conn", None)
+        broken = bool(conn.closed)
+        if not broken:
+            try:
+                conn.rollback()
+                conn.autocommit = False
+            except psycopg2.Error:
+                broken = True
+        self._pool.putconn(conn, close=broken)
+
+
+def install_pool(minconn: int = 1, maxconn: int = 4, **dsn):
+    global _pool
+    if _pool is None:
+        _pool = ThreadedConnectionPool(minconn, maxconn, **(dsn or dsn_from_env()))
+    return _pool
+
+
+def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
+
+
+def connect(**dsn):
+    """풀이 있으면 풀 커넥션, 없으면 psycopg2.connect(**dsn)."""
+    if _pool is not None:
+        conn = _pool.getconn()
+        if conn.closed:
+            # 쉬는 동안 서버 쪽에서 끊긴 커넥션은 버리고 새로 받는다
+            _pool.putconn(conn, close=True)
+            conn = _pool.getconn()
+        return _PooledConnection(_pool, conn)
+    return psycopg2.connect(**dsn)
@@ -0,0 +1,225 @@
+import os
+import json
+import db
+import profiling
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import datetime
+from dotenv import load_dotenv
+from pathlib import Path
+
+import stage_state
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+EXPORT_DIR = Path(os.environ.get("EXPORT_DIR", str(REPO_ROOT / "export" / "parquet")))
+# 1이면 상태 파일을 무시하고 전체 파티션을 다시 쓴다
+EXPORT_FULL = os.environ.get("EXPORT_FULL", "0").strip() == "1"
+
+STATE_FILE = "_export_state.json"
+
+# 이름/코드류는 dictionary 인코딩 (단지명·법정동은 카디널리티가 낮고 반복이 많음)
+DICT_STR = pa.dictionary(pa.int32(), pa.string())
+
+# 컬럼 타입은 파서가 만드는 값 기준 (만원 금액=int, 전용면적=float)
+TABLES = {
+    "apt_trade": [
+        ("id", pa.int64()),
+        ("lawd_cd", DICT_STR),
+        ("deal_ymd", DICT_STR),
+        ("umd_nm", DICT_STR),
+        ("apt_nm", DICT_STR),
+        ("jibun", DICT_STR),
+        ("deal_year", pa.int16()),
+        ("deal_month", pa.int8()),
+        ("deal_day", pa.int8()),
+        ("deal_amount_manwon", pa.int32()),
+        ("exclu_use_ar", pa.float64()),
+        ("floor", pa.int16()),
+        ("build_year", pa.int16()),
+        ("dealing_gbn", DICT_STR),
+        ("estate_agent_sgg_nm", DICT_STR),
+        ("rgst_date", pa.string()),
+        ("apt_dong", DICT_STR),
+        ("cdeal_type", DICT_STR),
+        ("cdeal_day", pa.string()),
+        ("sler_gbn", DICT_STR),
+        ("buyer_gbn", DICT_STR),
+        ("land_leasehold_gbn", DICT_STR),
+    ],
+    "apt_trade_rent": [
+        ("id", pa.int64()),
+        ("lawd_cd", DICT_STR),
+        ("deal_ymd", DICT_STR),
+        ("umd_nm", DICT_STR),
+        ("apt_nm", DICT_STR),
+        ("jibun", DICT_STR),
+        ("deal_year", pa.int16()),
+        ("deal_month", pa.int8()),
+        ("deal_day", pa.int8()),
+        ("deposit_manwon", pa.int32()),
+        ("monthly_rent_manwon", pa.int32()),
+        ("exclu_use_ar", pa.float64()),
+        ("floor", pa.int16()),
+        ("contract_term", pa.string()),
+        ("contract_type", DICT_STR),
+        ("use_rr_right", DICT_STR),
+        ("pre_deposit_manwon", pa.int32()),
+        ("pre_monthly_rent_manwon", pa.int32()),
+    ],
+}
+
+# -----------------------------
+# SQL
+# -----------------------------
+TOUCHED_SQL = """
+SELECT DISTINCT lawd_cd, substr(deal_ymd, 1, 6) AS ym
+FROM {table}
+WHERE id > %s AND id <= %s;
+"""
+
+# merge 모드에서 값이 바뀐 행 (id 는 그대로라 변경 로그로 찾는다)
+CHANGED_SQL = """
+SELECT DISTINCT lawd_cd, substr(deal_ymd, 1, 6) AS ym
+FROM etl_row_change
+WHERE source = %s AND id > %s AND id <= %s AND deal_ymd IS NOT NULL;
+"""
+
+PARTITION_SQL = """
+SELECT {cols}
+FROM {table}
+WHERE lawd_cd = %s
+  AND substr(deal_ymd, 1, 6) = %s
+  AND id <= %s
+ORDER BY apt_nm, deal_day, id;
+"""
+
+
+# -----------------------------
+# 유틸
+# -----------------------------
+def _read_state():
+    p = EXPORT_DIR / STATE_FILE
+    if not p.exists():
+        return {}
+    return json.loads(p.read_text(encoding="utf-8"))
+
+
+def _write_state(state: dict):
+    p = EXPORT_DIR / STATE_FILE
+    tmp = p.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, p)
+
+
+def _to_arrow(rows, columns):
+    arrays = []
+    for i, (name, typ) in enumerate(columns):
+        values = [r[i] for r in rows]
+        if typ == DICT_STR:
+            arrays.append(pa.array([None if v is None else str(v) for v in values], pa.string()).dictionary_encode())
+        elif pa.types.is_floating(typ):
+            arrays.append(pa.array([None if v is None else float(v) for v in values], typ))
+        elif pa.types.is_integer(typ):
+            arrays.append(pa.array([None if v is None else int(v) for v in values], typ))
+        else:
+            arrays.append(pa.array([None if v is None else str(v) for v in values], typ))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(columns))
+
+
+def partition_path(table: str, lawd_cd: str, ym: str) -> Path:
+    return EXPORT_DIR / table / f"lawd_cd={lawd_cd}" / f"deal_ym={ym}" / "data.parquet"
+
+
+def export_partition(conn, table: str, columns, lawd_cd: str, ym: str, max_id: int) -> int:
+    cols = ", ".join(name for name, _ in columns)
+    with conn.cursor() as cur:
+        cur.execute(PARTITION_SQL.format(cols=cols, table=table), (lawd_cd, ym, max_id))
+        rows = cur.fetchall()
+
+    out = partition_path(table, lawd_cd, ym)
+    if not rows:
+        if out.exists():
+            out.unlink()
+        return 0
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".parquet.tmp")
+    pq.write_table(_to_arrow(rows, columns), tmp, compression="zstd")
+    os.replace(tmp, out)
+    return len(rows)
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    state = {} if EXPORT_FULL else _read_state()
+    print(f"[export] dir={EXPORT_DIR} full={EXPORT_FULL}")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    conn.autocommit = True
+
+    try:
+        stage_state.ensure(conn)
+        change_max = stage_state.max_id(conn, stage_state.CHANGE_SOURCE)
+        change_last = int(state.get(stage_state.CHANGE_SOURCE, {}).get("max_id", 0))
+
+        for table, columns in TABLES.items():
+            last_id = int(state.get(table, {}).get("max_id", 0))
+
+            # 늦게 커밋되는 낮은 id 를 건너뛰지 않도록 진행 중인 적재가 끝난 뒤의 MAX(id)
+            max_id = stage_state.max_id(conn, table)
+            with conn.cursor() as cur:
+                # 마지막 export 이후 새로 들어온 행이 속한 (지역, 월) 파티션만 다시 쓴다
+                cur.execute(TOUCHED_SQL.format(table=table), (last_id, max_id))
+                touched = set(cur.fetchall())
+                cur.execute(CHANGED_SQL, (table, change_last, change_max))
+                touched = sorted(touched | set(cur.fetchall()))
+
+            rows_written = 0
+            for lawd_cd, ym in touched:
+                n = export_partition(conn, table, columns, lawd_cd, ym, max_id)
+                rows_written += n
+                print(f"[export {table} {lawd_cd} {ym}] rows={n}")
+
+            state[table] = {"max_id": max_id, "exported_at": datetime.now().isoformat(timespec="seconds")}
+            _write_state(state)
+            print(f"[export] {table} partitions={len(touched)} rows={rows_written} max_id={max_id}")
+
+        state[stage_state.CHANGE_SOURCE] = {"max_id": change_max}
+        _write_state(state)
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, "export")
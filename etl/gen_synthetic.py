@@ -0,0 +1,473 @@
+"""용량 테스트용 합성 데이터 (apt_trade / apt_trade_rent / apt_location).
+
+실데이터는 제주 두 시군구뿐이라 SELECT_MISSING, 지도 타일 SQL, 차트 집계가
+전국 규모(시군구 250개, 수천만 행)에서 어떻게 도는지 볼 수 없다.
+그럴듯한 분포로 전국 규모 거래를 만들어 COPY 로 넣는다.
+
+  - 지역: 가짜 시군구 코드 9xxxx (실제 코드는 11~52 로 시작 -> 실데이터와 섞이지 않고 --drop 으로 지움)
+  - 공간: 시군구 중심(한반도 범위) 주변에 법정동, 법정동 중심 주변에 단지가 몰린다
+  - 단지: 법정동마다 음이항 분포 개수, 세대수 로그정규, 준공연도, 2~4개 면적 타입(59/84㎡ 위주), 최고층
+  - 가격: log(가격) = 시군구 수준 + 법정동/단지 효과 + log(면적) - 노후 감가 + 층 프리미엄 + 월별 지수 + 잡음
+          월별 지수는 시군구별 랜덤워크 + 전국 공통 사이클
+  - 거래량: 단지 세대수 × 회전율 × 계절성(봄/가을 많고 1·8월 적음) × 시장 사이클, 포아송
+  - 전월세: 전세가율 0.5~0.8, 월세 비중은 기간 뒤로 갈수록 증가, 월세 = (전세 - 보증금) × 전환율
+  - 해제 2%, 등기 / 거래유형 / 매도·매수자 구분도 채운다
+  - row_fp 를 찍어서 넣으므로 merge / 파생 스테이지가 실데이터와 똑같이 동작
+    (같은 지문이 나오면 계약일/층을 다시 뽑아 시군구 안에서 중복 0건, COPY 전에 확인)
+
+시군구 하나를 한 워커 프로세스가 만들고 자기 커넥션으로 COPY 한다 (같은 --seed 면 같은 데이터).
+다시 실행하면 그 시군구의 합성 행을 지우고 새로 넣는다.
+
+python etl/gen_synthetic.py [--regions 250] [--start 201501] [--end 202412] [--scale 1.0] [--seed 42] [--workers N]
+python etl/gen_synthetic.py --drop
+"""
+import io
+import os
+import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+import db
+import geohash
+import profiling
+import ingest_rent_backfill
+import merge_upsert
+import recent_ring
+import row_fp
+
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+SYNTH_WORKERS = int(os.environ.get("SYNTH_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+
+# 가짜 시군구 코드 접두어
+LAWD_PREFIX = "9"
+
+# 한반도 본토 대략 범위 (시군구 중심)
+LAT_RANGE = (34.8, 37.9)
+LNG_RANGE = (126.6, 129.3)
+# 도(degree) 단위 퍼짐: 법정동 중심 ~3km, 단지 ~400m
+UMD_SPREAD = 0.03
+COMPLEX_SPREAD = 0.004
+
+AREA_TYPES = np.array([39.0, 49.0, 59.9, 74.9, 84.9, 101.9, 114.9, 134.9, 164.9])
+AREA_WEIGHTS = np.array([0.04, 0.08, 0.25, 0.12, 0.30, 0.08, 0.06, 0.04, 0.03])
+MAX_TYPES = 4
+
+BRANDS = [
+    "래미안", "자이", "힐스테이트", "푸르지오", "e편한세상", "아이파크", "더샵", "롯데캐슬",
+    "한신", "주공", "현대", "삼성", "우성", "대림", "쌍용", "벽산", "한양", "금호", "동아", "부영",
+]
+SYLLABLES = list("신중동서남북상하대소송매화청월산정평연수도봉양원금은용장")
+
+# 월별 거래량 계수 (1~12월)
+SEASON = np.array([0.75, 0.95, 1.2, 1.15, 1.05, 1.0, 0.95, 0.8, 1.0, 1.15, 1.05, 0.95])
+# 연간 회전율 (세대수 대비)
+SALE_TURNOVER = 0.05
+RENT_TURNOVER = 0.08
+CANCEL_RATE = 0.02
+# 월세 전환율 (연)
+RENT_CONVERSION = 0.05
+
+# COPY 컬럼 = 수집 로더와 같은 컬럼 (row_fp 포함)
+TRADE_COLUMNS = merge_upsert.SPECS["apt_trade"]["columns"]
+RENT_COLUMNS = merge_upsert.SPECS["apt_trade_rent"]["columns"]
+LOCATION_COLUMNS = ["lawd_cd", "umd_nm", "apt_nm", "jibun", "lat", "lng", "geom", "geohash", "kakao_address", "geo_source"]
+
+# -----------------------------
+# SQL
+# -----------------------------
+ENSURE_LOCATION = """
+ALTER TABLE apt_location ADD COLUMN IF NOT EXISTS geohash text;
+ALTER TABLE apt_location ADD COLUMN IF NOT EXISTS geo_source text;
+"""
+
+DELETE_SQL = {
+    t: f"DELETE FROM {t} WHERE lawd_cd = ANY(%s::text[]);"
+    for t in ("apt_trade", "apt_trade_rent", "apt_location", "apt_recent_deal")
+}
+
+DROP_SQL = {
+    t: f"DELETE FROM {t} WHERE lawd_cd LIKE '{LAWD_PREFIX}%%';"
+    for t in ("apt_trade", "apt_trade_rent", "apt_location", "apt_recent_deal")
+}
+
+COPY_SQL = "COPY {table} ({cols}) FROM STDIN WITH (FORMAT text);"
+
+
+# -----------------------------
+# 생성
+# -----------------------------
+def month_range(start_ym: str, end_ym: str) -> list[tuple[int, int]]:
+    y, m = int(start_ym[:4]), int(start_ym[4:])
+    ey, em = int(end_ym[:4]), int(end_ym[4:])
+    out = []
+    while (y, m) <= (ey, em):
+        out.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+
+def _names(rng, n: int, suffix: str) -> list[str]:
+    out: list[str] = []
+    seen: set[str] = set()
+    while len(out) < n:
+        base = "".join(rng.choice(SYLLABLES, size=2))
+        name, k = base + suffix, 1
+        while name in seen:
+            k += 1
+            name = f"{base}{k}{suffix}"
+        seen.add(name)
+        out.append(name)
+    return out
+
+
+def _yymmdd(d: date) -> str:
+    return d.strftime("%y.%m.%d")
+
+
+def _stamp_unique(table: str, item: dict, seen: set[str], rng, max_floor: int) -> int:
+    """row_fp 를 찍되 이미 나온 지문이면 계약일 / 층을 다시 뽑는다. 다시 뽑은 횟수를 돌려준다."""
+    fp = row_fp.fingerprint(table, item)
+    tries = 0
+    while fp in seen:
+        tries += 1
+        item["deal_day"] = int(rng.integers(1, 29))
+        item["floor"] = int(rng.integers(1, max_floor + 1))
+        if tries > 20:
+            # 작은 단지에서 한 달 거래가 몰리면 일/층 조합이 모자랄 수 있다
+            item["exclu_use_ar"] = round(item["exclu_use_ar"] + 0.01, 2)
+        fp = row_fp.fingerprint(table, item)
+    seen.add(fp)
+    item["row_fp"] = fp
+    return tries
+
+
+def duplicate_fps(rows: list[tuple], columns: list[str]) -> int:
+    i = columns.index("row_fp")
+    return len(rows) - len({r[i] for r in rows})
+
+
+def make_region(i: int, months: list[tuple[int, int]], scale: float, seed: int) -> dict:
+    """시군구 하나의 단지 / 매매 / 전월세 / 위치 행 (COPY 순서 튜플)."""
+    rng = np.random.default_rng([seed, i])
+    lawd_cd = f"{LAWD_PREFIX}{i:04d}"
+    sgg_nm = f"합성{i}구"
+    n_months = len(months)
+
+    # 도시화 정도: 단지 수와 가격 수준을 같이 올린다
+    urban = float(rng.lognormal(0.0, 0.6))
+    ppm2 = float(np.exp(rng.normal(math.log(450) + 0.35 * math.log(urban), 0.25)))  # 만원/㎡
+
+    center = (rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE))
+    n_umd = int(rng.integers(8, 26))
+    umd_names = _names(rng, n_umd, "동")
+    umd_lat = center[0] + rng.normal(0, UMD_SPREAD, n_umd)
+    umd_lng = center[1] + rng.normal(0, UMD_SPREAD, n_umd)
+    umd_eff = rng.normal(0, 0.12, n_umd)
+
+    mean_cx = 5.0 * urban
+    per_umd = np.maximum(rng.negative_binomial(2, 2 / (2 + mean_cx), n_umd), 1)
+    umd_of = np.repeat(np.arange(n_umd), per_umd)
+    n_cx = len(umd_of)
+
+    cx_lat = umd_lat[umd_of] + rng.normal(0, COMPLEX_SPREAD, n_cx)
+    cx_lng = umd_lng[umd_of] + rng.normal(0, COMPLEX_SPREAD, n_cx)
+    build_year = rng.integers(1980, months[-1][0] + 1, n_cx)
+    units = np.clip(rng.lognormal(math.log(450), 0.7, n_cx), 30, 6000)
+    max_floor = np.clip(rng.normal(18, 7, n_cx), 5, 49).astype(np.int64)
+    cx_eff = rng.normal(0, 0.12, n_cx)
+    n_types = rng.integers(2, MAX_TYPES + 1, n_cx)
+    types = np.stack([rng.choice(AREA_TYPES, size=MAX_TYPES, replace=False, p=AREA_WEIGHTS) for _ in range(n_cx)])
+
+    apt_nm = []
+    jibun = []
+    seen: set[tuple[int, str]] = set()
+    for c in range(n_cx):
+        name = f"{umd_names[umd_of[c]][:-1]}{rng.choice(BRANDS)}"
+        k = 1
+        while (umd_of[c], name) in seen:
+            k += 1
+            name = f"{umd_names[umd_of[c]][:-1]}{rng.choice(BRANDS)}{k}차"
+        seen.add((umd_of[c], name))
+        apt_nm.append(name)
+        sub = int(rng.integers(0, 30))
+        jibun.append(f"{int(rng.integers(1, 2000))}" + (f"-{sub}" if sub else ""))
+
+    # 월별 지수: 시군구 랜덤워크 + 전국 사이클 / 거래량 사이클
+    t = np.arange(n_months)
+    log_idx = np.cumsum(rng.normal(0.003, 0.012, n_months)) + 0.12 * np.sin(2 * np.pi * t / 84)
+    volume = SEASON[np.array([m for _, m in months]) - 1] * (1 + 0.3 * np.sin(2 * np.pi * t / 84 + 0.5))
+    years = np.array([y for y, _ in months])
+    last = date(months[-1][0], months[-1][1], 1)
+
+    def deals(turnover):
+        lam = np.outer(units * turnover / 12 * scale, volume)
+        # 준공 전 달은 거래 없음
+        lam[build_year[:, None] > years[None, :]] = 0
+        counts = rng.poisson(lam)
+        c_idx, t_idx = np.nonzero(counts)
+        reps = counts[c_idx, t_idx]
+        c = np.repeat(c_idx, reps)
+        tt = np.repeat(t_idx, reps)
+        n = len(c)
+        area = types[c, (rng.random(n) * n_types[c]).astype(np.int64)]
+        floor = 1 + (rng.random(n) * max_floor[c]).astype(np.int64)
+        age = years[tt] - build_year[c]
+        log_price = (
+            math.log(ppm2) + umd_eff[umd_of[c]] + cx_eff[c] + np.log(area)
+            - 0.006 * np.maximum(age, 0) + 0.002 * floor + log_idx[tt]
+        )
+        day = rng.integers(1, 29, n)
+        return c, tt, area, floor, log_price, day
+
+    # 매매
+    trades = []
+    seen_fp: set[str] = set()
+    redraws = 0
+    c, tt, area, floor, log_price, day = deals(SALE_TURNOVER)
+    price = np.round(np.exp(log_price + rng.normal(0, 0.07, len(c))) / 10) * 10
+    u = rng.random((5, len(c)))
+    for k in range(len(c)):
+        y, m = months[tt[k]]
+        item = {
+            "lawd_cd": lawd_cd,
+            "deal_ymd": f"{y:04d}{m:02d}",
+            "umd_nm": umd_names[umd_of[c[k]]],
+            "apt_nm": apt_nm[c[k]],
+            "jibun": jibun[c[k]],
+            "deal_year": y,
+            "deal_month": m,
+            "deal_day": int(day[k]),
+            "deal_amount_manwon": int(price[k]),
+            "exclu_use_ar": float(area[k]),
+            "floor": int(floor[k]),
+            "apt_dong": None,
+        }
+        redraws += _stamp_unique("apt_trade", item, seen_fp, rng, int(max_floor[c[k]]))
+        d = date(y, m, item["deal_day"])
+        direct = u[0, k] < 0.12
+        cancel = u[1, k] < CANCEL_RATE
+        registered = not cancel and u[2, k] < 0.8 and d < last - timedelta(days=60)
+        item.update({
+            "build_year": int(build_year[c[k]]),
+            "dealing_gbn": "직거래" if direct else "중개거래",
+            "estate_agent_sgg_nm": None if direct else f"합성 {sgg_nm}",
+            "rgst_date": _yymmdd(d + timedelta(days=int(30 + 40 * u[2, k]))) if registered else None,
+            "cdeal_type": "O" if cancel else None,
+            "cdeal_day": _yymmdd(d + timedelta(days=int(10 + 50 * u[3, k]))) if cancel else None,
+            "sler_gbn": "법인" if u[4, k] < 0.04 else "개인",
+            "buyer_gbn": "법인" if u[4, k] > 0.97 else "개인",
+            "land_leasehold_gbn": "N",
+        })
+        trades.append(tuple(item[col] for col in TRADE_COLUMNS))
+
+    # 전월세
+    rents = []
+    seen_fp = set()
+    c, tt, area, floor, log_price, day = deals(RENT_TURNOVER)
+    jeonse = np.exp(log_price + np.log(np.clip(rng.normal(0.65, 0.07, len(c)), 0.45, 0.85)) + rng.normal(0, 0.05, len(c)))
+    monthly_share = 0.3 + 0.25 * tt / max(n_months - 1, 1)
+    u = rng.random((4, len(c)))
+    for k in range(len(c)):
+        y, m = months[tt[k]]
+        is_monthly = u[0, k] < monthly_share[k]
+        j = float(jeonse[k])
+        if is_monthly:
+            deposit = max(500, round(j * (0.05 + 0.25 * u[1, k]) / 500) * 500)
+            rent = max(10, round((j - deposit) * RENT_CONVERSION / 12))
+        else:
+            deposit, rent = max(500, round(j / 500) * 500), 0
+        item = {
+            "lawd_cd": lawd_cd,
+            "deal_ymd": f"{y:04d}{m:02d}",
+            "umd_nm": umd_names[umd_of[c[k]]],
+            "apt_nm": apt_nm[c[k]],
+            "jibun": jibun[c[k]],
+            "deal_year": y,
+            "deal_month": m,
+            "deal_day": int(day[k]),
+            "deposit_manwon": int(deposit),
+            "monthly_rent_manwon": int(rent),
+            "exclu_use_ar": float(area[k]),
+            "floor": int(floor[k]),
+        }
+        # 보증금을 500 단위로 반올림해서 같은 단지/면적/달에 지문이 겹치기 쉽다
+        redraws += _stamp_unique("apt_trade_rent", item, seen_fp, rng, int(max_floor[c[k]]))
+        # 계약구분 / 갱신요구권은 2021년 이후 신고분부터
+        renewal = y >= 2021 and u[2, k] < 0.3
+        ct = f"{y % 100:02d}.{m:02d}~{(y + 2) % 100:02d}.{m:02d}"
+        item.update({
+            "contract_term": ct if y >= 2021 else None,
+            "contract_type": ("갱신" if renewal else "신규") if y >= 2021 else None,
+            "use_rr_right": "사용" if renewal and u[3, k] < 0.6 else None,
+            "pre_deposit_manwon": int(round(deposit * 0.95 / 500) * 500) if renewal else None,
+            "pre_monthly_rent_manwon": int(round(rent * 0.95)) if renewal else None,
+        })
+        rents.append(tuple(item[col] for col in RENT_COLUMNS))
+
+    # COPY 한 번에 넣으므로 지문이 겹치면 row_fp unique index 에서 전체가 실패한다
+    for table, rows, columns in (("apt_trade", trades, TRADE_COLUMNS), ("apt_trade_rent", rents, RENT_COLUMNS)):
+        dup = duplicate_fps(rows, columns)
+        if dup:
+            raise RuntimeError(f"{lawd_cd} {table} row_fp 중복 {dup}건")
+
+    # 위치 (지오코딩 없이 바로)
+    locations = []
+    for k in range(n_cx):
+        lat, lng = float(cx_lat[k]), float(cx_lng[k])
+        umd = umd_names[umd_of[k]]
+        locations.append((
+            lawd_cd, umd, apt_nm[k], jibun[k], lat, lng,
+            f"SRID=4326;POINT({lng} {lat})", geohash.encode(lat, lng),
+            f"합성 {sgg_nm} {umd} {jibun[k]}", "synthetic",
+        ))
+
+    return {"lawd_cd": lawd_cd, "trades": trades, "rents": rents, "locations": locations, "redraws": redraws}
+
+
+# -----------------------------
+# 적재
+# -----------------------------
+# COPY text 형식에서 이스케이프해야 하는 문자 (NULL 표기 \N 과 구분되게 역슬래시도)
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_value(v) -> str:
+    if v is None:
+        return "\\N"
+    return str(v).translate(_COPY_ESCAPES)
+
+
+def copy_rows(cur, table: str, columns: list[str], rows: list[tuple]):
+    if not rows:
+        return
+    buf = io.StringIO()
+    for r in rows:
+        buf.write("\t".join(_copy_value(v) for v in r))
+        buf.write("\n")
+    buf.seek(0)
+    cur.copy_expert(COPY_SQL.format(table=table, cols=", ".join(columns)), buf)
+
+
+def load_region(i: int, months: list[tuple[int, int]], scale: float, seed: int) -> dict:
+    t0 = time.monotonic()
+    with profiling.bucket("generate"):
+        data = make_region(i, months, scale, seed)
+    lawd_cd = data["lawd_cd"]
+
+    conn = db.connect(**db.dsn_from_env())
+    conn.autocommit = False
+    try:
+        with profiling.bucket("load"), conn.cursor() as cur:
+            for sql in DELETE_SQL.values():
+                cur.execute(sql, ([lawd_cd],))
+            copy_rows(cur, "apt_trade", TRADE_COLUMNS, data["trades"])
+            copy_rows(cur, "apt_trade_rent", RENT_COLUMNS, data["rents"])
+            copy_rows(cur, "apt_location", LOCATION_COLUMNS, data["locations"])
+            # COPY 는 로더를 거치지 않으므로 최근 N건 링은 여기서 채운다
+            apts = sorted({loc[2] for loc in data["locations"]})
+            for table in ("apt_trade", "apt_trade_rent"):
+                recent_ring.rebuild(cur, table, [lawd_cd] * len(apts), apts)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return {
+        "lawd_cd": lawd_cd,
+        "complexes": len(data["locations"]),
+        "trades": len(data["trades"]),
+        "rents": len(data["rents"]),
+        "redraws": data["redraws"],
+        "elapsed": round(time.monotonic() - t0, 1),
+    }
+
+
+def _prepare(conn):
+    with conn.cursor() as cur:
+        cur.execute(ingest_rent_backfill.ENSURE_COLUMNS)
+        cur.execute(ENSURE_LOCATION)
+    conn.commit()
+    row_fp.ensure(conn, "apt_trade")
+    row_fp.ensure(conn, "apt_trade_rent")
+    recent_ring.ensure(conn)
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="용량 테스트용 합성 거래 데이터")
+    parser.add_argument("--regions", type=int, default=250, help="가짜 시군구 수")
+    parser.add_argument("--start", default="201501", help="시작 계약년월 YYYYMM")
+    parser.add_argument("--end", default="202412", help="끝 계약년월 YYYYMM (포함)")
+    parser.add_argument("--scale", type=float, default=1.0, help="거래량 배수 (1.0 ≈ 시군구당 매매 2.5만 / 전월세 4만 건, 10년)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=SYNTH_WORKERS)
+    parser.add_argument("--drop", action="store_true", help=f"합성 데이터(lawd_cd {LAWD_PREFIX}xxxx)만 지우고 끝")
+    args = parser.parse_args()
+
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+    if args.regions > 9999:
+        raise RuntimeError("--regions 는 9999 이하 (시군구 코드 9xxxx)")
+
+    conn = db.connect(**db.dsn_from_env())
+    try:
+        _prepare(conn)
+        if args.drop:
+            with conn.cursor() as cur:
+                for table, sql in DROP_SQL.items():
+                    cur.execute(sql)
+                    print(f"[synthetic] drop {table} rows={cur.rowcount}")
+            conn.commit()
+            return
+    finally:
+        conn.close()
+
+    months = month_range(args.start, args.end)
+    print(f"[synthetic] regions={args.regions} months={len(months)} scale={args.scale} seed={args.seed} workers={args.workers}")
+
+    totals = {"complexes": 0, "trades": 0, "rents": 0}
+    t0 = time.monotonic()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=profiling.worker_init) as pool:
+        futs = [pool.submit(load_region, i, months, args.scale, args.seed) for i in range(1, args.regions + 1)]
+        for fut in as_completed(futs):
+            s = fut.result()
+            print(f"[synthetic {s['lawd_cd']}] complexes={s['complexes']} trades={s['trades']} rents={s['rents']} fp_redraws={s['redraws']} elapsed={s['elapsed']}s")
+            for k in totals:
+                totals[k] += s[k]
+
+    print(
+        f"[synthetic] Done. elapsed={time.monotonic() - t0:.1f}s "
+        + " ".join(f"{k}={v}" for k, v in totals.items())
+        + " (파생 테이블: python etl/run_pipeline.py --mode stats)"
+    )
+
+
+if __name__ == "__main__":
+    profiling.run(main, "synthetic")
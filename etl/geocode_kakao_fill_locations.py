@@ -1,7 +1,11 @@
 import os
 import time
-import requests
-import psycopg2
+from concurrent.futures import ThreadPoolExecutor
+import http_client
+import geohash
+import addr_index
+import db
+import profiling
 from psycopg2.extras import execute_batch
 from dotenv import load_dotenv
 from pathlib import Path
@@ -31,8 +35,12 @@ DB_USER = os.environ.get("PGUSER", "postgres").strip()
 DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
 
 KAKAO_KEY = os.environ.get("KAKAO_REST_API_KEY", "").strip()
-SLEEP_SEC = 0.12
+# 동시 요청 수는 http_client 의 AIMD 상한이 조절, 스레드 수는 그 최대치 (필요하면 GEOCODE_SLEEP_SEC 로 추가 대기)
+GEOCODE_WORKERS = int(os.environ.get("GEOCODE_WORKERS", str(int(http_client.LIMIT_MAX)) if http_client.AIMD_ENABLED else "1"))
+SLEEP_SEC = float(os.environ.get("GEOCODE_SLEEP_SEC", "0"))
 BATCH = 200
+# 오프라인 인덱스(addr_index.py) 조회/적재 단위
+OFFLINE_BATCH = 5000
 
 # 제주 지역코드(5자리) -> 시군구 이름(주소 문자열에 넣기)
 CITY_BY_LAWD = {
@@ -57,24 +65,87 @@ WHERE l.id IS NULL
 LIMIT %s;
 """
 
+# 오프라인 인덱스는 지역 제한 없이 (카카오 쿼리 문자열이 필요 없음)
+SELECT_MISSING_ALL = """
+SELECT DISTINCT t.lawd_cd, t.umd_nm, t.apt_nm, t.jibun
+FROM v_apt_places t
+LEFT JOIN apt_location l
+  ON t.lawd_cd = l.lawd_cd
+ AND t.umd_nm  = l.umd_nm
+ AND t.apt_nm  = l.apt_nm
+ AND COALESCE(t.jibun,'') = COALESCE(l.jibun,'')
+WHERE l.id IS NULL
+  AND t.jibun IS NOT NULL;
+"""
+
+# 지도 저배율 셀 집계용 geohash (셀 = 앞자리 prefix)
+# geo_source: 좌표 출처 (offline = 주소 인덱스, kakao = 카카오 API)
+# prev_geohash: 셀 집계 이후 좌표가 바뀐 행의 예전 geohash (aggregate_map_cells 가 예전 셀도 재계산하고 지운다)
+ENSURE_GEOHASH = """
+ALTER TABLE apt_location ADD COLUMN IF NOT EXISTS geohash text;
+ALTER TABLE apt_location ADD COLUMN IF NOT EXISTS prev_geohash text;
+ALTER TABLE apt_location ADD COLUMN IF NOT EXISTS geo_source text;
+CREATE INDEX IF NOT EXISTS apt_location_geohash_idx ON apt_location (geohash text_pattern_ops);
+UPDATE apt_location
+SET geohash = ST_GeoHash(ST_SetSRID(ST_MakePoint(lng, lat), 4326), %s)
+WHERE geohash IS NULL AND lat IS NOT NULL AND lng IS NOT NULL;
+"""
+
+# 같은 단지(대표 표기)의 다른 지번/지번 없는 행은 이미 있는 좌표를 그대로 쓴다 (카카오 호출 없음)
+REUSE_LOC = """
+INSERT INTO apt_location (
+  lawd_cd, umd_nm, apt_nm, jibun,
+  lat, lng, geom, geohash,
+  kakao_address, kakao_place_id, geo_source
+)
+SELECT DISTINCT ON (t.lawd_cd, t.umd_nm, t.apt_nm, COALESCE(t.jibun, ''))
+  t.lawd_cd, t.umd_nm, t.apt_nm, t.jibun,
+  s.lat, s.lng, s.geom, s.geohash,
+  s.kakao_address, s.kakao_place_id, s.geo_source
+FROM v_apt_places t
+JOIN apt_location s
+  ON s.lawd_cd = t.lawd_cd
+ AND s.umd_nm  = t.umd_nm
+ AND s.apt_nm  = t.apt_nm
+ AND s.lat IS NOT NULL
+LEFT JOIN apt_location l
+  ON t.lawd_cd = l.lawd_cd
+ AND t.umd_nm  = l.umd_nm
+ AND t.apt_nm  = l.apt_nm
+ AND COALESCE(t.jibun,'') = COALESCE(l.jibun,'')
+WHERE l.id IS NULL
+  AND t.lawd_cd IN ('50110','50130')
+ORDER BY t.lawd_cd, t.umd_nm, t.apt_nm, COALESCE(t.jibun, ''), s.id
+ON CONFLICT (lawd_cd, umd_nm, apt_nm, jibun) DO NOTHING;
+"""
+
 UPSERT_LOC = """
 INSERT INTO apt_location (
   lawd_cd, umd_nm, apt_nm, jibun,
-  lat, lng, geom,
-  kakao_address, kakao_place_id
+  lat, lng, geom, geohash,
+  kakao_address, kakao_place_id, geo_source
 ) VALUES (
   %(lawd_cd)s, %(umd_nm)s, %(apt_nm)s, %(jibun)s,
   %(lat)s, %(lng)s,
   ST_SetSRID(ST_MakePoint(%(lng)s, %(lat)s), 4326),
-  %(kakao_address)s, %(kakao_place_id)s
+  %(geohash)s,
+  %(kakao_address)s, %(kakao_place_id)s, %(geo_source)s
 )
 ON CONFLICT (lawd_cd, umd_nm, apt_nm, jibun)
 DO UPDATE SET
   lat = EXCLUDED.lat,
   lng = EXCLUDED.lng,
   geom = EXCLUDED.geom,
+  -- 집계 전에 여러 번 옮겨져도 마지막으로 집계된 셀(처음 값)을 남긴다
+  prev_geohash = CASE
+    WHEN apt_location.geohash IS DISTINCT FROM EXCLUDED.geohash
+      THEN COALESCE(apt_location.prev_geohash, apt_location.geohash)
+    ELSE apt_location.prev_geohash
+  END,
+  geohash = EXCLUDED.geohash,
   kakao_address = EXCLUDED.kakao_address,
   kakao_place_id = EXCLUDED.kakao_place_id,
+  geo_source = EXCLUDED.geo_source,
   updated_at = now();
 """
 
@@ -86,8 +157,7 @@ VALUES (%s, %s, %s, %s, %s, %s);
 
 def kakao_get(url, query):
     headers = {"Authorization": f"KakaoAK {KAKAO_KEY}"}
-    r = requests.get(url, headers=headers, params={"query": query}, timeout=15)
-    r.raise_for_status()
+    r = http_client.get(url, headers=headers, params={"query": query}, timeout=15)
     return r.json()
 
 
@@ -122,78 +192,167 @@ def geocode_one(lawd_cd, umd_nm, apt_nm, jibun):
     return None
 
 
+def _geocode_task(row):
+    """스레드에서 한 단지 지오코딩 -> (row, 결과, 예외). 서킷이 열리면 그대로 올린다."""
+    if SLEEP_SEC:
+        with profiling.bucket("sleep"):
+            time.sleep(SLEEP_SEC)
+    try:
+        with profiling.bucket("geocode"):
+            return row, geocode_one(*row), None
+    except http_client.CircuitOpenError:
+        raise
+    except Exception as e:
+        return row, None, e
+
+
+def geocode_offline(conn, index: addr_index.AddrIndex) -> int:
+    """주소 인덱스로 한 번에 채운다. 못 찾은 곳은 그대로 두고 카카오 단계로."""
+    with conn.cursor() as cur:
+        cur.execute(SELECT_MISSING_ALL)
+        rows = cur.fetchall()
+
+    hits = 0
+    for i in range(0, len(rows), OFFLINE_BATCH):
+        chunk = rows[i:i + OFFLINE_BATCH]
+        with profiling.bucket("geocode"):
+            keys = [addr_index.place_keys(lawd_cd, umd_nm, jibun) for lawd_cd, umd_nm, _, jibun in chunk]
+            found = index.lookup_many(k for ks in keys for k in ks)
+
+        upserts = []
+        for (lawd_cd, umd_nm, apt_nm, jibun), ks in zip(chunk, keys):
+            hit = next((found[k] for k in ks if k in found), None)
+            if hit is None:
+                continue
+            lat, lng, addr = hit
+            upserts.append(
+                {
+                    "lawd_cd": lawd_cd,
+                    "umd_nm": umd_nm,
+                    "apt_nm": apt_nm,
+                    "jibun": jibun,
+                    "lat": lat,
+                    "lng": lng,
+                    "geohash": geohash.encode(lat, lng),
+                    "kakao_address": addr,
+                    "kakao_place_id": None,
+                    "geo_source": "offline",
+                }
+            )
+
+        if upserts:
+            with profiling.bucket("load"), conn.cursor() as curu:
+                execute_batch(curu, UPSERT_LOC, upserts, page_size=1000)
+            conn.commit()
+        hits += len(upserts)
+
+    print(f"offline geocoded = {hits} / missing {len(rows)}")
+    return hits
+
+
 def main():
     if not DB_PASSWORD:
         raise RuntimeError("PGPASSWORD(.env) 비어있음")
-    if not KAKAO_KEY:
-        raise RuntimeError("KAKAO_REST_API_KEY(.env) 비어있음")
+    index = addr_index.AddrIndex.open_if_exists()
+    if not KAKAO_KEY and index is None:
+        raise RuntimeError("KAKAO_REST_API_KEY(.env) 비어있음 (오프라인 주소 인덱스도 없음)")
 
-    conn = psycopg2.connect(
+    conn = db.connect(
         host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
     )
     conn.autocommit = False
 
     try:
+        with conn.cursor() as cur0:
+            cur0.execute(ENSURE_GEOHASH, (geohash.MAX_PRECISION,))
+        conn.commit()
+
+        with conn.cursor() as cur0:
+            cur0.execute(REUSE_LOC)
+            print(f"reused locations (same complex) = {cur0.rowcount}")
+        conn.commit()
+
+        if index is not None and geocode_offline(conn, index):
+            # 지번 없는 행 등 같은 단지의 나머지 행도 방금 찾은 좌표로
+            with conn.cursor() as cur0:
+                cur0.execute(REUSE_LOC)
+                print(f"reused locations (after offline) = {cur0.rowcount}")
+            conn.commit()
+        if not KAKAO_KEY:
+            print("KAKAO_REST_API_KEY 없음: 오프라인 인덱스에 없는 곳은 건너뜀")
+            return
+
         total_done = 0
-        while True:
-            with conn.cursor() as cur:
-                cur.execute(SELECT_MISSING, (BATCH,))
-                rows = cur.fetchall()
-
-            if not rows:
-                print("No missing locations. Done.")
-                break
-
-            upserts = []
-            fails = 0
-
-            for lawd_cd, umd_nm, apt_nm, jibun in rows:
-                time.sleep(SLEEP_SEC)
-                try:
-                    res = geocode_one(lawd_cd, umd_nm, apt_nm, jibun)
-                    if res is None:
+        with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS, thread_name_prefix="geocode") as pool:
+            while True:
+                with conn.cursor() as cur:
+                    cur.execute(SELECT_MISSING, (BATCH,))
+                    rows = cur.fetchall()
+
+                if not rows:
+                    print("No missing locations. Done.")
+                    break
+
+                upserts = []
+                fails = 0
+
+                for (lawd_cd, umd_nm, apt_nm, jibun), res, err in pool.map(_geocode_task, rows):
+                    try:
+                        if err is not None:
+                            raise err
+                        if res is None:
+                            fails += 1
+                            with conn.cursor() as curf:
+                                qtxt = f"{lawd_cd}|{umd_nm}|{jibun}|{apt_nm}"
+                                curf.execute(
+                                    INSERT_FAIL, (lawd_cd, umd_nm, apt_nm, jibun, qtxt, "no result")
+                                )
+                                conn.commit()
+                            continue
+
+                        upserts.append(
+                            {
+                                "lawd_cd": lawd_cd,
+                                "umd_nm": umd_nm,
+                                "apt_nm": apt_nm,
+                                "jibun": jibun,
+                                "lat": res["lat"],
+                                "lng": res["lng"],
+                                "geohash": geohash.encode(res["lat"], res["lng"]),
+                                "kakao_address": res["kakao_address"],
+                                "kakao_place_id": res["kakao_place_id"],
+                                "geo_source": "kakao",
+                            }
+                        )
+
+                    except http_client.CircuitOpenError:
+                        # 카카오 쪽 장애: 남은 행을 전부 실패로 기록하지 않고 중단
+                        raise
+                    except Exception as e:
                         fails += 1
                         with conn.cursor() as curf:
                             qtxt = f"{lawd_cd}|{umd_nm}|{jibun}|{apt_nm}"
-                            curf.execute(
-                                INSERT_FAIL, (lawd_cd, umd_nm, apt_nm, jibun, qtxt, "no result")
-                            )
+                            curf.execute(INSERT_FAIL, (lawd_cd, umd_nm, apt_nm, jibun, qtxt, str(e)))
                             conn.commit()
-                        continue
-
-                    upserts.append(
-                        {
-                            "lawd_cd": lawd_cd,
-                            "umd_nm": umd_nm,
-                            "apt_nm": apt_nm,
-                            "jibun": jibun,
-                            "lat": res["lat"],
-                            "lng": res["lng"],
-                            "kakao_address": res["kakao_address"],
-                            "kakao_place_id": res["kakao_place_id"],
-                        }
-                    )
-
-                except Exception as e:
-                    fails += 1
-                    with conn.cursor() as curf:
-                        qtxt = f"{lawd_cd}|{umd_nm}|{jibun}|{apt_nm}"
-                        curf.execute(INSERT_FAIL, (lawd_cd, umd_nm, apt_nm, jibun, qtxt, str(e)))
-                        conn.commit()
-
-            if upserts:
-                with conn.cursor() as curu:
-                    execute_batch(curu, UPSERT_LOC, upserts, page_size=200)
-                conn.commit()
-
-            total_done += len(rows)
-            print(
-                f"batch_done={len(rows)} upserted={len(upserts)} fails={fails} total_processed={total_done}"
-            )
+
+                if upserts:
+                    with profiling.bucket("load"), conn.cursor() as curu:
+                        execute_batch(curu, UPSERT_LOC, upserts, page_size=200)
+                    conn.commit()
+
+                total_done += len(rows)
+                print(
+                    f"batch_done={len(rows)} upserted={len(upserts)} fails={fails} total_processed={total_done}"
+                )
+
+        for host, m in http_client.metrics().items():
+            print(f"http {host} " + " ".join(f"{k}={v}" for k, v in m.items()))
 
     finally:
+        if index is not None:
+            index.close()
         conn.close()
 
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main, "geocode")
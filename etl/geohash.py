@@ -0,0 +1,51 @@
+"""geohash 인코딩 (PostGIS ST_GeoHash 와 같은 결과).
+
+지오코딩 시 최대 정밀도(MAX_PRECISION)로 한 번만 저장하고,
+저해상도 셀은 앞자리(prefix)를 잘라 쓴다.
+  precision 4 ≈ 39km × 20km, 5 ≈ 4.9km × 4.9km, 6 ≈ 1.2km × 0.6km
+"""
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+MAX_PRECISION = 7
+
+# 지도 셀 집계에 쓰는 해상도들
+CELL_PRECISIONS = (4, 5, 6)
+
+
+def encode(lat: float, lng: float, precision: int = MAX_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    out = []
+    bit = 0
+    ch = 0
+    even = True  # 짝수 비트 = 경도
+    while len(out) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                ch = (ch << 1) | 1
+                lng_lo = mid
+            else:
+                ch <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            out.append(_BASE32[ch])
+            bit = 0
+            ch = 0
+    return "".join(out)
+
+
+def cells(gh: str, precisions=CELL_PRECISIONS) -> list[tuple[int, str]]:
+    """한 위치가 속한 (precision, cell) 목록."""
+    return [(p, gh[:p]) for p in precisions if len(gh) >= p]
@@ -0,0 +1,315 @@
+"""ETL 공용 HTTP 클라이언트.
+
+- 호스트별 requests.Session 재사용 (keep-alive 커넥션 풀, gzip 협상)
+- 타임아웃 / 연결 오류 / 429 / 5xx 는 지터가 섞인 지수 백오프로 재시도
+- 호스트가 연속으로 실패하면 서킷 브레이커를 열어 일정 시간 바로 실패시킴
+- 호스트별 동시 요청 수 상한을 AIMD 로 자동 조절 (고정 SLEEP_SEC 대신)
+  - 지연이 기준(관측 최소 지연 × HTTP_LATENCY_TOLERANCE) 안이고 오류율이 낮으면 상한 +1 / 상한 (요청 한 바퀴에 +1)
+  - 타임아웃 / 429 / 결과코드 오류(check 콜백)면 상한 × HTTP_AIMD_DECREASE (직전 감소 뒤에 보낸 요청 기준 한 번만)
+  - 429 외 4xx(404 등)는 중립: 상한도 오류율도 바꾸지 않음
+  - metrics() / HTTP_METRICS_FILE (Prometheus textfile 형식) 로 현재 동시 요청 수와 상한을 내보냄
+"""
+import os
+import random
+import threading
+import time
+from typing import Callable
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "5"))
+BACKOFF_BASE_SEC = float(os.environ.get("HTTP_BACKOFF_BASE_SEC", "0.5"))
+BACKOFF_MAX_SEC = float(os.environ.get("HTTP_BACKOFF_MAX_SEC", "30"))
+POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "16"))
+
+# 연속 실패 N회 -> OPEN, COOLDOWN 동안 요청 차단 후 1회 시험(half-open, 시험 중엔 다른 요청 차단)
+BREAKER_THRESHOLD = int(os.environ.get("HTTP_BREAKER_THRESHOLD", "8"))
+BREAKER_COOLDOWN_SEC = float(os.environ.get("HTTP_BREAKER_COOLDOWN_SEC", "60"))
+
+# AIMD 동시성 상한 (호스트별). HTTP_AIMD=0 이면 상한 없이 예전처럼
+AIMD_ENABLED = os.environ.get("HTTP_AIMD", "1").strip() == "1"
+LIMIT_INITIAL = float(os.environ.get("HTTP_LIMIT_INITIAL", "2"))
+LIMIT_MIN = float(os.environ.get("HTTP_LIMIT_MIN", "1"))
+LIMIT_MAX = float(os.environ.get("HTTP_LIMIT_MAX", "16"))
+AIMD_DECREASE = float(os.environ.get("HTTP_AIMD_DECREASE", "0.5"))
+LATENCY_TOLERANCE = float(os.environ.get("HTTP_LATENCY_TOLERANCE", "2.0"))
+# 최근 요청 오류율(EWMA)이 이보다 높으면 늘리지 않음
+ERROR_RATE_MAX = float(os.environ.get("HTTP_ERROR_RATE_MAX", "0.05"))
+METRICS_FILE = os.environ.get("HTTP_METRICS_FILE", "").strip()
+METRICS_EVERY_SEC = 1.0
+EWMA_ALPHA = 0.1
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 이 상태는 상한을 줄인다 (5xx 한 번은 서버 쪽 사정일 수 있어 오류율에만 반영)
+THROTTLE_STATUS = {429, 503}
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+    "User-Agent": "proptech-etl/1.0",
+}
+
+
+class CircuitOpenError(RuntimeError):
+    """호스트 서킷이 열려 있어 요청을 보내지 않음."""
+
+
+class _Breaker:
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def before_request(self, host: str):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if self.probing or time.monotonic() - self.opened_at < BREAKER_COOLDOWN_SEC:
+                raise CircuitOpenError(f"circuit open for {host} ({self.failures} consecutive failures)")
+            # half-open: 쿨다운이 지나면 한 요청만 시험으로 통과시키고, 결과가 나올 때까지 나머지는 계속 차단
+            self.probing = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self, host: str):
+        with self.lock:
+            self.failures += 1
+            if self.probing:
+                # 시험 요청 실패 -> 쿨다운 다시 시작
+                self.probing = False
+                self.opened_at = time.monotonic()
+            elif self.failures >= BREAKER_THRESHOLD and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                print(f"[http] circuit OPEN host={host} failures={self.failures} cooldown={BREAKER_COOLDOWN_SEC}s")
+
+
+class _Limiter:
+    """호스트별 AIMD 동시 요청 상한."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.limit = min(max(LIMIT_INITIAL, LIMIT_MIN), LIMIT_MAX)
+        self.in_flight = 0
+        self.base_latency = None
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.last_decrease = 0.0
+        self.counts = {"ok": 0, "throttled": 0, "errors": 0, "neutral": 0, "increases": 0, "decreases": 0}
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, started: float, outcome: str):
+        """outcome: ok | throttle (타임아웃/429/결과코드) | error (연결 오류/5xx) | neutral (429 외 4xx)"""
+        with self.cond:
+            self.in_flight -= 1
+            if outcome == "neutral":
+                # 404 같은 요청 쪽 문제는 서버 혼잡과 무관: 상한/오류율/지연 모두 건드리지 않는다
+                self.counts["neutral"] += 1
+                self.cond.notify_all()
+                return
+            failed = outcome != "ok"
+            self.error_ewma += EWMA_ALPHA * (float(failed) - self.error_ewma)
+            now = time.monotonic()
+            latency = now - started
+            if outcome == "ok":
+                self.counts["ok"] += 1
+                self.latency_ewma = latency if self.latency_ewma is None else self.latency_ewma + EWMA_ALPHA * (latency - self.latency_ewma)
+                # 기준 지연: 관측 최소값, 네트워크 경로가 바뀌는 경우를 위해 천천히 올라간다
+                if self.base_latency is None or latency < self.base_latency:
+                    self.base_latency = latency
+                else:
+                    self.base_latency += 0.01 * (latency - self.base_latency)
+                healthy = latency <= self.base_latency * LATENCY_TOLERANCE and self.error_ewma < ERROR_RATE_MAX
+                if healthy and self.limit < LIMIT_MAX:
+                    self.limit = min(LIMIT_MAX, self.limit + 1.0 / self.limit)
+                    self.counts["increases"] += 1
+            elif outcome == "throttle":
+                self.counts["throttled"] += 1
+                # 같은 혼잡 신호로 여러 번 줄이지 않도록: 직전 감소 전에 보낸 요청의 실패는 무시
+                if started >= self.last_decrease:
+                    self.limit = max(LIMIT_MIN, self.limit * AIMD_DECREASE)
+                    self.last_decrease = now
+                    self.counts["decreases"] += 1
+                    print(f"[http] limit DOWN host={self.host} limit={self.limit:.2f} in_flight={self.in_flight}")
+            else:
+                self.counts["errors"] += 1
+            self.cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self.cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "latency_ewma_sec": None if self.latency_ewma is None else round(self.latency_ewma, 4),
+                "base_latency_sec": None if self.base_latency is None else round(self.base_latency, 4),
+                "error_rate": round(self.error_ewma, 4),
+                **self.counts,
+            }
+
+
+_sessions: dict[str, requests.Session] = {}
+_breakers: dict[str, _Breaker] = {}
+_limiters: dict[str, _Limiter] = {}
+_metrics_written = 0.0
+_lock = threading.Lock()
+
+
+def _host_of(url: str) -> str:
+    return urlsplit(url).netloc
+
+
+def get_session(url: str) -> requests.Session:
+    """호스트별로 하나의 Session(커넥션 풀)을 만들어 재사용."""
+    host = _host_of(url)
+    with _lock:
+        s = _sessions.get(host)
+        if s is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            s.headers.update(DEFAULT_HEADERS)
+            _sessions[host] = s
+            _breakers[host] = _Breaker()
+        return s
+
+
+def _breaker(host: str) -> _Breaker:
+    with _lock:
+        return _breakers.setdefault(host, _Breaker())
+
+
+def _limiter(host: str) -> _Limiter:
+    with _lock:
+        lim = _limiters.get(host)
+        if lim is None:
+            lim = _limiters[host] = _Limiter(host)
+        return lim
+
+
+def metrics() -> dict[str, dict]:
+    """호스트별 {limit, in_flight, latency_ewma_sec, base_latency_sec, error_rate, ok, throttled, errors, ...}"""
+    with _lock:
+        lims = list(_limiters.values())
+    return {lim.host: lim.snapshot() for lim in lims}
+
+
+def _write_metrics(force: bool = False):
+    """HTTP_METRICS_FILE 이 있으면 Prometheus textfile 형식으로 (node_exporter textfile collector 용)."""
+    global _metrics_written
+    if not METRICS_FILE:
+        return
+    now = time.monotonic()
+    if not force and now - _metrics_written < METRICS_EVERY_SEC:
+        return
+    _metrics_written = now
+    lines = []
+    for host, m in metrics().items():
+        for key in ("limit", "in_flight", "error_rate", "ok", "throttled", "errors", "neutral"):
+            lines.append(f'etl_http_{key}{{host="{host}"}} {m[key]}')
+        if m["latency_ewma_sec"] is not None:
+            lines.append(f'etl_http_latency_ewma_seconds{{host="{host}"}} {m["latency_ewma_sec"]}')
+    tmp = METRICS_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, METRICS_FILE)
+
+
+def _backoff(attempt: int, retry_after: str | None = None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX_SEC)
+        except ValueError:
+            pass
+    # full jitter: [0, min(cap, base * 2^attempt)]
+    return random.uniform(0, min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * (2 ** attempt)))
+
+
+def request(
+    method: str,
+    url: str,
+    *,
+    timeout: float = 20,
+    check: Callable[[requests.Response], str | None] | None = None,
+    **kwargs,
+) -> requests.Response:
+    """재시도/서킷 브레이커/동시성 상한이 적용된 요청. 최종 실패 시 마지막 예외를 그대로 올린다.
+
+    check(r): HTTP 200 인데 본문 결과코드가 오류/호출 제한인 경우 사유 문자열 (없으면 None).
+              재시도는 하지 않고 응답을 그대로 돌려주되 동시성 상한은 줄인다.
+    """
+    host = _host_of(url)
+    session = get_session(url)
+    breaker = _breaker(host)
+    limiter = _limiter(host) if AIMD_ENABLED else None
+
+    last_exc: Exception | None = None
+    for attempt in range(MAX_RETRIES + 1):
+        breaker.before_request(host)
+        retry_after = None
+        # 성공 경로에서만 ok 로 바꾼다 (check 예외 등 예상 못 한 예외는 error 로 반납)
+        outcome = "error"
+        if limiter is not None:
+            limiter.acquire()
+        t0 = time.monotonic()
+        try:
+            r = session.request(method, url, timeout=timeout, **kwargs)
+            if r.status_code in RETRY_STATUS:
+                retry_after = r.headers.get("Retry-After")
+                last_exc = requests.HTTPError(f"{r.status_code} {r.reason} for {host}", response=r)
+                outcome = "throttle" if r.status_code in THROTTLE_STATUS else "error"
+                breaker.record_failure(host)
+            else:
+                if 400 <= r.status_code < 500:
+                    # 429 는 위에서 처리. 나머지 4xx 는 서버가 정상 응답한 것 (HEAD 404 등)
+                    outcome = "neutral"
+                    breaker.record_success()
+                r.raise_for_status()
+                breaker.record_success()
+                reason = check(r) if check is not None else None
+                outcome = "throttle" if reason else "ok"
+                return r
+        except requests.Timeout as e:
+            last_exc = e
+            outcome = "throttle"
+            breaker.record_failure(host)
+        except requests.ConnectionError as e:
+            last_exc = e
+            outcome = "error"
+            breaker.record_failure(host)
+        except requests.HTTPError:
+            # 4xx 는 neutral, 재시도 대상이 아닌 5xx(501 등)는 error 그대로
+            if outcome != "neutral":
+                breaker.record_failure(host)
+            raise
+        except requests.RequestException:
+            # 리다이렉트 과다 / 잘못된 URL / 본문 디코딩 오류 등: 재시도 없이 올린다
+            breaker.record_failure(host)
+            raise
+        finally:
+            if limiter is not None:
+                limiter.release(t0, outcome)
+                _write_metrics()
+
+        if attempt < MAX_RETRIES:
+            wait = _backoff(attempt, retry_after)
+            print(f"[http] retry {attempt + 1}/{MAX_RETRIES} host={host} in {wait:.2f}s ({last_exc})")
+            time.sleep(wait)
+
+    raise last_exc
+
+
+def get(url: str, *, timeout: float = 20, **kwargs) -> requests.Response:
+    return request("GET", url, timeout=timeout, **kwargs)
@@ -0,0 +1,389 @@
+"""국토부 실거래가 공개시스템 CSV 일괄 적재 (과거 이력 시딩).
+
+2006~2019 백필을 API 로 (지역, 월) 단위 페이지 호출하면 전국 기준 수십만 번을 부른다.
+실거래가 공개시스템에서 내려받은 연도별 CSV(아파트 매매 / 전월세)를 그대로 읽어
+API 파서(parse_response)와 같은 컬럼으로 바꾼 뒤 수집 스크립트의 load_items 로 넣는다.
+
+  - 인코딩: cp949 / utf-8 자동 판별 (addr_index._open_text)
+  - 앞쪽 안내문 줄은 건너뛰고 "시군구" + "단지명" 이 있는 줄을 헤더로
+  - 매매 / 전월세는 헤더로 판별 (거래금액 / 보증금 컬럼)
+  - 시군구 컬럼은 "서울특별시 강남구 개포동" 같은 이름이라 법정동코드 파일로 lawd_cd 를 찾는다
+    (행정표준코드관리시스템 "법정동코드 전체자료", 탭 구분: 법정동코드 / 법정동명 / 폐지여부)
+  - 자연키 지문(row_fp) 이 API 행과 같게 나오도록 값 표기를 API 응답에 맞춘다
+    ("-" -> NULL, 해제사유발생일/등기일자 YYYYMMDD -> YY.MM.DD, 해제 행은 cdeal_type "O")
+    -> 이미 API 로 들어온 거래는 ON CONFLICT (row_fp) 로 건너뛰고 (merge 모드면 변경분만 갱신),
+       같은 파일을 다시 넣어도 결과가 같다
+  - 파일 단위 병렬: 프로세스 IMPORT_WORKERS 개가 파일을 하나씩 맡아 각자 커넥션으로 적재
+
+python etl/import_molit_csv.py <CSV 파일 또는 디렉터리> ... [--codes 법정동코드파일]
+
+적재 후 파생 스테이지는 run_pipeline.py --mode stats 로 (새 거래는 워터마크로 잡힌다).
+"""
+import os
+import re
+import csv
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+import db
+import profiling
+import complex_resolver
+import ingest_apt_trade
+import ingest_engine
+import ingest_rent_backfill
+import merge_upsert
+import recent_ring
+import row_fp
+from addr_index import _open_text, _iter_files
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def _load_env():
+    env_path = REPO_ROOT / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+CODES_PATH = Path(os.environ.get("MOLIT_LAWD_CODES", str(REPO_ROOT / "data" / "lawd_codes.txt")).strip())
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+LOAD_BATCH_ROWS = ingest_engine.LOAD_BATCH_ROWS
+# 안내문이 이 줄 수 안에 끝나지 않으면 헤더를 못 찾은 것으로
+HEADER_SCAN_LINES = 64
+
+# 항목 -> 헤더 후보 (연도별 내보내기 양식 차이)
+TRADE_COLUMNS = {
+    "sgg": ["시군구"],
+    "jibun": ["번지"],
+    "apt_nm": ["단지명"],
+    "exclu_use_ar": ["전용면적(㎡)", "전용면적(m²)", "전용면적"],
+    "ym": ["계약년월"],
+    "day": ["계약일"],
+    "deal_amount_manwon": ["거래금액(만원)", "거래금액"],
+    "apt_dong": ["동"],
+    "floor": ["층"],
+    "build_year": ["건축년도"],
+    "cdeal_day": ["해제사유발생일"],
+    "dealing_gbn": ["거래유형"],
+    "estate_agent_sgg_nm": ["중개사소재지"],
+    "rgst_date": ["등기일자"],
+    "buyer_gbn": ["매수자", "매수"],
+    "sler_gbn": ["매도자", "매도"],
+}
+RENT_COLUMNS = {
+    "sgg": ["시군구"],
+    "jibun": ["번지"],
+    "apt_nm": ["단지명"],
+    "exclu_use_ar": ["전용면적(㎡)", "전용면적(m²)", "전용면적"],
+    "ym": ["계약년월"],
+    "day": ["계약일"],
+    "deposit_manwon": ["보증금(만원)", "보증금"],
+    "monthly_rent_manwon": ["월세금(만원)", "월세(만원)", "월세금"],
+    "floor": ["층"],
+    "contract_term": ["계약기간"],
+    "contract_type": ["계약구분"],
+    "use_rr_right": ["갱신요구권 사용", "갱신요구권사용"],
+    "pre_deposit_manwon": ["종전계약 보증금(만원)", "종전계약보증금(만원)"],
+    "pre_monthly_rent_manwon": ["종전계약 월세(만원)", "종전계약월세(만원)"],
+}
+REQUIRED = ("sgg", "apt_nm", "ym", "day")
+
+# 종류 -> (대상 테이블, 컬럼 후보, 금액 필수 컬럼)
+KINDS = {
+    "trade": ("apt_trade", TRADE_COLUMNS, "deal_amount_manwon"),
+    "rent": ("apt_trade_rent", RENT_COLUMNS, "deposit_manwon"),
+}
+
+_YMD8_RE = re.compile(r"^(\d{2})(\d{2})(\d{2})(\d{2})$")
+_TERM_RE = re.compile(r"^\d{2}(\d{2})(\d{2})\s*~\s*\d{2}(\d{2})(\d{2})$")
+
+
+# -----------------------------
+# 법정동코드
+# -----------------------------
+def load_sgg_codes(path: Path) -> dict[str, str]:
+    """시군구 이름("경기도 성남시 분당구") -> lawd_cd. 폐지된 코드도 (과거 거래용) 넣되 현존 코드가 우선."""
+    if not path.exists():
+        raise RuntimeError(f"법정동코드 파일 없음: {path} (MOLIT_LAWD_CODES 또는 --codes 로 지정)")
+    codes: dict[str, str] = {}
+    alive: set[str] = set()
+    with _open_text(path) as f:
+        for rec in csv.reader(f, delimiter="\t"):
+            if len(rec) < 2 or not rec[0].strip().isdigit():
+                continue
+            code, name = rec[0].strip(), " ".join(rec[1].split())
+            # 시군구 단위: 뒤 5자리(읍면동/리) 0, 시도 단위(가운데 3자리 0) 제외
+            if len(code) != 10 or code[5:] != "00000" or code[2:5] == "000":
+                continue
+            is_alive = len(rec) < 3 or rec[2].strip() != "폐지"
+            if name in codes and name in alive and not is_alive:
+                continue
+            codes[name] = code[:5]
+            if is_alive:
+                alive.add(name)
+    return codes
+
+
+def split_sgg(text: str, codes: dict[str, str]) -> tuple[str, str] | None:
+    """"서울특별시 강남구 개포동" -> ("11680", "개포동"). 가장 긴 시군구 이름부터 맞춘다."""
+    parts = text.split()
+    for n in range(min(len(parts) - 1, 3), 0, -1):
+        lawd_cd = codes.get(" ".join(parts[:n]))
+        if lawd_cd:
+            return lawd_cd, " ".join(parts[n:])
+    return None
+
+
+# -----------------------------
+# 값 정규화 (API 응답 표기에 맞춤)
+# -----------------------------
+def _val(s: str | None) -> str | None:
+    if s is None:
+        return None
+    s = s.strip()
+    return None if s in ("", "-") else s
+
+
+def _int(s: str | None) -> int | None:
+    s = _val(s)
+    if s is None:
+        return None
+    s = s.replace(",", "")
+    return int(s) if s.lstrip("-").isdigit() else None
+
+
+def _float(s: str | None) -> float | None:
+    s = _val(s)
+    try:
+        return float(s) if s is not None else None
+    except ValueError:
+        return None
+
+
+def _api_date(s: str | None) -> str | None:
+    """20240315 -> 24.03.15 (API rgstDate / cdealDay 표기)"""
+    s = _val(s)
+    if s is None:
+        return None
+    m = _YMD8_RE.match(s)
+    return f"{m.group(2)}.{m.group(3)}.{m.group(4)}" if m else s
+
+
+def _api_term(s: str | None) -> str | None:
+    """202403~202603 -> 24.03~26.03 (API contractTerm 표기)"""
+    s = _val(s)
+    if s is None:
+        return None
+    m = _TERM_RE.match(s)
+    return f"{m.group(1)}.{m.group(2)}~{m.group(3)}.{m.group(4)}" if m else s
+
+
+def to_item(kind: str, r: dict, codes: dict[str, str]) -> dict | None:
+    """CSV 한 행 -> parse_response 와 같은 item (필수 값이 없으면 None)."""
+    sgg = split_sgg(r.get("sgg") or "", codes)
+    ym = _val(r.get("ym"))
+    day = _int(r.get("day"))
+    apt_nm = _val(r.get("apt_nm"))
+    if not (sgg and sgg[1] and ym and len(ym) == 6 and ym.isdigit() and day and apt_nm):
+        return None
+    lawd_cd, umd_nm = sgg
+    item = {
+        "lawd_cd": lawd_cd,
+        "deal_ymd": ym,
+        "umd_nm": umd_nm,
+        "apt_nm": apt_nm,
+        "jibun": _val(r.get("jibun")),
+        "exclu_use_ar": _float(r.get("exclu_use_ar")),
+        "deal_year": int(ym[:4]),
+        "deal_month": int(ym[4:]),
+        "deal_day": day,
+        "floor": _int(r.get("floor")),
+    }
+    if kind == "trade":
+        amount = _int(r.get("deal_amount_manwon"))
+        if amount is None:
+            return None
+        cdeal_day = _api_date(r.get("cdeal_day"))
+        item.update({
+            "deal_amount_manwon": amount,
+            "build_year": _int(r.get("build_year")),
+            "dealing_gbn": _val(r.get("dealing_gbn")),
+            "estate_agent_sgg_nm": _val(r.get("estate_agent_sgg_nm")),
+            "rgst_date": _api_date(r.get("rgst_date")),
+            "apt_dong": _val(r.get("apt_dong")),
+            # CSV 에는 해제 여부 컬럼이 없고 해제사유발생일만 있다
+            "cdeal_type": "O" if cdeal_day else None,
+            "cdeal_day": cdeal_day,
+            "sler_gbn": _val(r.get("sler_gbn")),
+            "buyer_gbn": _val(r.get("buyer_gbn")),
+            "land_leasehold_gbn": None,
+        })
+    else:
+        item.update({
+            "deposit_manwon": _int(r.get("deposit_manwon")),
+            "monthly_rent_manwon": _int(r.get("monthly_rent_manwon")),
+            "contract_term": _api_term(r.get("contract_term")),
+            "contract_type": _val(r.get("contract_type")),
+            "use_rr_right": _val(r.get("use_rr_right")),
+            "pre_deposit_manwon": _int(r.get("pre_deposit_manwon")),
+            "pre_monthly_rent_manwon": _int(r.get("pre_monthly_rent_manwon")),
+        })
+    return item
+
+
+# -----------------------------
+# CSV 읽기
+# -----------------------------
+def _detect(header: list[str]) -> tuple[str, dict[str, int]] | None:
+    for kind, (_, columns, amount_col) in KINDS.items():
+        pos = {}
+        for k, names in columns.items():
+            for name in names:
+                if name in header:
+                    pos[k] = header.index(name)
+                    break
+        if amount_col in pos and all(k in pos for k in REQUIRED):
+            return kind, pos
+    return None
+
+
+def read_csv(path: Path):
+    """반환: (kind, 행 dict 이터레이터)"""
+    f = _open_text(path)
+    reader = csv.reader(f)
+    for _ in range(HEADER_SCAN_LINES):
+        rec = next(reader, None)
+        if rec is None:
+            break
+        header = [h.strip() for h in rec]
+        found = _detect(header)
+        if found:
+            kind, pos = found
+
+            def rows():
+                with f:
+                    for rec in reader:
+                        if len(rec) < len(header):
+                            continue
+                        yield {k: rec[i] for k, i in pos.items()}
+
+            return kind, rows()
+    f.close()
+    raise RuntimeError(f"{path}: 매매/전월세 헤더를 찾지 못함 (시군구, 단지명, 계약년월, 계약일, 거래금액|보증금)")
+
+
+# -----------------------------
+# 파일 하나 적재 (워커 프로세스)
+# -----------------------------
+def import_file(path: str, codes_path: str) -> dict:
+    codes = load_sgg_codes(Path(codes_path))
+    kind, rows = read_csv(Path(path))
+    load = ingest_apt_trade.load_items if kind == "trade" else ingest_rent_backfill.load_items
+
+    conn = db.connect(**db.dsn_from_env())
+    conn.autocommit = False
+    stats = {"file": Path(path).name, "kind": kind, "rows": 0, "items": 0, "skipped": 0, "unknown_sgg": 0}
+    t0 = time.monotonic()
+    try:
+        resolver = complex_resolver.Resolver(conn)
+        batch: list[dict] = []
+
+        def flush(cur):
+            if batch:
+                with profiling.bucket("load"):
+                    # 대표 단지명 적용 후 load_items 가 지문(row_fp)을 찍는다
+                    resolver.apply(cur, batch)
+                    res = load(cur, batch)
+                if isinstance(res, dict):
+                    for k, v in res.items():
+                        stats[k] = stats.get(k, 0) + v
+                batch.clear()
+            conn.commit()
+
+        with conn.cursor() as cur:
+            for r in rows:
+                stats["rows"] += 1
+                item = to_item(kind, r, codes)
+                if item is None:
+                    stats["skipped"] += 1
+                    if split_sgg(r.get("sgg") or "", codes) is None:
+                        stats["unknown_sgg"] += 1
+                    continue
+                batch.append(item)
+                stats["items"] += 1
+                if len(batch) >= LOAD_BATCH_ROWS:
+                    flush(cur)
+            flush(cur)
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    stats["elapsed"] = round(time.monotonic() - t0, 1)
+    return stats
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="국토부 실거래가 CSV 일괄 적재")
+    parser.add_argument("paths", nargs="+", help="CSV 파일 또는 디렉터리")
+    parser.add_argument("--codes", default=str(CODES_PATH), help="법정동코드 전체자료 (탭 구분)")
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="동시에 적재할 파일 수")
+    args = parser.parse_args()
+
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    files = [str(p) for p in _iter_files(args.paths)]
+    if not files:
+        raise RuntimeError(f"CSV 파일 없음: {args.paths}")
+    # 코드 파일은 워커마다 다시 읽으므로 여기서 한 번 미리 확인
+    print(f"[molit_csv] files={len(files)} workers={args.workers} sgg_codes={len(load_sgg_codes(Path(args.codes)))}")
+
+    conn = db.connect(**db.dsn_from_env())
+    try:
+        with conn.cursor() as cur:
+            cur.execute(ingest_rent_backfill.ENSURE_COLUMNS)
+        conn.commit()
+        row_fp.ensure(conn, "apt_trade")
+        row_fp.ensure(conn, "apt_trade_rent")
+        recent_ring.ensure(conn)
+        if ingest_apt_trade.LOAD_MODE == "merge":
+            merge_upsert.ensure(conn)
+    finally:
+        conn.close()
+
+    totals: dict[str, int] = {}
+    t0 = time.monotonic()
+    # 큰 파일부터 (마지막에 큰 파일 하나만 남아 혼자 도는 시간을 줄인다)
+    files.sort(key=lambda p: os.path.getsize(p), reverse=True)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=profiling.worker_init) as pool:
+        futs = {pool.submit(import_file, p, args.codes): p for p in files}
+        for fut in as_completed(futs):
+            s = fut.result()
+            print(f"[molit_csv {s['file']}] " + " ".join(f"{k}={v}" for k, v in s.items() if k != "file"))
+            for k, v in s.items():
+                if isinstance(v, int):
+                    totals[k] = totals.get(k, 0) + v
+
+    print(f"[molit_csv] Done. elapsed={time.monotonic() - t0:.1f}s " + " ".join(f"{k}={v}" for k, v in sorted(totals.items())))
+
+
+if __name__ == "__main__":
+    profiling.run(main, "molit_csv")
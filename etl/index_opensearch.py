@@ -0,0 +1,309 @@
+import os
+import json
+import db
+import profiling
+import requests
+from dotenv import load_dotenv
+from pathlib import Path
+
+import http_client
+import stage_state
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+OPENSEARCH_URL = os.environ.get("OPENSEARCH_URL", "http://localhost:9200").strip().rstrip("/")
+INDEX = os.environ.get("OPENSEARCH_INDEX", "apt_complex").strip()
+# 1이면 워터마크 무시하고 전체 단지 재색인
+INDEX_FULL = os.environ.get("INDEX_FULL", "0").strip() == "1"
+
+STAGE = "opensearch"
+BULK = 500
+TIMEOUT = 30
+
+# 한글 단지명은 띄어쓰기가 제각각이라 공백을 지운 뒤 n-gram 을 만든다.
+# (nori 플러그인 없이도 동작하도록 글자 단위 n-gram 사용)
+INDEX_BODY = {
+    "settings": {
+        "number_of_shards": 1,
+        "number_of_replicas": 0,
+        "analysis": {
+            "char_filter": {
+                "strip_space": {"type": "pattern_replace", "pattern": "\\s+", "replacement": ""},
+            },
+            "tokenizer": {
+                "edge_tok": {"type": "edge_ngram", "min_gram": 1, "max_gram": 20, "token_chars": ["letter", "digit"]},
+                "ngram_tok": {"type": "ngram", "min_gram": 2, "max_gram": 3, "token_chars": ["letter", "digit"]},
+            },
+            "analyzer": {
+                "name_autocomplete": {"type": "custom", "char_filter": ["strip_space"], "tokenizer": "edge_tok", "filter": ["lowercase"]},
+                "name_ngram": {"type": "custom", "char_filter": ["strip_space"], "tokenizer": "ngram_tok", "filter": ["lowercase"]},
+                "name_keyword": {"type": "custom", "char_filter": ["strip_space"], "tokenizer": "keyword", "filter": ["lowercase"]},
+            },
+        },
+        "index": {"max_ngram_diff": 19},
+    },
+    "mappings": {
+        "properties": {
+            "lawd_cd": {"type": "keyword"},
+            "umd_nm": {"type": "text", "analyzer": "name_ngram", "fields": {"raw": {"type": "keyword"}}},
+            "apt_nm": {
+                "type": "text",
+                "analyzer": "name_ngram",
+                "fields": {
+                    "raw": {"type": "keyword"},
+                    "auto": {"type": "text", "analyzer": "name_autocomplete", "search_analyzer": "name_keyword"},
+                },
+            },
+            "jibun": {"type": "keyword"},
+            "location": {"type": "geo_point"},
+            "trade_cnt_3m": {"type": "integer"},
+            "trade_avg_3m": {"type": "integer"},
+            "last_trade_ymd": {"type": "keyword"},
+            "rent_cnt_3m": {"type": "integer"},
+            "jeonse_avg_3m": {"type": "integer"},
+            "last_rent_ymd": {"type": "keyword"},
+        }
+    },
+}
+
+# -----------------------------
+# SQL
+# -----------------------------
+# 위치가 바뀐 단지 (지오코딩 후 재색인 필요)
+MOVED_SQL = """
+SELECT DISTINCT lawd_cd, apt_nm
+FROM apt_location
+WHERE updated_at > %s;
+"""
+
+# *_3m 필드는 CURRENT_DATE 기준이라 새 거래가 없어도 날짜가 지나면 값이 바뀐다.
+# 직전 실행 이후 3개월 창 밖으로 밀려난 거래가 있는 단지 (조용한 단지의 부풀려진 통계 정리)
+# deal_ymd 범위로 먼저 좁히고 정확한 날짜는 make_date 로 비교
+EXPIRED_SQL = """
+WITH w AS (
+  SELECT (%s::timestamptz)::date - INTERVAL '3 months' AS lo, CURRENT_DATE - INTERVAL '3 months' AS hi
+)
+SELECT t.lawd_cd, t.apt_nm
+FROM apt_trade t, w
+WHERE t.deal_ymd BETWEEN to_char(w.lo, 'YYYYMM') AND to_char(w.hi, 'YYYYMM')
+  AND make_date(t.deal_year, t.deal_month, t.deal_day) >= w.lo
+  AND make_date(t.deal_year, t.deal_month, t.deal_day) < w.hi
+UNION
+SELECT r.lawd_cd, r.apt_nm
+FROM apt_trade_rent r, w
+WHERE r.deal_ymd BETWEEN to_char(w.lo, 'YYYYMM') AND to_char(w.hi, 'YYYYMM')
+  AND make_date(r.deal_year, r.deal_month, r.deal_day) >= w.lo
+  AND make_date(r.deal_year, r.deal_month, r.deal_day) < w.hi;
+"""
+
+# 대표 위치는 백엔드 rep_location 과 같은 규칙 (lawd_cd, apt_nm 별 최소 id)
+DOCS_SQL = """
+WITH k AS (
+  SELECT * FROM unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+),
+loc AS (
+  SELECT DISTINCT ON (l.lawd_cd, l.apt_nm)
+    l.lawd_cd, l.apt_nm, l.umd_nm, l.jibun, l.lat, l.lng
+  FROM apt_location l
+  JOIN k ON l.lawd_cd = k.lawd_cd AND l.apt_nm = k.apt_nm
+  WHERE l.lat IS NOT NULL AND l.lng IS NOT NULL
+  ORDER BY l.lawd_cd, l.apt_nm, l.id
+),
+tr AS (
+  SELECT t.lawd_cd, t.apt_nm,
+    MAX(t.umd_nm) AS umd_nm,
+    MAX(t.jibun) AS jibun,
+    COUNT(*) FILTER (WHERE make_date(t.deal_year, t.deal_month, t.deal_day) >= CURRENT_DATE - INTERVAL '3 months')::int AS cnt,
+    ROUND(AVG(t.deal_amount_manwon) FILTER (WHERE make_date(t.deal_year, t.deal_month, t.deal_day) >= CURRENT_DATE - INTERVAL '3 months'))::int AS avg_price,
+    MAX(t.deal_ymd) AS last_ymd
+  FROM apt_trade t
+  JOIN k ON t.lawd_cd = k.lawd_cd AND t.apt_nm = k.apt_nm
+  GROUP BY t.lawd_cd, t.apt_nm
+),
+re AS (
+  SELECT r.lawd_cd, r.apt_nm,
+    MAX(r.umd_nm) AS umd_nm,
+    MAX(r.jibun) AS jibun,
+    COUNT(*) FILTER (WHERE make_date(r.deal_year, r.deal_month, r.deal_day) >= CURRENT_DATE - INTERVAL '3 months')::int AS cnt,
+    ROUND(AVG(r.deposit_manwon) FILTER (
+      WHERE make_date(r.deal_year, r.deal_month, r.deal_day) >= CURRENT_DATE - INTERVAL '3 months'
+        AND COALESCE(r.monthly_rent_manwon, 0) = 0
+    ))::int AS jeonse_avg,
+    MAX(r.deal_ymd) AS last_ymd
+  FROM apt_trade_rent r
+  JOIN k ON r.lawd_cd = k.lawd_cd AND r.apt_nm = k.apt_nm
+  GROUP BY r.lawd_cd, r.apt_nm
+)
+SELECT
+  k.lawd_cd, k.apt_nm,
+  COALESCE(loc.umd_nm, tr.umd_nm, re.umd_nm) AS umd_nm,
+  COALESCE(loc.jibun, tr.jibun, re.jibun) AS jibun,
+  loc.lat, loc.lng,
+  tr.cnt, tr.avg_price, tr.last_ymd,
+  re.cnt, re.jeonse_avg, re.last_ymd
+FROM k
+LEFT JOIN loc ON loc.lawd_cd = k.lawd_cd AND loc.apt_nm = k.apt_nm
+LEFT JOIN tr ON tr.lawd_cd = k.lawd_cd AND tr.apt_nm = k.apt_nm
+LEFT JOIN re ON re.lawd_cd = k.lawd_cd AND re.apt_nm = k.apt_nm
+WHERE tr.lawd_cd IS NOT NULL OR re.lawd_cd IS NOT NULL;
+"""
+
+
+# -----------------------------
+# OpenSearch
+# -----------------------------
+def ensure_index():
+    url = f"{OPENSEARCH_URL}/{INDEX}"
+    try:
+        http_client.request("HEAD", url, timeout=TIMEOUT)
+        return False
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+    http_client.request("PUT", url, json=INDEX_BODY, timeout=TIMEOUT)
+    print(f"[opensearch] created index {INDEX}")
+    return True
+
+
+def doc_id(lawd_cd: str, apt_nm: str) -> str:
+    return f"{lawd_cd}:{apt_nm}"
+
+
+def to_doc(row) -> dict:
+    (lawd_cd, apt_nm, umd_nm, jibun, lat, lng,
+     trade_cnt, trade_avg, last_trade, rent_cnt, jeonse_avg, last_rent) = row
+    doc = {
+        "lawd_cd": lawd_cd,
+        "apt_nm": apt_nm,
+        "umd_nm": umd_nm,
+        "jibun": jibun,
+        "trade_cnt_3m": trade_cnt or 0,
+        "trade_avg_3m": trade_avg,
+        "last_trade_ymd": last_trade,
+        "rent_cnt_3m": rent_cnt or 0,
+        "jeonse_avg_3m": jeonse_avg,
+        "last_rent_ymd": last_rent,
+    }
+    if lat is not None and lng is not None:
+        doc["location"] = {"lat": float(lat), "lon": float(lng)}
+    return doc
+
+
+def bulk_index(docs: list[dict]) -> int:
+    lines = []
+    for d in docs:
+        lines.append(json.dumps({"index": {"_index": INDEX, "_id": doc_id(d["lawd_cd"], d["apt_nm"])}}, ensure_ascii=False))
+        lines.append(json.dumps(d, ensure_ascii=False))
+    return _post_bulk(lines, "index")
+
+
+def bulk_delete(ids: list[str]) -> int:
+    """거래가 없어진 단지(다른 표기로 합쳐진 단지 등)의 문서 삭제. 없는 문서는 오류 아님."""
+    lines = [json.dumps({"delete": {"_index": INDEX, "_id": i}}, ensure_ascii=False) for i in ids]
+    return _post_bulk(lines, "delete")
+
+
+def _post_bulk(lines: list[str], op: str) -> int:
+    body = ("\n".join(lines) + "\n").encode("utf-8")
+
+    r = http_client.request(
+        "POST",
+        f"{OPENSEARCH_URL}/_bulk",
+        data=body,
+        headers={"Content-Type": "application/x-ndjson"},
+        timeout=TIMEOUT,
+    )
+    res = r.json()
+    errors = 0
+    if res.get("errors"):
+        for it in res.get("items", []):
+            err = (it.get(op) or {}).get("error")
+            if err:
+                errors += 1
+                if errors <= 5:
+                    print(f"[opensearch] bulk error: {err}")
+    return errors
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    created = ensure_index()
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    conn.autocommit = False
+
+    try:
+        stage_state.ensure(conn)
+        full = INDEX_FULL or created
+        last_run = None if full else stage_state.last_run_at(conn, STAGE)
+
+        complexes, marks = stage_state.pending(conn, STAGE, full=full)
+        if last_run is not None:
+            with conn.cursor() as cur:
+                cur.execute(MOVED_SQL, (last_run,))
+                complexes |= {(r[0], r[1]) for r in cur.fetchall()}
+                cur.execute(EXPIRED_SQL, (last_run,))
+                expired = {(r[0], r[1]) for r in cur.fetchall()}
+                complexes |= expired
+            print(f"[opensearch] 3m window expired complexes={len(expired)}")
+        complexes = sorted(complexes)
+        print(f"[opensearch] index={INDEX} complexes={len(complexes)} full={full}")
+
+        indexed = 0
+        deleted = 0
+        errors = 0
+        for i in range(0, len(complexes), BULK):
+            chunk = complexes[i:i + BULK]
+            with conn.cursor() as cur:
+                cur.execute(DOCS_SQL, ([c[0] for c in chunk], [c[1] for c in chunk]))
+                docs = [to_doc(r) for r in cur.fetchall()]
+            if docs:
+                errors += bulk_index(docs)
+                indexed += len(docs)
+            have = {doc_id(d["lawd_cd"], d["apt_nm"]) for d in docs}
+            gone = [doc_id(c[0], c[1]) for c in chunk if doc_id(c[0], c[1]) not in have]
+            if gone and not created:
+                errors += bulk_delete(gone)
+                deleted += len(gone)
+            print(f"[opensearch] {i + len(chunk)}/{len(complexes)} indexed={indexed} deleted={deleted} errors={errors}")
+
+        if errors:
+            raise RuntimeError(f"OpenSearch bulk 오류 {errors}건 (워터마크 갱신 안 함)")
+
+        stage_state.commit_marks(conn, STAGE, marks)
+        conn.commit()
+        print(f"[opensearch] Done. indexed={indexed}")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, STAGE)
@@ -1,7 +1,12 @@
 import os
-import time
-import requests
-import psycopg2
+import http_client
+import ingest_engine
+import merge_upsert
+import complex_resolver
+import db
+import profiling
+import recent_ring
+import row_fp
 from psycopg2.extras import execute_batch
 import xml.etree.ElementTree as ET
 from datetime import datetime
@@ -36,8 +41,12 @@ LAWD_CDS = [x.strip() for x in os.environ.get("LAWD_CDS", "50110,50130").split("
 
 BASE_URL = "https://apis.data.go.kr/1613000/RTMSDataSvcAptTrade/getRTMSDataSvcAptTrade"
 
+# insert: ON CONFLICT DO NOTHING, merge: 해제/등기일 등 변경분까지 반영 (merge_upsert.py)
+LOAD_MODE = os.environ.get("LOAD_MODE", "insert").strip()
+
 NUM_OF_ROWS = 1000
-SLEEP_SEC = 0.15
+# 요청 간격은 http_client 의 AIMD 동시성 상한이 조절 (필요하면 FETCH_SLEEP_SEC 로 추가 대기)
+SLEEP_SEC = float(os.environ.get("FETCH_SLEEP_SEC", "0"))
 TIMEOUT = 20
 
 def yyyymm_range(start_yyyymm: str, end_yyyymm: str):
@@ -81,8 +90,7 @@ def fetch_page(lawd_cd: str, deal_ymd: str, page_no: int):
         "pageNo": str(page_no),
         "numOfRows": str(NUM_OF_ROWS),
     }
-    r = requests.get(BASE_URL, params=params, timeout=TIMEOUT)
-    r.raise_for_status()
+    r = http_client.get(BASE_URL, params=params, timeout=TIMEOUT, check=ingest_engine.result_check)
     return r.text
 
 def parse_response(xml_text: str):
@@ -155,61 +163,67 @@ def parse_response(xml_text: str):
 
     return {"ok": True, "result_code": result_code, "result_msg": result_msg, "total_count": total_count, "items": items}
 
+def parse(xml_text: str):
+    """수집 엔진용 (code, msg, total_count, items) 형태."""
+    parsed = parse_response(xml_text)
+    items = row_fp.stamp("apt_trade", parsed["items"])
+    return parsed["result_code"], parsed["result_msg"], parsed["total_count"], items
+
 INSERT_SQL = """
 INSERT INTO apt_trade (
   lawd_cd, deal_ymd, umd_nm, apt_nm, jibun,
   deal_year, deal_month, deal_day,
   deal_amount_manwon, exclu_use_ar, floor, build_year,
   dealing_gbn, estate_agent_sgg_nm, rgst_date, apt_dong,
-  cdeal_type, cdeal_day, sler_gbn, buyer_gbn, land_leasehold_gbn
+  cdeal_type, cdeal_day, sler_gbn, buyer_gbn, land_leasehold_gbn,
+  row_fp
 ) VALUES (
   %(lawd_cd)s, %(deal_ymd)s, %(umd_nm)s, %(apt_nm)s, %(jibun)s,
   %(deal_year)s, %(deal_month)s, %(deal_day)s,
   %(deal_amount_manwon)s, %(exclu_use_ar)s, %(floor)s, %(build_year)s,
   %(dealing_gbn)s, %(estate_agent_sgg_nm)s, %(rgst_date)s, %(apt_dong)s,
-  %(cdeal_type)s, %(cdeal_day)s, %(sler_gbn)s, %(buyer_gbn)s, %(land_leasehold_gbn)s
+  %(cdeal_type)s, %(cdeal_day)s, %(sler_gbn)s, %(buyer_gbn)s, %(land_leasehold_gbn)s,
+  %(row_fp)s
 )
 ON CONFLICT DO NOTHING;
 """
 
+def load_items(cur, items):
+    # 단지명이 대표 표기로 바뀐 행은 지문을 다시 계산
+    row_fp.stamp("apt_trade", items, missing_only=True)
+    res = None
+    if LOAD_MODE == "merge":
+        res = merge_upsert.merge(cur, "apt_trade", items)
+    else:
+        execute_batch(cur, INSERT_SQL, items, page_size=500)
+    # 단지별 최근 N건 링 갱신 (recent_ring.py)
+    recent_ring.push(cur, "apt_trade", items)
+    return res
+
 def main():
     if not DB_PASSWORD:
         raise RuntimeError("PGPASSWORD 환경변수가 비어 있습니다. postgres 비밀번호를 넣으세요.")
 
-    conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD)
+    conn = db.connect(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD)
     conn.autocommit = False
 
     try:
-        with conn.cursor() as cur:
-            for lawd_cd in LAWD_CDS:
-                for yyyymm in yyyymm_range(START_YYYYMM, END_YYYYMM):
-                    page_no = 1
-                    month_seen = 0
-
-                    while True:
-                        time.sleep(SLEEP_SEC)
-                        xml_text = fetch_page(lawd_cd, yyyymm, page_no)
-                        parsed = parse_response(xml_text)
-
-                        if not parsed["ok"]:
-                            print(f"[{lawd_cd} {yyyymm}] API not ok: {parsed['result_code']} {parsed['result_msg']}")
-                            break
-
-                        items = parsed["items"]
-                        if not items:
-                            break
-
-                        execute_batch(cur, INSERT_SQL, items, page_size=500)
-                        conn.commit()
-
-                        month_seen += len(items)
-
-                        total_count = parsed["total_count"]
-                        if page_no * NUM_OF_ROWS >= total_count:
-                            break
-                        page_no += 1
-
-                    print(f"[{lawd_cd} {yyyymm}] fetched_items={month_seen}")
+        row_fp.ensure(conn, "apt_trade")
+        recent_ring.ensure(conn)
+        if LOAD_MODE == "merge":
+            merge_upsert.ensure(conn)
+
+        ingest_engine.run(
+            [(lawd_cd, yyyymm) for lawd_cd in LAWD_CDS for yyyymm in yyyymm_range(START_YYYYMM, END_YYYYMM)],
+            fetch_page,
+            parse,
+            load_items,
+            conn=conn,
+            num_of_rows=NUM_OF_ROWS,
+            sleep_sec=SLEEP_SEC,
+            resolve=complex_resolver.Resolver(conn, LAWD_CDS).apply,
+            label="sale_backfill",
+        )
 
         with conn.cursor() as cur2:
             cur2.execute("SELECT COUNT(*) FROM apt_trade;")
@@ -220,4 +234,4 @@ def main():
         conn.close()
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main, "sale_backfill")
@@ -1,10 +1,15 @@
 import os
-import time
-import requests
-import psycopg2
+import http_client
+import ingest_engine
+import merge_upsert
+import complex_resolver
+import db
+import lookback
+import profiling
+import recent_ring
+import row_fp
 from psycopg2.extras import execute_batch
 import xml.etree.ElementTree as ET
-from datetime import datetime
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -29,10 +34,13 @@ DB_USER = os.environ.get("PGUSER", "postgres").strip()
 DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
 
 LAWD_CDS = [x.strip() for x in os.environ.get("LAWD_CDS", "50110,50130").split(",") if x.strip()]
-LOOKBACK_MONTHS = int(os.environ.get("DAILY_LOOKBACK_MONTHS", "3"))
+
+# insert: ON CONFLICT DO NOTHING, merge: 해제/등기일 등 변경분까지 반영 (merge_upsert.py)
+LOAD_MODE = os.environ.get("LOAD_MODE", "merge").strip()
 
 NUM_OF_ROWS = 1000
-SLEEP_SEC = 0.15
+# 요청 간격은 http_client 의 AIMD 동시성 상한이 조절 (필요하면 FETCH_SLEEP_SEC 로 추가 대기)
+SLEEP_SEC = float(os.environ.get("FETCH_SLEEP_SEC", "0"))
 TIMEOUT = 20
 
 INSERT_SQL = """
@@ -41,30 +49,19 @@ INSERT INTO apt_trade (
   deal_year, deal_month, deal_day,
   deal_amount_manwon, exclu_use_ar, floor, build_year,
   dealing_gbn, estate_agent_sgg_nm, rgst_date, apt_dong,
-  cdeal_type, cdeal_day, sler_gbn, buyer_gbn, land_leasehold_gbn
+  cdeal_type, cdeal_day, sler_gbn, buyer_gbn, land_leasehold_gbn,
+  row_fp
 ) VALUES (
   %(lawd_cd)s, %(deal_ymd)s, %(umd_nm)s, %(apt_nm)s, %(jibun)s,
   %(deal_year)s, %(deal_month)s, %(deal_day)s,
   %(deal_amount_manwon)s, %(exclu_use_ar)s, %(floor)s, %(build_year)s,
   %(dealing_gbn)s, %(estate_agent_sgg_nm)s, %(rgst_date)s, %(apt_dong)s,
-  %(cdeal_type)s, %(cdeal_day)s, %(sler_gbn)s, %(buyer_gbn)s, %(land_leasehold_gbn)s
+  %(cdeal_type)s, %(cdeal_day)s, %(sler_gbn)s, %(buyer_gbn)s, %(land_leasehold_gbn)s,
+  %(row_fp)s
 )
 ON CONFLICT DO NOTHING;
 """
 
-def months_last_n(n: int):
-    now = datetime.now()
-    y, m = now.year, now.month
-    out = []
-    for i in range(n):
-        yy = y
-        mm = m - i
-        while mm <= 0:
-            yy -= 1
-            mm += 12
-        out.append(f"{yy:04d}{mm:02d}")
-    return sorted(set(out))
-
 def text_or_none(el, tag):
     t = el.findtext(tag)
     return t.strip() if t and t.strip() else None
@@ -89,8 +86,7 @@ def fetch_page(lawd_cd, deal_ymd, page_no):
         "pageNo": str(page_no),
         "numOfRows": str(NUM_OF_ROWS),
     }
-    r = requests.get(BASE_URL, params=params, timeout=TIMEOUT)
-    r.raise_for_status()
+    r = http_client.get(BASE_URL, params=params, timeout=TIMEOUT, check=ingest_engine.result_check)
     return r.text
 
 def parse(xml_text):
@@ -144,43 +140,49 @@ def parse(xml_text):
             "buyer_gbn": text_or_none(it, "buyerGbn"),
             "land_leasehold_gbn": text_or_none(it, "landLeaseholdGbn"),
         })
-    return code, msg, total_count, items
+    return code, msg, total_count, row_fp.stamp("apt_trade", items)
+
+def load_items(cur, items):
+    # 단지명이 대표 표기로 바뀐 행은 지문을 다시 계산
+    row_fp.stamp("apt_trade", items, missing_only=True)
+    res = None
+    if LOAD_MODE == "merge":
+        res = merge_upsert.merge(cur, "apt_trade", items)
+    else:
+        execute_batch(cur, INSERT_SQL, items, page_size=500)
+    # 단지별 최근 N건 링 갱신 (recent_ring.py)
+    recent_ring.push(cur, "apt_trade", items)
+    return res
 
 def main():
     if not DB_PASSWORD:
         raise RuntimeError("PGPASSWORD(.env) 비어있음")
-    conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD)
+    conn = db.connect(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD)
     conn.autocommit = False
 
-    target_months = months_last_n(LOOKBACK_MONTHS)
-    print(f"Target months: {target_months}, LAWD_CDS={LAWD_CDS}")
-
     try:
-        with conn.cursor() as cur:
-            for lawd in LAWD_CDS:
-                for yyyymm in target_months:
-                    page = 1
-                    fetched = 0
-                    while True:
-                        time.sleep(SLEEP_SEC)
-                        xml_text = fetch_page(lawd, yyyymm, page)
-                        code, msg, total_count, items = parse(xml_text)
-
-                        if code != "000":
-                            print(f"[{lawd} {yyyymm}] {code} {msg}")
-                            break
-                        if not items:
-                            break
-
-                        execute_batch(cur, INSERT_SQL, items, page_size=500)
-                        conn.commit()
-
-                        fetched += len(items)
-                        if page * NUM_OF_ROWS >= total_count:
-                            break
-                        page += 1
-
-                    print(f"[{lawd} {yyyymm}] fetched_items={fetched}")
+        row_fp.ensure(conn, "apt_trade")
+        recent_ring.ensure(conn)
+        if LOAD_MODE == "merge":
+            merge_upsert.ensure(conn)
+
+        # 조회할 (지역, 월): 늦게 들어오는 신고/해제 통계로 결정 (lookback.py)
+        tasks = lookback.plan(conn, "sale", LAWD_CDS)
+        print(f"Target months: {sorted({t[1] for t in tasks})}, LAWD_CDS={LAWD_CDS}")
+
+        stats = ingest_engine.run(
+            tasks,
+            fetch_page,
+            parse,
+            load_items,
+            conn=conn,
+            num_of_rows=NUM_OF_ROWS,
+            sleep_sec=SLEEP_SEC,
+            resolve=complex_resolver.Resolver(conn, LAWD_CDS).apply,
+            label="sale_daily",
+        )
+        # 정상 조회된 (지역, 월)만 관측 (실패/오류코드 달은 다음 실행에서 다시 조회)
+        lookback.observe(conn, "sale", stats["fetched_tasks"])
 
         with conn.cursor() as cur2:
             cur2.execute("SELECT COUNT(*) FROM apt_trade;")
@@ -190,4 +192,4 @@ def main():
         conn.close()
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main, "sale_daily")
@@ -0,0 +1,305 @@
+"""수집 엔진: fetch -> parse -> load 를 큐로 연결한 3단 파이프라인.
+
+- fetch : I/O 바운드, 스레드 FETCH_WORKERS 개가 (지역, 월) 작업을 나눠 페이지를 받아온다
+          실제 동시 요청 수는 http_client 의 호스트별 AIMD 상한이 정한다 (스레드 수는 그 최대치)
+- parse : CPU 바운드, 프로세스 풀 PARSE_WORKERS 개가 XML 을 파싱
+- load  : 호출한 스레드(= DB 커넥션 소유자)가 LOAD_BATCH_ROWS 단위로 모아서 적재/커밋
+
+단계 사이 큐는 크기가 제한되어 있어서(backpressure) 느린 단계가 있으면
+앞 단계가 기다린다. 메모리는 큐 크기 × 페이지 크기 이상 늘지 않는다.
+
+INGEST_SPOOL=1 이면 load 단계는 DB 대신 로컬 스풀(spool.py)에 쓰고,
+드레인 스레드가 봉인된 세그먼트 단위로 resolve/load/on_page 를 호출해 Postgres 에 넣는다
+(DB 가 멈춰도 fetch 는 계속, 남은 세그먼트는 다음 실행이 이어서 적재).
+"""
+import os
+import re
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import http_client
+import profiling
+import spool
+
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", str(int(http_client.LIMIT_MAX)) if http_client.AIMD_ENABLED else "4"))
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+QUEUE_PAGES = int(os.environ.get("INGEST_QUEUE_PAGES", "16"))
+LOAD_BATCH_ROWS = int(os.environ.get("LOAD_BATCH_ROWS", "5000"))
+
+_TOTAL_RE = re.compile(r"<totalCount>\s*(\d+)\s*</totalCount>")
+_CODE_RE = re.compile(r"<resultCode>\s*([^<\s]+)\s*</resultCode>")
+# 게이트웨이 오류 응답(OpenAPI_ServiceResponse): 22 = 호출 제한 초과 등
+_REASON_RE = re.compile(r"<returnReasonCode>\s*([^<\s]+)\s*</returnReasonCode>")
+# 정상 / 데이터 없음
+OK_CODES = {"00", "000", "03"}
+
+_DONE = object()
+
+
+class _Page:
+    __slots__ = ("lawd_cd", "deal_ymd", "page_no", "xml_text", "last", "parsed")
+
+    def __init__(self, lawd_cd, deal_ymd, page_no, xml_text, last):
+        self.lawd_cd = lawd_cd
+        self.deal_ymd = deal_ymd
+        self.page_no = page_no
+        self.xml_text = xml_text
+        self.last = last
+        self.parsed = None
+
+
+class _Failed:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def _peek(xml_text: str):
+    """파싱 전에 페이지 수를 정하기 위해 resultCode / totalCount 만 가볍게 읽는다."""
+    m = _CODE_RE.search(xml_text)
+    code = m.group(1) if m else None
+    m = _TOTAL_RE.search(xml_text)
+    total = int(m.group(1)) if m else 0
+    return code, total
+
+
+def result_check(r) -> str | None:
+    """http_client.request(check=...) 용: HTTP 200 이어도 결과코드가 오류/호출 제한이면 사유."""
+    text = r.text
+    m = _REASON_RE.search(text)
+    if m:
+        return f"returnReasonCode={m.group(1)}"
+    m = _CODE_RE.search(text)
+    if m and m.group(1) not in OK_CODES:
+        return f"resultCode={m.group(1)}"
+    return None
+
+
+def _put(q: queue.Queue, item, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def run(
+    tasks,
+    fetch_page,
+    parse,
+    load,
+    *,
+    conn,
+    num_of_rows: int,
+    sleep_sec: float = 0.0,
+    on_page=None,
+    resolve=None,
+    label: str = "ingest",
+):
+    """tasks: [(lawd_cd, deal_ymd), ...]
+
+    fetch_page(lawd_cd, deal_ymd, page_no) -> xml_text   (스레드에서 호출)
+    parse(xml_text) -> (code, msg, total_count, items)   (프로세스 풀, 모듈 최상위 함수여야 함)
+    load(cur, items)                                     (로더 스레드, 커밋은 엔진이 함)
+    on_page(cur, page, parsed)                           (선택: 페이지별 RAW 저장 등)
+    resolve(cur, items) -> items                         (선택: load 직전 단지명 대표 표기 적용 등)
+
+    반환 stats 의 "fetched_tasks": 모든 페이지를 정상 결과코드(OK_CODES)로 받아 적재까지 끝난 (lawd_cd, deal_ymd)
+    (스풀 모드면 세그먼트가 DB 에 커밋된 것만, SPOOL_DRAIN_ONLY 면 빈 목록)
+    (lookback.observe 는 이것만 관측해야 한다. 실패/오류코드 달을 "조용한 달"로 세지 않도록)
+    """
+    stop = threading.Event()
+    page_q: queue.Queue = queue.Queue(maxsize=QUEUE_PAGES)
+    load_q: queue.Queue = queue.Queue(maxsize=QUEUE_PAGES)
+
+    # --- fetch 단계 ---
+    def fetch_task(lawd_cd, deal_ymd):
+        page_no = 1
+        try:
+            while not stop.is_set():
+                if sleep_sec:
+                    with profiling.bucket("sleep"):
+                        time.sleep(sleep_sec)
+                with profiling.bucket("fetch"):
+                    xml_text = fetch_page(lawd_cd, deal_ymd, page_no)
+                code, total = _peek(xml_text)
+                last = code != "000" or page_no * num_of_rows >= total
+                if not _put(page_q, _Page(lawd_cd, deal_ymd, page_no, xml_text, last), stop):
+                    return
+                if last:
+                    return
+                page_no += 1
+        except Exception as e:
+            _put(page_q, _Failed(e), stop)
+
+    def fetch_all():
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch") as ex:
+            for lawd_cd, deal_ymd in tasks:
+                ex.submit(fetch_task, lawd_cd, deal_ymd)
+        _put(page_q, _DONE, stop)
+
+    # --- parse 단계 (제출 순서대로 load_q 에 future 를 넣어 순서/개수 모두 제한) ---
+    def dispatch(pool):
+        while True:
+            item = page_q.get()
+            if item is _DONE or isinstance(item, _Failed):
+                _put(load_q, item, stop)
+                return
+            fut = pool.submit(profiling.call_in_bucket, "parse", parse, item.xml_text)
+            if not _put(load_q, (item, fut), stop):
+                return
+
+    stats = {"pages": 0, "items": 0, "tasks": 0}
+    fetched: dict[tuple[str, str], int] = {}
+    failed_keys: set[tuple[str, str]] = set()
+    done_keys: list[tuple[str, str]] = []
+    # 스풀 모드: (지역, 월) 레코드가 들어간 세그먼트 번호들 (모두 적재된 것만 fetched_tasks 로)
+    task_seqs: dict[tuple[str, str], set[int]] = {}
+    batch_keys: set[tuple[str, str]] = set()
+    load_counts: dict[str, int] = {}
+
+    def count_load(res):
+        # merge 모드 로더는 {"inserted", "updated", "unchanged"} 를 돌려준다
+        if isinstance(res, dict):
+            for k, v in res.items():
+                load_counts[k] = load_counts.get(k, 0) + v
+
+    # --- 스풀 모드: 드레인 스레드가 세그먼트 하나를 한 트랜잭션으로 적재 ---
+    sp = drainer = None
+    if spool.ENABLED:
+        def apply_segment(cur, records):
+            items: list[dict] = []
+            for rec in records:
+                data = rec["data"]
+                if rec["kind"] == "page":
+                    page = _Page(data["lawd_cd"], data["deal_ymd"], data["page_no"], data["xml_text"], data["last"])
+                    page.parsed = tuple(data["parsed"])
+                    on_page(cur, page, page.parsed)
+                else:
+                    items.extend(data)
+            if items:
+                if resolve is not None:
+                    resolve(cur, items)
+                count_load(load(cur, items))
+
+        sp = spool.Spool(label)
+        drainer = spool.Drainer(sp, apply_segment)
+        drainer.start()
+        if spool.DRAIN_ONLY:
+            # 남은 세그먼트만 적재. 이번에 조회한 (지역, 월)이 없으므로 fetched_tasks 도 비어 있다
+            tasks = []
+
+    t0 = time.monotonic()
+    with ProcessPoolExecutor(max_workers=PARSE_WORKERS, initializer=profiling.worker_init) as pool:
+        fetcher = threading.Thread(target=fetch_all, name="fetch-all", daemon=True)
+        dispatcher = threading.Thread(target=dispatch, args=(pool,), name="parse-dispatch", daemon=True)
+        fetcher.start()
+        dispatcher.start()
+
+        # --- load 단계 ---
+        batch: list[dict] = []
+
+        def flush(cur):
+            with profiling.bucket("load"):
+                if sp is not None:
+                    if batch:
+                        seq = sp.append("items", list(batch), rows=len(batch))
+                        for key in batch_keys:
+                            task_seqs.setdefault(key, set()).add(seq)
+                        batch.clear()
+                        batch_keys.clear()
+                    return
+                if batch:
+                    if resolve is not None:
+                        resolve(cur, batch)
+                    count_load(load(cur, batch))
+                    batch.clear()
+                conn.commit()
+
+        try:
+            with conn.cursor() as cur:
+                while True:
+                    item = load_q.get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, _Failed):
+                        raise item.exc
+
+                    page, fut = item
+                    code, msg, total_count, items = fut.result()
+                    page.parsed = (code, msg, total_count)
+                    stats["pages"] += 1
+
+                    if on_page is not None:
+                        with profiling.bucket("load"):
+                            if sp is not None:
+                                seq = sp.append("page", {
+                                    "lawd_cd": page.lawd_cd, "deal_ymd": page.deal_ymd, "page_no": page.page_no,
+                                    "xml_text": page.xml_text, "last": page.last, "parsed": list(page.parsed),
+                                }, rows=0)
+                                task_seqs.setdefault((page.lawd_cd, page.deal_ymd), set()).add(seq)
+                            else:
+                                on_page(cur, page, page.parsed)
+
+                    key = (page.lawd_cd, page.deal_ymd)
+                    if code not in OK_CODES:
+                        failed_keys.add(key)
+                    if code != "000":
+                        print(f"[{label} {page.lawd_cd} {page.deal_ymd}] API {code} {msg}")
+                    else:
+                        batch.extend(items)
+                        if items:
+                            batch_keys.add(key)
+                        fetched[key] = fetched.get(key, 0) + len(items)
+                        stats["items"] += len(items)
+
+                    if len(batch) >= LOAD_BATCH_ROWS:
+                        flush(cur)
+
+                    if page.last:
+                        stats["tasks"] += 1
+                        if key not in failed_keys:
+                            done_keys.append(key)
+                        print(f"[{label} {page.lawd_cd} {page.deal_ymd}] fetched_items={fetched.get(key, 0)}")
+
+                flush(cur)
+
+            if drainer is not None:
+                with profiling.bucket("load"):
+                    left = drainer.finish()
+                stats["spool"] = dict(drainer.stats, left=left)
+                if left:
+                    print(f"[{label}] spool: 남은 세그먼트 {left}개 -> 다음 실행(INGEST_SPOOL=1)이 이어서 적재")
+                # 아직 DB 에 없는(남은 / 격리된 세그먼트) (지역, 월)을 관측하면 도착 없음으로 세어진다 -> 적재된 것만 남김
+                not_loaded = {seq for seq, _ in sp.sealed()} | set(drainer.quarantined)
+                done_keys[:] = [k for k in done_keys if not task_seqs.get(k, set()) & not_loaded]
+        except BaseException:
+            stop.set()
+            conn.rollback()
+            raise
+        finally:
+            stop.set()
+            if sp is not None:
+                # 여기까지 받은 페이지는 봉인해 두고 (다음 실행이 적재) 드레인은 멈춘다
+                if drainer.is_alive():
+                    drainer.deadline = time.monotonic()
+                    drainer.finishing.set()
+                sp.close()
+
+    stats["load"] = load_counts
+    stats["fetched_tasks"] = done_keys
+    elapsed = time.monotonic() - t0
+    print(
+        f"[{label}] tasks={stats['tasks']} ok_tasks={len(done_keys)} pages={stats['pages']} items={stats['items']} "
+        f"elapsed={elapsed:.1f}s fetch_workers={FETCH_WORKERS} parse_workers={PARSE_WORKERS}"
+    )
+    if load_counts:
+        print(f"[{label}] " + " ".join(f"{k}={v}" for k, v in sorted(load_counts.items())))
+    if "spool" in stats:
+        print(f"[{label}] spool " + " ".join(f"{k}={v}" for k, v in stats["spool"].items()))
+    for host, m in http_client.metrics().items():
+        print(f"[{label}] http {host} " + " ".join(f"{k}={v}" for k, v in m.items()))
+    return stats
@@ -1,10 +1,15 @@
 import os
-import time
-import requests
-import psycopg2
+import http_client
+import ingest_engine
+import merge_upsert
+import complex_resolver
+import db
+import lookback
+import profiling
+import recent_ring
+import row_fp
 from psycopg2.extras import execute_batch
 import xml.etree.ElementTree as ET
-from datetime import datetime
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -33,12 +38,16 @@ DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
 DB_USER = os.environ.get("PGUSER", "postgres").strip()
 DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
 
-# ✅ 제주만 고정 (요청)
-LAWD_CDS = ["50110", "50130"]
+# ✅ 기본값: 제주만 (요청사항). 스케줄러가 지역별로 나눠 돌릴 때 env로 오버라이드
+_DEFAULT_LAWD = "50110,50130"
+LAWD_CDS = [x.strip() for x in os.environ.get("LAWD_CDS", _DEFAULT_LAWD).split(",") if x.strip()]
+
+# insert: ON CONFLICT DO NOTHING, merge: 해제/등기일 등 변경분까지 반영 (merge_upsert.py)
+LOAD_MODE = os.environ.get("LOAD_MODE", "merge").strip()
 
-LOOKBACK_MONTHS = int(os.environ.get("DAILY_LOOKBACK_MONTHS", "3"))
 NUM_OF_ROWS = 1000
-SLEEP_SEC = 0.15
+# 요청 간격은 http_client 의 AIMD 동시성 상한이 조절 (필요하면 FETCH_SLEEP_SEC 로 추가 대기)
+SLEEP_SEC = float(os.environ.get("FETCH_SLEEP_SEC", "0"))
 TIMEOUT = 25
 
 # 전월세 API (기술문서 기준)
@@ -59,19 +68,28 @@ INSERT INTO raw_apt_rent (
 );
 """
 
+# 전용면적/층 컬럼은 나중에 추가됨 (단지 통계의 면적대 조인에 필요)
+ENSURE_COLUMNS = """
+ALTER TABLE apt_trade_rent
+  ADD COLUMN IF NOT EXISTS exclu_use_ar numeric,
+  ADD COLUMN IF NOT EXISTS floor int;
+"""
+
 DOMAIN_INSERT = """
 INSERT INTO apt_trade_rent (
   lawd_cd, deal_ymd, umd_nm, apt_nm, jibun,
   deal_year, deal_month, deal_day,
-  deposit_manwon, monthly_rent_manwon,
+  deposit_manwon, monthly_rent_manwon, exclu_use_ar, floor,
   contract_term, contract_type, use_rr_right,
-  pre_deposit_manwon, pre_monthly_rent_manwon
+  pre_deposit_manwon, pre_monthly_rent_manwon,
+  row_fp
 ) VALUES (
   %(lawd_cd)s, %(deal_ymd)s, %(umd_nm)s, %(apt_nm)s, %(jibun)s,
   %(deal_year)s, %(deal_month)s, %(deal_day)s,
-  %(deposit_manwon)s, %(monthly_rent_manwon)s,
+  %(deposit_manwon)s, %(monthly_rent_manwon)s, %(exclu_use_ar)s, %(floor)s,
   %(contract_term)s, %(contract_type)s, %(use_rr_right)s,
-  %(pre_deposit_manwon)s, %(pre_monthly_rent_manwon)s
+  %(pre_deposit_manwon)s, %(pre_monthly_rent_manwon)s,
+  %(row_fp)s
 )
 ON CONFLICT DO NOTHING;
 """
@@ -79,19 +97,6 @@ ON CONFLICT DO NOTHING;
 # -----------------------------
 # 유틸
 # -----------------------------
-def months_last_n(n: int):
-    now = datetime.now()
-    y, m = now.year, now.month
-    out = []
-    for i in range(n):
-        yy = y
-        mm = m - i
-        while mm <= 0:
-            yy -= 1
-            mm += 12
-        out.append(f"{yy:04d}{mm:02d}")
-    return sorted(set(out))
-
 def text_or_none(el, tag: str):
     t = el.findtext(tag)
     if t is None:
@@ -118,8 +123,7 @@ def fetch_page(lawd_cd: str, deal_ymd: str, page_no: int):
         "pageNo": str(page_no),
         "numOfRows": str(NUM_OF_ROWS),
     }
-    r = requests.get(BASE_URL, params=params, timeout=TIMEOUT)
-    r.raise_for_status()
+    r = http_client.get(BASE_URL, params=params, timeout=TIMEOUT, check=ingest_engine.result_check)
     return r.text
 
 def parse(xml_text: str):
@@ -149,6 +153,9 @@ def parse(xml_text: str):
         deposit = text_or_none(it, "deposit") or text_or_none(it, "보증금액")
         monthly = text_or_none(it, "monthlyRent") or text_or_none(it, "월세금액")
 
+        exclu = text_or_none(it, "excluUseAr") or text_or_none(it, "전용면적")
+        floor = text_or_none(it, "floor") or text_or_none(it, "층")
+
         contract_term = text_or_none(it, "contractTerm")
         contract_type = text_or_none(it, "contractType")
         use_rr_right  = text_or_none(it, "useRRRight")
@@ -177,6 +184,8 @@ def parse(xml_text: str):
 
             "deposit_manwon": to_int_manwon(deposit),
             "monthly_rent_manwon": to_int_manwon(monthly),
+            "exclu_use_ar": float(exclu) if exclu else None,
+            "floor": int(floor) if floor and floor.lstrip("-").isdigit() else None,
 
             "contract_term": contract_term,
             "contract_type": contract_type,
@@ -186,7 +195,36 @@ def parse(xml_text: str):
             "pre_monthly_rent_manwon": to_int_manwon(pre_monthly),
         })
 
-    return code, msg, total_count, items
+    return code, msg, total_count, row_fp.stamp("apt_trade_rent", items)
+
+def load_items(cur, items):
+    # 단지명이 대표 표기로 바뀐 행은 지문을 다시 계산
+    row_fp.stamp("apt_trade_rent", items, missing_only=True)
+    res = None
+    if LOAD_MODE == "merge":
+        res = merge_upsert.merge(cur, "apt_trade_rent", items)
+    else:
+        execute_batch(cur, DOMAIN_INSERT, items, page_size=500)
+    # 단지별 최근 N건 링 갱신 (recent_ring.py)
+    recent_ring.push(cur, "apt_trade_rent", items)
+    return res
+
+def save_raw(cur, page, parsed):
+    # RAW 저장(항상)
+    code, msg, total_count = parsed
+    cur.execute(
+        RAW_INSERT,
+        {
+            "lawd_cd": page.lawd_cd,
+            "deal_ymd": page.deal_ymd,
+            "page_no": page.page_no,
+            "num_of_rows": NUM_OF_ROWS,
+            "result_code": code,
+            "result_msg": msg,
+            "total_count": total_count,
+            "payload_xml": page.xml_text,
+        },
+    )
 
 # -----------------------------
 # main
@@ -195,62 +233,39 @@ def main():
     if not DB_PASSWORD:
         raise RuntimeError("PGPASSWORD(.env) 비어있음")
 
-    target_months = months_last_n(LOOKBACK_MONTHS)
-    print(f"[rent_daily] months={target_months} LAWD_CDS={LAWD_CDS}")
-
-    conn = psycopg2.connect(
+    conn = db.connect(
         host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
     )
     conn.autocommit = False
 
     try:
-        with conn.cursor() as cur:
-            for lawd in LAWD_CDS:
-                for yyyymm in target_months:
-                    page = 1
-                    fetched = 0
-                    inserted = 0
-
-                    while True:
-                        time.sleep(SLEEP_SEC)
-                        xml_text = fetch_page(lawd, yyyymm, page)
-                        code, msg, total_count, items = parse(xml_text)
-
-                        # RAW 저장(항상)
-                        cur.execute(
-                            RAW_INSERT,
-                            {
-                                "lawd_cd": lawd,
-                                "deal_ymd": yyyymm,
-                                "page_no": page,
-                                "num_of_rows": NUM_OF_ROWS,
-                                "result_code": code,
-                                "result_msg": msg,
-                                "total_count": total_count,
-                                "payload_xml": xml_text,
-                            },
-                        )
-                        conn.commit()
-
-                        if code != "000":
-                            # 03: 데이터없음도 여기로 올 수 있는데, msg로 확인 가능
-                            print(f"[rent {lawd} {yyyymm}] API {code} {msg}")
-                            break
-
-                        if not items:
-                            break
-
-                        execute_batch(cur, DOMAIN_INSERT, items, page_size=500)
-                        conn.commit()
-
-                        fetched += len(items)
-                        inserted += len(items)  # ON CONFLICT DO NOTHING이라 정확 삽입 수는 다를 수 있음
-
-                        if page * NUM_OF_ROWS >= total_count:
-                            break
-                        page += 1
-
-                    print(f"[rent {lawd} {yyyymm}] fetched_items={fetched} inserted≈{inserted}")
+        with conn.cursor() as cur0:
+            cur0.execute(ENSURE_COLUMNS)
+        conn.commit()
+
+        row_fp.ensure(conn, "apt_trade_rent")
+        recent_ring.ensure(conn)
+        if LOAD_MODE == "merge":
+            merge_upsert.ensure(conn)
+
+        # 조회할 (지역, 월): 늦게 들어오는 신고 통계로 결정 (lookback.py)
+        tasks = lookback.plan(conn, "rent", LAWD_CDS)
+        print(f"[rent_daily] months={sorted({t[1] for t in tasks})} LAWD_CDS={LAWD_CDS}")
+
+        stats = ingest_engine.run(
+            tasks,
+            fetch_page,
+            parse,
+            load_items,
+            conn=conn,
+            num_of_rows=NUM_OF_ROWS,
+            sleep_sec=SLEEP_SEC,
+            resolve=complex_resolver.Resolver(conn, LAWD_CDS).apply,
+            on_page=save_raw,
+            label="rent_daily",
+        )
+        # 정상 조회된 (지역, 월)만 관측 (실패/오류코드 달은 다음 실행에서 다시 조회)
+        lookback.observe(conn, "rent", stats["fetched_tasks"])
 
         with conn.cursor() as c2:
             c2.execute("SELECT COUNT(*) FROM apt_trade_rent;")
@@ -261,4 +276,4 @@ def main():
         conn.close()
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main, "rent_daily")
@@ -0,0 +1,206 @@
+"""daily 수집 대상 월을 늦게 들어오는 신고 통계로 고르기 (적응형 lookback).
+
+국토부 실거래는 계약 후 30일 안에 신고되고, 해제(cdeal_type)는 그보다 훨씬 늦게 붙기도 한다.
+고정 DAILY_LOOKBACK_MONTHS 는 아무것도 안 들어오는 달도 매번 다시 받고,
+그 범위 밖에 늦게 붙는 해제는 놓친다.
+
+- observe(): 수집이 끝난 (지역, 월)의 행 수 / 해제 수를 직전 관측과 비교해
+  늘었으면 etl_arrival_event 에 기록하고 etl_arrival_state 의 마지막 도착 시각을 갱신
+- 다음 조회 시각 = 지금 + clamp(조용했던 시간 × LOOKBACK_QUIET_FACTOR, 최소, 최대)
+  -> 계속 신고가 들어오는 달은 자주, 오래 조용한 달은 드물게
+- plan(): 최근 LOOKBACK_MAX_MONTHS 개월 중
+  최근 LOOKBACK_ALWAYS_MONTHS 개월(신고 기한 안) + 한 번도 안 본 달 + 조회 시각이 된 달
+
+LOOKBACK_MODE=fixed 이면 예전처럼 DAILY_LOOKBACK_MONTHS 개월을 매번 전부 조회.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+from psycopg2.extras import execute_values
+
+MODE = os.environ.get("LOOKBACK_MODE", "adaptive").strip()
+FIXED_MONTHS = int(os.environ.get("DAILY_LOOKBACK_MONTHS", "3"))
+MAX_MONTHS = int(os.environ.get("LOOKBACK_MAX_MONTHS", "12"))
+ALWAYS_MONTHS = int(os.environ.get("LOOKBACK_ALWAYS_MONTHS", "2"))
+MIN_INTERVAL = timedelta(hours=float(os.environ.get("LOOKBACK_MIN_INTERVAL_H", "6")))
+MAX_INTERVAL = timedelta(days=float(os.environ.get("LOOKBACK_MAX_INTERVAL_D", "30")))
+QUIET_FACTOR = float(os.environ.get("LOOKBACK_QUIET_FACTOR", "0.5"))
+
+# dataset(run_lock 과 같은 이름) -> (테이블, 해제 건수 식)
+# 전월세 API 에는 해제 필드가 없어 행 수만 본다
+SOURCES = {
+    "sale": ("apt_trade", "COUNT(*) FILTER (WHERE COALESCE(cdeal_type, '') <> '')"),
+    "rent": ("apt_trade_rent", "0"),
+}
+
+DDL = """
+CREATE TABLE IF NOT EXISTS etl_arrival_state (
+  dataset         text NOT NULL,
+  lawd_cd         text NOT NULL,
+  deal_ymd        text NOT NULL,
+  row_cnt         int  NOT NULL DEFAULT 0,
+  cancel_cnt      int  NOT NULL DEFAULT 0,
+  polls           int  NOT NULL DEFAULT 0,
+  first_polled_at timestamptz NOT NULL,
+  last_polled_at  timestamptz NOT NULL,
+  last_arrival_at timestamptz,
+  last_cancel_at  timestamptz,
+  next_due_at     timestamptz NOT NULL,
+  PRIMARY KEY (dataset, lawd_cd, deal_ymd)
+);
+
+CREATE TABLE IF NOT EXISTS etl_arrival_event (
+  id          bigserial PRIMARY KEY,
+  dataset     text NOT NULL,
+  lawd_cd     text NOT NULL,
+  deal_ymd    text NOT NULL,
+  observed_at timestamptz NOT NULL DEFAULT now(),
+  new_rows    int NOT NULL,
+  new_cancels int NOT NULL
+);
+CREATE INDEX IF NOT EXISTS etl_arrival_event_observed_idx ON etl_arrival_event (dataset, observed_at);
+"""
+
+STATE_SQL = """
+SELECT lawd_cd, deal_ymd, row_cnt, cancel_cnt, polls, first_polled_at,
+       last_arrival_at, last_cancel_at, next_due_at
+FROM etl_arrival_state
+WHERE dataset = %s AND lawd_cd = ANY(%s::text[]);
+"""
+
+COUNT_SQL = """
+SELECT t.lawd_cd, t.deal_ymd, COUNT(*)::int, ({cancel})::int
+FROM {table} t
+JOIN unnest(%s::text[], %s::text[]) AS k(lawd_cd, deal_ymd)
+  ON t.lawd_cd = k.lawd_cd AND t.deal_ymd = k.deal_ymd
+GROUP BY t.lawd_cd, t.deal_ymd;
+"""
+
+UPSERT_SQL = """
+INSERT INTO etl_arrival_state (
+  dataset, lawd_cd, deal_ymd, row_cnt, cancel_cnt, polls,
+  first_polled_at, last_polled_at, last_arrival_at, last_cancel_at, next_due_at
+) VALUES %s
+ON CONFLICT (dataset, lawd_cd, deal_ymd) DO UPDATE SET
+  row_cnt = EXCLUDED.row_cnt,
+  cancel_cnt = EXCLUDED.cancel_cnt,
+  polls = EXCLUDED.polls,
+  last_polled_at = EXCLUDED.last_polled_at,
+  last_arrival_at = EXCLUDED.last_arrival_at,
+  last_cancel_at = EXCLUDED.last_cancel_at,
+  next_due_at = EXCLUDED.next_due_at;
+"""
+
+EVENT_SQL = """
+INSERT INTO etl_arrival_event (dataset, lawd_cd, deal_ymd, observed_at, new_rows, new_cancels)
+VALUES %s;
+"""
+
+
+def ensure(conn):
+    with conn.cursor() as cur:
+        cur.execute(DDL)
+    conn.commit()
+
+
+def recent_months(n: int, now: datetime | None = None) -> list[str]:
+    """이번 달 포함 최근 n 개월 (YYYYMM, 오름차순)."""
+    now = now or datetime.now()
+    y, m = now.year, now.month
+    out = []
+    for i in range(n):
+        yy, mm = y, m - i
+        while mm <= 0:
+            yy -= 1
+            mm += 12
+        out.append(f"{yy:04d}{mm:02d}")
+    return sorted(out)
+
+
+def _load_state(conn, dataset: str, lawd_cds: list[str]) -> dict[tuple[str, str], tuple]:
+    with conn.cursor() as cur:
+        cur.execute(STATE_SQL, (dataset, lawd_cds))
+        return {(r[0], r[1]): r[2:] for r in cur.fetchall()}
+
+
+def plan(conn, dataset: str, lawd_cds: list[str]) -> list[tuple[str, str]]:
+    """이번 실행에서 조회할 [(lawd_cd, deal_ymd), ...]"""
+    if MODE == "fixed":
+        months = recent_months(FIXED_MONTHS)
+        return [(lawd, ym) for lawd in lawd_cds for ym in months]
+
+    ensure(conn)
+    months = recent_months(max(MAX_MONTHS, ALWAYS_MONTHS))
+    always = set(months[-ALWAYS_MONTHS:]) if ALWAYS_MONTHS > 0 else set()
+    state = _load_state(conn, dataset, lawd_cds)
+    now = datetime.now(timezone.utc)
+
+    tasks = []
+    for lawd in lawd_cds:
+        for ym in months:
+            st = state.get((lawd, ym))
+            if ym in always or st is None or st[-1] <= now:
+                tasks.append((lawd, ym))
+    total = len(lawd_cds) * len(months)
+    print(f"[lookback {dataset}] poll {len(tasks)}/{total} (region, month), skipped quiet={total - len(tasks)}")
+    return tasks
+
+
+def _next_due(now: datetime, last_activity: datetime) -> datetime:
+    quiet = max(now - last_activity, timedelta(0))
+    return now + min(max(quiet * QUIET_FACTOR, MIN_INTERVAL), MAX_INTERVAL)
+
+
+def observe(conn, dataset: str, tasks: list[tuple[str, str]]):
+    """수집이 끝난 (지역, 월)의 도착 통계 갱신. fixed 모드에서도 기록해 둔다.
+
+    tasks 는 정상 조회된 것만 (ingest_engine.run 의 stats["fetched_tasks"]).
+    실패한 달을 넘기면 도착 없음으로 세어 다음 조회가 늦춰진다.
+    """
+    if not tasks:
+        return
+    ensure(conn)
+    table, cancel_expr = SOURCES[dataset]
+    lawds = [t[0] for t in tasks]
+    months = [t[1] for t in tasks]
+    state = _load_state(conn, dataset, sorted(set(lawds)))
+    now = datetime.now(timezone.utc)
+
+    with conn.cursor() as cur:
+        cur.execute(COUNT_SQL.format(table=table, cancel=cancel_expr), (lawds, months))
+        counts = {(r[0], r[1]): (r[2], r[3]) for r in cur.fetchall()}
+
+        rows, events = [], []
+        for lawd, ym in tasks:
+            row_cnt, cancel_cnt = counts.get((lawd, ym), (0, 0))
+            st = state.get((lawd, ym))
+            if st is None:
+                # 첫 관측은 기준선만 잡는다 (이미 있던 행을 "도착"으로 세지 않음)
+                polls, first_polled, last_arrival, last_cancel = 0, now, None, None
+                new_rows = new_cancels = 0
+            else:
+                prev_rows, prev_cancels, polls, first_polled, last_arrival, last_cancel, _ = st
+                # 단지 병합으로 행이 줄어드는 경우는 도착이 아니다
+                new_rows = max(row_cnt - prev_rows, 0)
+                new_cancels = max(cancel_cnt - prev_cancels, 0)
+            if new_rows:
+                last_arrival = now
+            if new_cancels:
+                last_cancel = now
+            if new_rows or new_cancels:
+                events.append((dataset, lawd, ym, now, new_rows, new_cancels))
+
+            last_activity = max(x for x in (last_arrival, last_cancel, first_polled) if x is not None)
+            rows.append((
+                dataset, lawd, ym, row_cnt, cancel_cnt, polls + 1,
+                first_polled, now, last_arrival, last_cancel, _next_due(now, last_activity),
+            ))
+
+        execute_values(cur, UPSERT_SQL, rows, page_size=1000)
+        if events:
+            execute_values(cur, EVENT_SQL, events, page_size=1000)
+    conn.commit()
+
+    arrived = sum(e[4] for e in events)
+    cancelled = sum(e[5] for e in events)
+    print(f"[lookback {dataset}] observed={len(rows)} months_with_arrivals={len(events)} new_rows={arrived} new_cancels={cancelled}")
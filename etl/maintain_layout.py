@@ -0,0 +1,417 @@
+"""거래 테이블 물리 배치 관리: BRIN 인덱스 + 오래된 구간을 (단지, 날짜) 순으로 다시 쓰기.
+
+apt_trade / apt_trade_rent 는 적재 순서(지역 × 월 × 페이지)대로 쌓이고 backfill 과 daily 가 섞여서
+API 가 읽는 (lawd_cd, apt_nm, 계약일) 순서와 힙 배치가 어긋난다. 단지 이력 한 번 읽는데 페이지가 흩어진다.
+
+- BRIN (lawd_cd, deal_ymd): 지역/월 범위 조회용, btree 보다 훨씬 작다. 새 페이지는 매 실행 요약
+- 차가운 구간(LAYOUT_COLD_MONTHS 보다 오래된 연도, 지역 × 연도)마다 흩어진 정도를 재서
+  (단지별 실제 페이지 수 / 최소 페이지 수) LAYOUT_SCATTER_MIN 이상인 구간부터 LAYOUT_MAX_SEGMENTS 개만
+  한 트랜잭션에서 DELETE -> (단지, 계약일, id) 순 INSERT. id 는 그대로라 워터마크/링 테이블 영향 없음
+  - CLUSTER 와 달리 테이블 잠금 없이 그 구간 행 잠금만, 수집과 겹치지 않게 (dataset, 지역) 실행 락을 잡는다
+  - lock_timeout (LAYOUT_LOCK_TIMEOUT) 을 넘기면 그 구간은 다음 실행으로
+  - 같은 힙에 다시 INSERT 하므로 FSM 의 빈 공간(이전 VACUUM 이 남긴 구멍)부터 채워져 연속 배치가 보장되지 않는다.
+    그래서 다시 쓴 직후 그 구간의 흩어진 정도를 다시 재서 전/후를 etl_layout_segment 에 남긴다
+- LAYOUT_CLUSTER=1 (점검 시간용): 구간 다시 쓰기 대신 (지역, 단지, 계약일, id) 정렬 인덱스로 CLUSTER 해서
+  테이블 전체를 새 파일에 순서대로 쓴다. ACCESS EXCLUSIVE 잠금이라 그동안 읽기/쓰기 모두 막힌다
+- 다시 쓰기 전후 테이블/인덱스 크기와 추정 bloat 을 etl_layout_report 에 남긴다
+  (pgstattuple 확장이 있으면 그 값, 없으면 pg_stats 평균 행 길이로 추정)
+
+다시 쓰기는 LAYOUT_INTERVAL_H 마다 한 번 (LAYOUT_FORCE=1 이면 바로). BRIN 요약은 매번.
+"""
+import os
+import time
+from datetime import date
+
+import db
+import profiling
+import psycopg2
+from dotenv import load_dotenv
+from pathlib import Path
+
+import run_lock
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+STAGE = "layout"
+# 테이블 -> 수집 실행 락 dataset (run_lock.py)
+TABLES = {"apt_trade": "sale", "apt_trade_rent": "rent"}
+
+BRIN_PAGES = int(os.environ.get("LAYOUT_BRIN_PAGES", "32"))
+# 이보다 최근 달이 들어 있는 연도는 아직 신고/해제가 붙으므로 건드리지 않음
+COLD_MONTHS = int(os.environ.get("LAYOUT_COLD_MONTHS", "12"))
+SCATTER_MIN = float(os.environ.get("LAYOUT_SCATTER_MIN", "2.0"))
+MAX_SEGMENTS = int(os.environ.get("LAYOUT_MAX_SEGMENTS", "20"))
+INTERVAL_H = float(os.environ.get("LAYOUT_INTERVAL_H", "168"))
+LAYOUT_FORCE = os.environ.get("LAYOUT_FORCE", "0").strip() == "1"
+LOCK_TIMEOUT = os.environ.get("LAYOUT_LOCK_TIMEOUT", "5s").strip()
+# 1이면 구간 다시 쓰기 대신 테이블 전체 CLUSTER (테이블 잠금)
+LAYOUT_CLUSTER = os.environ.get("LAYOUT_CLUSTER", "0").strip() == "1"
+
+# 행 헤더(23 + 정렬) + line pointer 4
+TUPLE_OVERHEAD = 28
+# btree 기본 fillfactor
+BTREE_FILL = 90.0
+
+# -----------------------------
+# SQL
+# -----------------------------
+REPORT_DDL = """
+CREATE TABLE IF NOT EXISTS etl_layout_report (
+  id         bigserial PRIMARY KEY,
+  run_at     timestamptz NOT NULL,
+  phase      text   NOT NULL,
+  table_name text   NOT NULL,
+  relation   text   NOT NULL,
+  kind       text   NOT NULL,
+  bytes      bigint NOT NULL,
+  live_tup   bigint,
+  dead_tup   bigint,
+  bloat_pct  real
+);
+"""
+
+SEGMENT_DDL = """
+CREATE TABLE IF NOT EXISTS etl_layout_segment (
+  id             bigserial PRIMARY KEY,
+  run_at         timestamptz NOT NULL,
+  table_name     text   NOT NULL,
+  lawd_cd        text   NOT NULL,
+  yr             text   NOT NULL,
+  rows           bigint NOT NULL,
+  scatter_before real   NOT NULL,
+  scatter_after  real
+);
+"""
+
+SEGMENT_INSERT_SQL = """
+INSERT INTO etl_layout_segment (run_at, table_name, lawd_cd, yr, rows, scatter_before, scatter_after)
+VALUES (%s, %s, %s, %s, %s, %s, %s);
+"""
+
+LAST_REWRITE_SQL = "SELECT MAX(run_at) FROM etl_layout_report WHERE phase = 'after' AND run_at > now() - %s * INTERVAL '1 hour';"
+
+BRIN_NAME = "{table}_lawd_deal_brin"
+BRIN_OPTIONS_SQL = "SELECT reloptions FROM pg_class WHERE relname = %s AND relkind = 'i';"
+# 운영 중 테이블이라 CONCURRENTLY (autocommit 필요)
+BRIN_CREATE_SQL = """
+CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table}
+USING brin (lawd_cd, deal_ymd) WITH (pages_per_range = {pages}, autosummarize = on);
+"""
+BRIN_DROP_SQL = "DROP INDEX CONCURRENTLY IF EXISTS {name};"
+BRIN_SUMMARIZE_SQL = "SELECT brin_summarize_new_values(%s::regclass);"
+
+HAS_PGSTATTUPLE_SQL = "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pgstattuple');"
+
+TABLE_STAT_SQL = """
+SELECT pg_relation_size(c.oid), COALESCE(s.n_live_tup, 0), COALESCE(s.n_dead_tup, 0),
+       (SELECT SUM(avg_width) FROM pg_stats p WHERE p.schemaname = current_schema() AND p.tablename = c.relname)
+FROM pg_class c
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE c.oid = %s::regclass;
+"""
+TABLE_APPROX_SQL = "SELECT approx_free_percent + dead_tuple_percent FROM pgstattuple_approx(%s::regclass);"
+
+INDEX_STAT_SQL = """
+SELECT i.relname, am.amname, pg_relation_size(i.oid)
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+JOIN pg_am am ON am.oid = i.relam
+WHERE x.indrelid = %s::regclass
+ORDER BY i.relname;
+"""
+BTREE_DENSITY_SQL = "SELECT avg_leaf_density FROM pgstatindex(%s::regclass);"
+
+REPORT_INSERT_SQL = """
+INSERT INTO etl_layout_report (run_at, phase, table_name, relation, kind, bytes, live_tup, dead_tup, bloat_pct)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);
+"""
+
+ROWS_PER_PAGE_SQL = "SELECT CASE WHEN relpages > 0 THEN reltuples / relpages ELSE 0 END FROM pg_class WHERE oid = %s::regclass;"
+
+# 지역 × 연도 구간별: 단지마다 걸친 힙 페이지 수 합 vs 꽉 채웠을 때 페이지 수 합
+SCATTER_SQL = """
+WITH c AS (
+  SELECT lawd_cd, substr(deal_ymd, 1, 4) AS yr, apt_nm,
+         COUNT(*) AS n,
+         COUNT(DISTINCT (ctid::text::point)[0]) AS pages
+  FROM {table}
+  WHERE deal_ymd < %s
+  GROUP BY 1, 2, 3
+)
+SELECT lawd_cd, yr, SUM(n)::bigint, SUM(pages)::bigint, SUM(ceil(n / %s::float8))::bigint
+FROM c
+GROUP BY 1, 2;
+"""
+
+# 한 구간만 (다시 쓴 뒤 확인용)
+SEGMENT_SCATTER_SQL = """
+WITH c AS (
+  SELECT apt_nm, COUNT(*) AS n, COUNT(DISTINCT (ctid::text::point)[0]) AS pages
+  FROM {table}
+  WHERE lawd_cd = %s AND deal_ymd >= %s AND deal_ymd < %s
+  GROUP BY 1
+)
+SELECT COALESCE(SUM(pages), 0)::bigint, COALESCE(SUM(ceil(n / %s::float8)), 0)::bigint FROM c;
+"""
+
+STAGE_DDL = "CREATE TEMP TABLE IF NOT EXISTS _layout_{table} (LIKE {table}) ON COMMIT DELETE ROWS;"
+MOVE_OUT_SQL = """
+WITH gone AS (
+  DELETE FROM {table}
+  WHERE lawd_cd = %s AND deal_ymd >= %s AND deal_ymd < %s
+  RETURNING *
+)
+INSERT INTO _layout_{table} SELECT * FROM gone;
+"""
+MOVE_IN_SQL = """
+INSERT INTO {table}
+SELECT * FROM _layout_{table}
+ORDER BY apt_nm, deal_year, deal_month, deal_day, id;
+"""
+
+CLUSTER_INDEX = "{table}_layout_idx"
+CLUSTER_INDEX_SQL = """
+CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} (lawd_cd, apt_nm, deal_year, deal_month, deal_day, id);
+"""
+CLUSTER_SQL = "CLUSTER {table} USING {name};"
+
+
+# -----------------------------
+# 계산
+# -----------------------------
+def cold_before(today: date | None = None) -> str:
+    """이 연도(YYYY)보다 앞선 연도만 차가운 구간. deal_ymd < 'YYYY' 로 바로 비교."""
+    today = today or date.today()
+    months = today.year * 12 + (today.month - 1) - COLD_MONTHS
+    return f"{months // 12:04d}"
+
+
+def _year_bounds(yr: str) -> tuple[str, str]:
+    return yr, f"{int(yr) + 1:04d}"
+
+
+def pick_segments(rows, limit: int) -> list[tuple[str, str, int, float]]:
+    """[(lawd_cd, yr, n, pages, ideal)] -> 흩어진 정도가 큰 구간 순 [(lawd_cd, yr, n, scatter)]"""
+    out = []
+    for lawd_cd, yr, n, pages, ideal in rows:
+        scatter = pages / max(ideal, 1)
+        if scatter >= SCATTER_MIN:
+            out.append((pages - ideal, lawd_cd, yr, int(n), scatter))
+    out.sort(reverse=True)
+    return [(lawd_cd, yr, n, scatter) for _, lawd_cd, yr, n, scatter in out[:limit]]
+
+
+def _table_bloat(size: int, live: int, width) -> float | None:
+    if not size or width is None:
+        return None
+    return max(0.0, 100.0 * (1.0 - live * (float(width) + TUPLE_OVERHEAD) / size))
+
+
+# -----------------------------
+# 작업
+# -----------------------------
+def ensure_brin(conn, table: str):
+    name = BRIN_NAME.format(table=table)
+    with conn.cursor() as cur:
+        cur.execute(BRIN_OPTIONS_SQL, (name,))
+        row = cur.fetchone()
+        if row is not None and f"pages_per_range={BRIN_PAGES}" not in (row[0] or []):
+            cur.execute(BRIN_DROP_SQL.format(name=name))
+            print(f"[layout {table}] pages_per_range 변경 -> {name} 재생성")
+        cur.execute(BRIN_CREATE_SQL.format(name=name, table=table, pages=BRIN_PAGES))
+        cur.execute(BRIN_SUMMARIZE_SQL, (name,))
+        print(f"[layout {table}] brin {name} summarized ranges={cur.fetchone()[0]}")
+
+
+def report(conn, table: str, phase: str, run_at, exact: bool) -> list[tuple]:
+    rows = []
+    with conn.cursor() as cur:
+        cur.execute(TABLE_STAT_SQL, (table,))
+        size, live, dead, width = cur.fetchone()
+        if exact:
+            cur.execute(TABLE_APPROX_SQL, (table,))
+            bloat = float(cur.fetchone()[0])
+        else:
+            bloat = _table_bloat(size, live, width)
+        rows.append((run_at, phase, table, table, "table", size, live, dead, bloat))
+
+        cur.execute(INDEX_STAT_SQL, (table,))
+        for name, am, isize in cur.fetchall():
+            ibloat = None
+            if exact and am == "btree":
+                cur.execute(BTREE_DENSITY_SQL, (name,))
+                density = cur.fetchone()[0]
+                ibloat = max(0.0, 100.0 * (1.0 - float(density) / BTREE_FILL)) if density is not None else None
+            rows.append((run_at, phase, table, name, am, isize, None, None, ibloat))
+
+        for r in rows:
+            cur.execute(REPORT_INSERT_SQL, r)
+
+    for r in rows:
+        bloat = "-" if r[8] is None else f"{r[8]:.1f}%"
+        extra = f" live={r[6]} dead={r[7]}" if r[4] == "table" else ""
+        print(f"[layout {phase}] {r[3]} ({r[4]}) {r[5] / 1024 / 1024:.1f}MB bloat={bloat}{extra}")
+    return rows
+
+
+def rewrite_segment(conn, table: str, lawd_cd: str, yr: str) -> int | None:
+    """한 구간을 (단지, 계약일, id) 순으로 다시 쓴다. 잠금 대기를 넘기면 None."""
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL lock_timeout = %s;", (LOCK_TIMEOUT,))
+            cur.execute(STAGE_DDL.format(table=table))
+            cur.execute(MOVE_OUT_SQL.format(table=table), (lawd_cd, *_year_bounds(yr)))
+            moved = cur.rowcount
+            cur.execute(MOVE_IN_SQL.format(table=table))
+        conn.commit()
+        return moved
+    except psycopg2.errors.LockNotAvailable:
+        conn.rollback()
+        return None
+    finally:
+        conn.autocommit = True
+
+
+def segment_scatter(conn, table: str, lawd_cd: str, yr: str, per_page: float) -> float:
+    with conn.cursor() as cur:
+        cur.execute(SEGMENT_SCATTER_SQL.format(table=table), (lawd_cd, *_year_bounds(yr), per_page))
+        pages, ideal = cur.fetchone()
+    return pages / max(ideal, 1)
+
+
+def cluster_table(conn, table: str) -> int:
+    """테이블 전체를 정렬 순서로 새로 쓴다 (ACCESS EXCLUSIVE). lock_timeout 을 넘기면 0."""
+    name = CLUSTER_INDEX.format(table=table)
+    with conn.cursor() as cur:
+        cur.execute(CLUSTER_INDEX_SQL.format(name=name, table=table))
+        cur.execute("SET lock_timeout = %s;", (LOCK_TIMEOUT,))
+        try:
+            t0 = time.monotonic()
+            cur.execute(CLUSTER_SQL.format(table=table, name=name))
+        except psycopg2.errors.LockNotAvailable:
+            print(f"[layout {table}] CLUSTER lock_timeout -> 다음 실행으로")
+            return 0
+        finally:
+            cur.execute("RESET lock_timeout;")
+        cur.execute(f"ANALYZE {table};")
+        cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass;", (table,))
+        rows = int(cur.fetchone()[0])
+    print(f"[layout {table}] CLUSTER rows={rows} {time.monotonic() - t0:.1f}s")
+    return rows
+
+
+def relayout(conn, lock_conn, table: str, run_at) -> int:
+    dataset = TABLES[table]
+    with conn.cursor() as cur:
+        cur.execute(ROWS_PER_PAGE_SQL, (table,))
+        per_page = float(cur.fetchone()[0]) or 1.0
+        cur.execute(SCATTER_SQL.format(table=table), (cold_before(), per_page))
+        segments = pick_segments(cur.fetchall(), MAX_SEGMENTS)
+    print(f"[layout {table}] cold<{cold_before()} rows/page={per_page:.1f} segments to rewrite={len(segments)}")
+
+    total = 0
+    for lawd_cd, yr, n, scatter in segments:
+        # 같은 지역을 수집(merge UPDATE) 중이면 건너뜀
+        if not run_lock.try_lock(lock_conn, dataset, lawd_cd):
+            print(f"[layout {table} {lawd_cd} {yr}] 수집 실행 중 -> 건너뜀")
+            continue
+        try:
+            t0 = time.monotonic()
+            moved = rewrite_segment(conn, table, lawd_cd, yr)
+        finally:
+            run_lock.unlock(lock_conn, dataset, lawd_cd)
+        if moved is None:
+            print(f"[layout {table} {lawd_cd} {yr}] lock_timeout -> 다음 실행으로")
+            continue
+        total += moved
+        # 같은 힙에 다시 넣어서 빈 공간이 흩어져 있으면 그대로일 수 있다 -> 실제로 재서 남긴다
+        after = segment_scatter(conn, table, lawd_cd, yr, per_page)
+        with conn.cursor() as cur:
+            cur.execute(SEGMENT_INSERT_SQL, (run_at, table, lawd_cd, yr, moved, scatter, after))
+        print(f"[layout {table} {lawd_cd} {yr}] rows={moved} scatter={scatter:.1f}->{after:.1f} {time.monotonic() - t0:.1f}s")
+        if after >= SCATTER_MIN:
+            print(f"[layout {table} {lawd_cd} {yr}] 다시 쓴 뒤에도 흩어짐 {after:.1f} (빈 공간 재사용) -> 점검 시간에 LAYOUT_CLUSTER=1")
+
+    if total:
+        # 지운 행 공간 회수 + 통계 갱신 (FULL 아님 -> 잠금 없음)
+        with conn.cursor() as cur:
+            cur.execute(f"VACUUM (ANALYZE) {table};")
+    return total
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    # CREATE INDEX CONCURRENTLY / VACUUM 은 트랜잭션 밖에서. 구간 다시 쓰기만 트랜잭션
+    conn.autocommit = True
+    lock_conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    lock_conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(REPORT_DDL)
+            cur.execute(SEGMENT_DDL)
+            cur.execute(HAS_PGSTATTUPLE_SQL)
+            exact = bool(cur.fetchone()[0])
+            cur.execute(LAST_REWRITE_SQL, (INTERVAL_H,))
+            recent = cur.fetchone()[0]
+
+        for table in TABLES:
+            ensure_brin(conn, table)
+
+        if recent is not None and not LAYOUT_FORCE:
+            print(f"[layout] 마지막 다시 쓰기 {recent} (LAYOUT_INTERVAL_H={INTERVAL_H:g}) -> BRIN 요약만")
+            return
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT now();")
+            run_at = cur.fetchone()[0]
+
+        total = 0
+        for table in TABLES:
+            report(conn, table, "before", run_at, exact)
+            if LAYOUT_CLUSTER:
+                total += cluster_table(conn, table)
+            else:
+                total += relayout(conn, lock_conn, table, run_at)
+            report(conn, table, "after", run_at, exact)
+        print(f"[layout] Done. rewritten rows={total} pgstattuple={exact} cluster={LAYOUT_CLUSTER}")
+
+    finally:
+        conn.autocommit = False
+        conn.close()
+        lock_conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, STAGE)
@@ -0,0 +1,142 @@
+"""변경 감지 upsert (merge 모드).
+
+국토부는 이미 내려준 거래를 나중에 고친다 (해제 cdeal_type/cdeal_day, 등기일 rgst_date 등).
+ON CONFLICT DO NOTHING 으로는 이런 수정이 버려지므로, 배치를 임시 테이블에 올린 뒤
+
+  1) 자연키가 같고 변경 가능 컬럼이 실제로 다른 행만 UPDATE (IS DISTINCT FROM)
+  2) 자연키가 없는 행만 INSERT
+
+자연키 비교는 자연키 지문 row_fp (row_fp.py) 한 컬럼으로 하고, 호출 전에 items 에 row_fp 가 있어야
+한다. 값이 같은 행은 건드리지 않으므로 쓰기 증폭이 없다.
+UPDATE 된 행의 단지는 etl_row_change 에 남겨 파생 스테이지가 재계산하게 한다.
+"""
+from psycopg2.extras import execute_values
+
+# not_null: 파서가 항상 채우는 키 컬럼
+# key: 나머지 자연키 컬럼 (NULL 가능)
+#   -> not_null + key 순서대로 직렬화한 것이 row_fp (순서를 바꾸면 기존 지문과 달라진다)
+# mutable: 나중에 바뀔 수 있는 컬럼
+SPECS = {
+    "apt_trade": {
+        "columns": [
+            "lawd_cd", "deal_ymd", "umd_nm", "apt_nm", "jibun",
+            "deal_year", "deal_month", "deal_day",
+            "deal_amount_manwon", "exclu_use_ar", "floor", "build_year",
+            "dealing_gbn", "estate_agent_sgg_nm", "rgst_date", "apt_dong",
+            "cdeal_type", "cdeal_day", "sler_gbn", "buyer_gbn", "land_leasehold_gbn",
+            "row_fp",
+        ],
+        "not_null": ["lawd_cd", "umd_nm", "apt_nm", "deal_year", "deal_month", "deal_day", "deal_amount_manwon"],
+        "key": ["jibun", "exclu_use_ar", "floor", "apt_dong"],
+        "mutable": [
+            "cdeal_type", "cdeal_day", "rgst_date",
+            "dealing_gbn", "estate_agent_sgg_nm", "sler_gbn", "buyer_gbn", "land_leasehold_gbn",
+        ],
+    },
+    "apt_trade_rent": {
+        "columns": [
+            "lawd_cd", "deal_ymd", "umd_nm", "apt_nm", "jibun",
+            "deal_year", "deal_month", "deal_day",
+            "deposit_manwon", "monthly_rent_manwon", "exclu_use_ar", "floor",
+            "contract_term", "contract_type", "use_rr_right",
+            "pre_deposit_manwon", "pre_monthly_rent_manwon",
+            "row_fp",
+        ],
+        "not_null": ["lawd_cd", "umd_nm", "apt_nm", "deal_year", "deal_month", "deal_day"],
+        "key": ["jibun", "deposit_manwon", "monthly_rent_manwon", "exclu_use_ar", "floor"],
+        "mutable": ["contract_term", "contract_type", "use_rr_right", "pre_deposit_manwon", "pre_monthly_rent_manwon"],
+    },
+}
+
+CHANGE_LOG_DDL = """
+CREATE TABLE IF NOT EXISTS etl_row_change (
+  id         bigserial PRIMARY KEY,
+  source     text NOT NULL,
+  lawd_cd    text NOT NULL,
+  apt_nm     text NOT NULL,
+  deal_ymd   text,
+  changed_at timestamptz NOT NULL DEFAULT now()
+);
+"""
+
+
+def _stage(table: str) -> str:
+    return f"_merge_{table}"
+
+
+def _build_sql(table: str) -> dict:
+    spec = SPECS[table]
+    cols = ", ".join(spec["columns"])
+    stage = _stage(table)
+    mut = spec["mutable"]
+
+    return {
+        "create": f"""
+CREATE TEMP TABLE IF NOT EXISTS {stage} ON COMMIT DELETE ROWS AS
+SELECT {cols} FROM {table} WITH NO DATA;
+""",
+        "truncate": f"TRUNCATE {stage};",
+        "fill": f"INSERT INTO {stage} ({cols}) VALUES %s;",
+        "update": f"""
+WITH src AS (
+  SELECT DISTINCT ON (row_fp) * FROM {stage}
+),
+upd AS (
+  UPDATE {table} t
+  SET {", ".join(f"{c} = s.{c}" for c in mut)}
+  FROM src s
+  WHERE t.row_fp = s.row_fp
+    AND ({", ".join(f"t.{c}" for c in mut)}) IS DISTINCT FROM ({", ".join(f"s.{c}" for c in mut)})
+  RETURNING t.lawd_cd, t.apt_nm, t.deal_ymd
+),
+log AS (
+  INSERT INTO etl_row_change (source, lawd_cd, apt_nm, deal_ymd)
+  SELECT DISTINCT '{table}', lawd_cd, apt_nm, deal_ymd FROM upd
+)
+SELECT COUNT(*) FROM upd;
+""",
+        "insert": f"""
+INSERT INTO {table} ({cols})
+SELECT DISTINCT ON (row_fp) {cols}
+FROM {stage} s
+WHERE NOT EXISTS (
+  SELECT 1 FROM {table} t WHERE t.row_fp = s.row_fp
+)
+ON CONFLICT DO NOTHING;
+""",
+        "distinct": f"SELECT COUNT(DISTINCT row_fp) FROM {stage};",
+    }
+
+
+_SQL = {table: _build_sql(table) for table in SPECS}
+
+
+def ensure(conn):
+    with conn.cursor() as cur:
+        cur.execute(CHANGE_LOG_DDL)
+    conn.commit()
+
+
+def merge(cur, table: str, items: list[dict]) -> dict:
+    """items 를 table 에 merge. 반환: {"inserted", "updated", "unchanged"}"""
+    if not items:
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    spec = SPECS[table]
+    sql = _SQL[table]
+    cols = spec["columns"]
+
+    cur.execute(sql["create"])
+    cur.execute(sql["truncate"])
+    execute_values(cur, sql["fill"], [tuple(it.get(c) for c in cols) for it in items], page_size=1000)
+
+    cur.execute(sql["distinct"])
+    distinct = cur.fetchone()[0]
+
+    cur.execute(sql["update"])
+    updated = cur.fetchone()[0]
+
+    cur.execute(sql["insert"])
+    inserted = cur.rowcount
+
+    return {"inserted": inserted, "updated": updated, "unchanged": max(distinct - inserted - updated, 0)}
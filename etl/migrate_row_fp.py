@@ -0,0 +1,224 @@
+"""기존 apt_trade / apt_trade_rent 행에 row_fp 채우기 (한 번만 / 중단 후 재실행 가능).
+
+1) row_fp 컬럼 + unique index
+2) id 구간별로 row_fp 계산해서 UPDATE (같은 지문이 이미 있으면 건너뜀)
+3) 끝까지 NULL 로 남은 행 = 자연키가 완전히 같은 중복 -> 삭제하고 etl_row_change 에 기록
+4) 검증 (NULL 0건 + row_fp unique index 유효) 통과하면 자연키 전체에 걸린 예전 unique index / 제약 삭제
+   (MIGRATE_KEEP_OLD_UNIQUE=1 이면 남김)
+5) row_fp NOT NULL
+
+MIGRATE_DRY_RUN=1 이면 읽기 전용 세션에서 지울 중복 행 수만 센다 (컬럼/인덱스/UPDATE/삭제 없음).
+"""
+import os
+import db
+import profiling
+from dotenv import load_dotenv
+from pathlib import Path
+
+import row_fp
+from merge_upsert import CHANGE_LOG_DDL
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+TABLES = ("apt_trade", "apt_trade_rent")
+BATCH_ROWS = int(os.environ.get("MIGRATE_BATCH_ROWS", "50000"))
+KEEP_OLD_UNIQUE = os.environ.get("MIGRATE_KEEP_OLD_UNIQUE", "0").strip() == "1"
+DRY_RUN = os.environ.get("MIGRATE_DRY_RUN", "0").strip() == "1"
+
+# -----------------------------
+# SQL
+# -----------------------------
+# 운영 중 테이블이라 인덱스는 CONCURRENTLY (autocommit 필요)
+ENSURE_SQL = """
+ALTER TABLE {table} ADD COLUMN IF NOT EXISTS row_fp uuid;
+"""
+INDEX_SQL = """
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {table}_row_fp_uidx ON {table} (row_fp);
+"""
+# CONCURRENTLY 가 중간에 실패하면 invalid 인덱스가 남고 IF NOT EXISTS 는 그걸 건너뛴다
+INDEX_VALID_SQL = "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s);"
+DROP_INDEX_SQL = 'DROP INDEX CONCURRENTLY IF EXISTS "{index}";'
+
+ID_RANGE_SQL = "SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM {table} WHERE row_fp IS NULL;"
+
+
+def _fill_sql(table: str) -> str:
+    return f"""
+WITH batch AS (
+  SELECT DISTINCT ON (fp) id, fp
+  FROM (
+    SELECT t.id, {row_fp.sql_expr(table, "t")} AS fp
+    FROM {table} t
+    WHERE t.id BETWEEN %s AND %s AND t.row_fp IS NULL
+  ) x
+  ORDER BY fp, id
+)
+UPDATE {table} t
+SET row_fp = b.fp
+FROM batch b
+WHERE t.id = b.id
+  AND NOT EXISTS (SELECT 1 FROM {table} e WHERE e.row_fp = b.fp);
+"""
+
+
+DELETE_DUP_SQL = """
+WITH gone AS (
+  DELETE FROM {table} WHERE row_fp IS NULL
+  RETURNING lawd_cd, apt_nm, deal_ymd
+),
+log AS (
+  INSERT INTO etl_row_change (source, lawd_cd, apt_nm, deal_ymd)
+  SELECT DISTINCT '{table}', lawd_cd, apt_nm, deal_ymd FROM gone
+)
+SELECT COUNT(*) FROM gone;
+"""
+
+# row_fp 이외의 unique index 중 자연키 컬럼을 2개 이상 쓰는 것 (PK 제외)
+OLD_UNIQUE_SQL = """
+SELECT i.relname, c.conname
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid AND c.contype = 'u'
+WHERE x.indrelid = %s::regclass
+  AND x.indisunique AND NOT x.indisprimary
+  AND i.relname <> %s
+  AND (
+    SELECT COUNT(*) FROM pg_attribute a
+    WHERE a.attrelid = x.indrelid AND a.attnum = ANY(x.indkey) AND a.attname = ANY(%s::text[])
+  ) >= 2;
+"""
+
+NULL_COUNT_SQL = "SELECT COUNT(*) FROM {table} WHERE row_fp IS NULL;"
+
+
+def _dry_dup_sql(table: str) -> str:
+    """드라이런: 지문을 저장하지 않고 계산만 해서 지워질 중복 행 수 (전체 합, 많은 단지 10개)."""
+    return f"""
+WITH dup AS (
+  SELECT t.lawd_cd, t.apt_nm, {row_fp.sql_expr(table, "t")} AS fp, COUNT(*) - 1 AS extra
+  FROM {table} t
+  GROUP BY 1, 2, 3
+  HAVING COUNT(*) > 1
+)
+SELECT lawd_cd, apt_nm, SUM(extra) AS n, SUM(SUM(extra)) OVER () AS total
+FROM dup
+GROUP BY 1, 2
+ORDER BY n DESC
+LIMIT 10;
+"""
+
+SET_NOT_NULL_SQL = "ALTER TABLE {table} ALTER COLUMN row_fp SET NOT NULL;"
+
+
+def _index_valid(cur, index: str):
+    """None = 없음"""
+    cur.execute(INDEX_VALID_SQL, (index,))
+    row = cur.fetchone()
+    return None if row is None else bool(row[0])
+
+
+def dry_run(conn, table: str):
+    with conn.cursor() as cur:
+        cur.execute(_dry_dup_sql(table))
+        rows = cur.fetchall()
+    print(f"[{table}] DRY RUN: exact duplicates to delete={int(rows[0][3]) if rows else 0}")
+    for lawd_cd, apt_nm, n, _ in rows:
+        print(f"[{table}]   {lawd_cd} {apt_nm}: {n}")
+
+
+def migrate(conn, table: str):
+    index = f"{table}_row_fp_uidx"
+    with conn.cursor() as cur:
+        cur.execute(ENSURE_SQL.format(table=table))
+        if _index_valid(cur, index) is False:
+            print(f"[{table}] invalid {index} (이전 실행 중단) -> 다시 생성")
+            cur.execute(DROP_INDEX_SQL.format(index=index))
+        cur.execute(INDEX_SQL.format(table=table))
+
+        cur.execute(ID_RANGE_SQL.format(table=table))
+        lo, hi = cur.fetchone()
+        fill = _fill_sql(table)
+        filled = 0
+        start = lo
+        while start <= hi and hi > 0:
+            end = start + BATCH_ROWS - 1
+            cur.execute(fill, (start, end))
+            filled += cur.rowcount
+            start = end + 1
+        print(f"[{table}] filled row_fp={filled}")
+
+        cur.execute(DELETE_DUP_SQL.format(table=table))
+        print(f"[{table}] exact duplicates deleted={cur.fetchone()[0]}")
+
+        # 검증: 모든 행에 지문이 있고 새 unique index 가 유효해야 예전 제약을 뗀다
+        cur.execute(NULL_COUNT_SQL.format(table=table))
+        nulls = cur.fetchone()[0]
+        valid = _index_valid(cur, index)
+        if nulls or not valid:
+            raise RuntimeError(f"{table} 검증 실패: row_fp NULL {nulls}건, {index} valid={valid} (예전 unique 유지)")
+
+        if KEEP_OLD_UNIQUE:
+            print(f"[{table}] MIGRATE_KEEP_OLD_UNIQUE=1 -> old unique kept")
+        else:
+            cur.execute(OLD_UNIQUE_SQL, (table, index, list(row_fp.FP_COLUMNS[table])))
+            for index_name, constraint_name in cur.fetchall():
+                if constraint_name:
+                    cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint_name}";')
+                else:
+                    cur.execute(DROP_INDEX_SQL.format(index=index_name))
+                print(f"[{table}] dropped old unique {constraint_name or index_name}")
+
+        cur.execute(SET_NOT_NULL_SQL.format(table=table))
+        print(f"[{table}] row_fp NOT NULL")
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    # 배치마다 바로 커밋 (중간에 끊겨도 채운 만큼 남는다)
+    conn.autocommit = True
+
+    try:
+        if DRY_RUN:
+            conn.set_session(readonly=True)
+            for table in TABLES:
+                dry_run(conn, table)
+            return
+        with conn.cursor() as cur:
+            cur.execute(CHANGE_LOG_DDL)
+        for table in TABLES:
+            migrate(conn, table)
+    finally:
+        conn.autocommit = False
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, "migrate_row_fp")
@@ -0,0 +1,311 @@
+"""ETL 실행 프로파일링 (--profile / ETL_PROFILE=1).
+
+- CPU: 샘플링 프로파일러. 모든 스레드의 스택을 ETL_PROFILE_INTERVAL_MS 마다 찍어
+  스테이지 버킷(fetch / parse / load / geocode / sleep ...)을 루트로 하는 collapsed stack 으로 모은다.
+  parse 프로세스 풀 워커도 같은 방식으로 샘플링해서 합친다.
+- 메모리: tracemalloc 으로 메인 프로세스의 할당 위치 top-N 과 피크.
+- 버킷별 wall time / 호출 수.
+
+결과는 실행 디렉터리(ETL_RUN_DIR, 기본 runs/<시각>)에
+  {stage}.collapsed   : flamegraph.pl / speedscope 에 바로 넣을 수 있는 형식
+  {stage}.summary.txt : 버킷별 시간, 샘플 top-N (self / inclusive), 할당 top-N
+
+꺼져 있으면 bucket() 은 아무 일도 하지 않는다.
+"""
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+import multiprocessing.util
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+INTERVAL_SEC = float(os.environ.get("ETL_PROFILE_INTERVAL_MS", "5")) / 1000
+TOP_N = int(os.environ.get("ETL_PROFILE_TOP", "30"))
+MAX_DEPTH = 128
+MEM_CHECK_EVERY = 200
+
+_enabled = False
+_labels: dict[int, list[str]] = {}
+_bucket_lock = threading.Lock()
+_bucket_time: dict[str, float] = {}
+_bucket_calls: dict[str, int] = {}
+_sampler = None
+_code_names: dict = {}
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def _env_enabled() -> bool:
+    return os.environ.get("ETL_PROFILE", "0").strip() == "1" or "--profile" in sys.argv[1:]
+
+
+def run_dir() -> Path:
+    d = os.environ.get("ETL_RUN_DIR", "").strip()
+    if not d:
+        d = str(REPO_ROOT / "runs" / time.strftime("%Y%m%d-%H%M%S"))
+        os.environ["ETL_RUN_DIR"] = d
+    return Path(d)
+
+
+# -----------------------------
+# 버킷
+# -----------------------------
+@contextmanager
+def bucket(name: str):
+    if not _enabled:
+        yield
+        return
+    tid = threading.get_ident()
+    stack = _labels.setdefault(tid, [])
+    stack.append(name)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        stack.pop()
+        with _bucket_lock:
+            _bucket_time[name] = _bucket_time.get(name, 0.0) + dt
+            _bucket_calls[name] = _bucket_calls.get(name, 0) + 1
+
+
+def call_in_bucket(name: str, fn, *args):
+    """프로세스 풀에 넘기는 용도 (모듈 최상위 함수라 pickle 가능)."""
+    with bucket(name):
+        return fn(*args)
+
+
+# -----------------------------
+# 샘플러
+# -----------------------------
+def _frame_name(code) -> str:
+    name = _code_names.get(code)
+    if name is None:
+        name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        _code_names[code] = name
+    return name
+
+
+class _Sampler(threading.Thread):
+    """버킷 안에 있는 스레드만 샘플링 (풀/큐 관리 스레드의 대기 시간은 뺀다)."""
+
+    def __init__(self):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.counts: Counter = Counter()
+        self.samples = 0
+        # 메모리 사용량이 가장 높았던 순간의 tracemalloc 스냅샷
+        self.mem_snapshot = None
+        self.mem_at_snapshot = 0
+        self._stop_evt = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_evt.wait(INTERVAL_SEC):
+            self.samples += 1
+            if self.samples % MEM_CHECK_EVERY == 0 and tracemalloc.is_tracing():
+                self._check_memory()
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                labels = _labels.get(tid)
+                if not labels:
+                    continue
+                label = labels[-1]
+                names = []
+                f = frame
+                while f is not None and len(names) < MAX_DEPTH:
+                    names.append(_frame_name(f.f_code))
+                    f = f.f_back
+                names.append(label)
+                names.reverse()
+                self.counts[";".join(names)] += 1
+
+    def _check_memory(self):
+        current, _ = tracemalloc.get_traced_memory()
+        # 직전 스냅샷보다 10% 이상 늘었을 때만 (스냅샷 자체가 비싸다)
+        if current > self.mem_at_snapshot * 1.1:
+            self.mem_snapshot = tracemalloc.take_snapshot()
+            self.mem_at_snapshot = current
+
+    def stop(self):
+        self._stop_evt.set()
+        self.join(timeout=5)
+
+
+def _reset():
+    global _sampler
+    _labels.clear()
+    _bucket_time.clear()
+    _bucket_calls.clear()
+    _sampler = None
+
+
+# -----------------------------
+# 프로세스 풀 워커
+# -----------------------------
+def worker_init():
+    """ProcessPoolExecutor(initializer=...) 용. 부모가 프로파일 중일 때만 동작."""
+    global _enabled, _sampler
+    if os.environ.get("ETL_PROFILE_PREFIX", "").strip() == "":
+        return
+    _reset()
+    _enabled = True
+    _sampler = _Sampler()
+    _sampler.start()
+    # 워커는 os._exit 로 끝나므로 atexit 대신 multiprocessing finalizer 로 저장
+    multiprocessing.util.Finalize(None, _flush_worker, exitpriority=10)
+
+
+def _flush_worker():
+    if _sampler is None:
+        return
+    _sampler.stop()
+    prefix = Path(os.environ["ETL_PROFILE_PREFIX"])
+    pid = os.getpid()
+    with open(f"{prefix}.worker-{pid}.collapsed", "w", encoding="utf-8") as f:
+        for stack, n in _sampler.counts.items():
+            f.write(f"{stack} {n}\n")
+    with open(f"{prefix}.worker-{pid}.json", "w", encoding="utf-8") as f:
+        json.dump({"time": _bucket_time, "calls": _bucket_calls}, f)
+
+
+# -----------------------------
+# 시작 / 종료
+# -----------------------------
+def _prefix_for(stage: str) -> Path:
+    d = run_dir()
+    d.mkdir(parents=True, exist_ok=True)
+    prefix = d / stage
+    n = 2
+    # 데몬처럼 같은 스테이지를 여러 번 돌리면 stage-2, stage-3 ...
+    while prefix.with_name(prefix.name + ".summary.txt").exists():
+        prefix = d / f"{stage}-{n}"
+        n += 1
+    return prefix
+
+
+def start(stage: str) -> Path:
+    global _enabled, _sampler
+    _reset()
+    prefix = _prefix_for(stage)
+    os.environ["ETL_PROFILE_PREFIX"] = str(prefix)
+    _enabled = True
+    tracemalloc.start(16)
+    _sampler = _Sampler()
+    _sampler.start()
+    return prefix
+
+
+def _merge_workers(prefix: Path, counts: Counter, times: dict, calls: dict):
+    for p in prefix.parent.glob(prefix.name + ".worker-*.collapsed"):
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                stack, _, n = line.rstrip("\n").rpartition(" ")
+                counts[stack] += int(n)
+        p.unlink()
+    for p in prefix.parent.glob(prefix.name + ".worker-*.json"):
+        with open(p, encoding="utf-8") as f:
+            w = json.load(f)
+        for k, v in w["time"].items():
+            times[k] = times.get(k, 0.0) + v
+        for k, v in w["calls"].items():
+            calls[k] = calls.get(k, 0) + v
+        p.unlink()
+
+
+def _summary(stage: str, elapsed: float, samples: int, counts: Counter, times: dict, calls: dict, mem) -> str:
+    lines = [f"== {stage}  elapsed={elapsed:.1f}s  samples={samples} (interval {INTERVAL_SEC * 1000:.0f}ms)", ""]
+
+    lines.append("-- buckets (wall 합계, 스레드/워커 합이라 elapsed 보다 클 수 있음)")
+    for k in sorted(times, key=times.get, reverse=True):
+        lines.append(f"{k:<16} {times[k]:>10.2f}s  calls={calls.get(k, 0)}")
+    lines.append("")
+
+    total = sum(counts.values()) or 1
+    by_bucket: Counter = Counter()
+    self_cnt: Counter = Counter()
+    incl_cnt: Counter = Counter()
+    for stack, n in counts.items():
+        parts = stack.split(";")
+        by_bucket[parts[0]] += n
+        self_cnt[(parts[0], parts[-1])] += n
+        for fr in set(parts[1:]):
+            incl_cnt[(parts[0], fr)] += n
+
+    lines.append("-- samples by bucket")
+    for k, n in by_bucket.most_common():
+        lines.append(f"{k:<16} {n:>8}  {100 * n / total:5.1f}%")
+    lines.append("")
+
+    lines.append(f"-- top {TOP_N} self (가장 안쪽 프레임)")
+    for (b, fr), n in self_cnt.most_common(TOP_N):
+        lines.append(f"{n:>8}  {100 * n / total:5.1f}%  [{b}] {fr}")
+    lines.append("")
+
+    lines.append(f"-- top {TOP_N} inclusive")
+    for (b, fr), n in incl_cnt.most_common(TOP_N):
+        lines.append(f"{n:>8}  {100 * n / total:5.1f}%  [{b}] {fr}")
+    lines.append("")
+
+    snapshot, at, peak = mem
+    lines.append(
+        f"-- memory (메인 프로세스) peak={peak / 1024 / 1024:.1f}MB, "
+        f"top {TOP_N} 할당 위치 (사용량 최고 시점 {at / 1024 / 1024:.1f}MB 스냅샷)"
+    )
+    for st in snapshot.statistics("lineno")[:TOP_N]:
+        fr = st.traceback[0]
+        lines.append(f"{st.size / 1024:>10.1f}KB  count={st.count:<8} {fr.filename}:{fr.lineno}")
+    return "\n".join(lines) + "\n"
+
+
+def finish(stage: str, prefix: Path, elapsed: float):
+    global _enabled
+    _sampler.stop()
+    _enabled = False
+    _sampler._check_memory()
+    snapshot = _sampler.mem_snapshot.filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    )
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    counts = Counter(_sampler.counts)
+    times = dict(_bucket_time)
+    calls = dict(_bucket_calls)
+    _merge_workers(prefix, counts, times, calls)
+    os.environ.pop("ETL_PROFILE_PREFIX", None)
+
+    with open(f"{prefix}.collapsed", "w", encoding="utf-8") as f:
+        for stack, n in sorted(counts.items()):
+            f.write(f"{stack} {n}\n")
+    summary = _summary(stage, elapsed, _sampler.samples, counts, times, calls, (snapshot, _sampler.mem_at_snapshot, peak))
+    with open(f"{prefix}.summary.txt", "w", encoding="utf-8") as f:
+        f.write(summary)
+    print(f"[profile] {prefix}.summary.txt / {prefix.name}.collapsed")
+
+
+def run(main, stage: str):
+    """스크립트 진입점: profiling.run(main, "sale_daily")
+
+    ETL_PROFILE=1 이거나 인자에 --profile 이 있으면 프로파일을 남긴다.
+    --profile 은 여기서 읽고 sys.argv 에서 빼므로 argparse 를 쓰는 스크립트도 따로 선언할 필요가 없다.
+    """
+    on = _env_enabled()
+    sys.argv[1:] = [a for a in sys.argv[1:] if a != "--profile"]
+    if not on:
+        return main()
+    prefix = start(stage)
+    t0 = time.perf_counter()
+    try:
+        with bucket(stage):
+            return main()
+    finally:
+        finish(stage, prefix, time.perf_counter() - t0)
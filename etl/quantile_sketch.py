@@ -0,0 +1,171 @@
+"""병합 가능한 분위수 스케치 (로그 버킷, 상대 오차 ALPHA).
+
+(단지, 면적대, 월) 하나에 들어가는 거래는 많아야 수십 건이라 정렬 비용은 작지만,
+임의 기간 중위가를 요청마다 원본에서 구하려면 기간 전체 행을 읽어 정렬해야 한다.
+그룹마다 값을 로그 버킷 개수로 요약해 두면 버킷 개수를 더하는 것만으로 병합이 끝나고
+(순서와 무관, 병합해도 오차가 늘지 않음) 분위수는 상대 오차 ALPHA 안에서 나온다.
+
+- 버킷 k = ceil(log_gamma(v)), gamma = (1 + ALPHA) / (1 - ALPHA), 대표값 2·gamma^k / (gamma + 1)
+- 0 이하 값은 zero 칸 (보증금 0 월세 등)
+- 최소/최대는 정확히 보관해 p0/p100 과 대표값 범위를 맞춘다
+
+직렬화 (bytea, 백엔드 chart/quantile-sketch.ts 와 같은 형식):
+  u8 VERSION | varint n | varint zero | varint vmin | varint vmax | zigzag varint kmin | varint nb | varint count × nb
+"""
+import math
+
+import numpy as np
+
+VERSION = 1
+# 상대 오차 1% (분위수 값이 실제 값과 1% 안)
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+_LOG_GAMMA = math.log(GAMMA)
+
+
+class Sketch:
+    __slots__ = ("n", "zero", "vmin", "vmax", "kmin", "counts")
+
+    def __init__(self, n=0, zero=0, vmin=0, vmax=0, kmin=0, counts=None):
+        self.n = n
+        self.zero = zero
+        self.vmin = vmin
+        self.vmax = vmax
+        self.kmin = kmin
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else counts
+
+    @classmethod
+    def from_values(cls, values) -> "Sketch":
+        v = np.rint(np.asarray(values, dtype=np.float64)).astype(np.int64)
+        if len(v) == 0:
+            return cls()
+        pos = v[v > 0]
+        s = cls(n=len(v), zero=len(v) - len(pos), vmin=int(max(v.min(), 0)), vmax=int(max(v.max(), 0)))
+        if len(pos):
+            keys = bucket_keys(pos)
+            s.kmin = int(keys.min())
+            s.counts = np.bincount(keys - s.kmin).astype(np.int64)
+        return s
+
+    def merge(self, other: "Sketch") -> "Sketch":
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            return other
+        nb_self, nb_other = len(self.counts), len(other.counts)
+        if nb_self == 0 or nb_other == 0:
+            kmin, counts = (other.kmin, other.counts.copy()) if nb_self == 0 else (self.kmin, self.counts.copy())
+        else:
+            kmin = min(self.kmin, other.kmin)
+            kmax = max(self.kmin + nb_self, other.kmin + nb_other)
+            counts = np.zeros(kmax - kmin, dtype=np.int64)
+            counts[self.kmin - kmin:self.kmin - kmin + nb_self] += self.counts
+            counts[other.kmin - kmin:other.kmin - kmin + nb_other] += other.counts
+        return Sketch(
+            n=self.n + other.n,
+            zero=self.zero + other.zero,
+            vmin=min(self.vmin, other.vmin),
+            vmax=max(self.vmax, other.vmax),
+            kmin=kmin,
+            counts=counts,
+        )
+
+    def quantile(self, q: float) -> float | None:
+        """q (0~1) 분위수. 0 번째부터 센 순위 q·(n-1) 가 들어가는 버킷의 대표값."""
+        if self.n == 0:
+            return None
+        if q <= 0:
+            return float(self.vmin)
+        if q >= 1:
+            return float(self.vmax)
+        rank = q * (self.n - 1)
+        if rank < self.zero:
+            return 0.0
+        cum = np.cumsum(self.counts) + self.zero
+        i = int(np.searchsorted(cum, rank, side="right"))
+        i = min(i, len(self.counts) - 1)
+        v = 2.0 * GAMMA ** (self.kmin + i) / (GAMMA + 1)
+        return float(min(max(v, self.vmin), self.vmax))
+
+    def quantiles(self, qs) -> list[float | None]:
+        return [self.quantile(q) for q in qs]
+
+    def to_bytes(self) -> bytes:
+        out = bytearray([VERSION])
+        for x in (self.n, self.zero, self.vmin, self.vmax):
+            _put_varint(out, int(x))
+        _put_varint(out, _zigzag(self.kmin))
+        _put_varint(out, len(self.counts))
+        for c in self.counts:
+            _put_varint(out, int(c))
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data) -> "Sketch":
+        data = bytes(data)
+        if not data or data[0] != VERSION:
+            raise ValueError(f"지원하지 않는 스케치 버전: {data[:1]!r}")
+        pos = 1
+        vals = []
+        for _ in range(6):
+            x, pos = _get_varint(data, pos)
+            vals.append(x)
+        n, zero, vmin, vmax, kmin_z, nb = vals
+        counts = np.zeros(nb, dtype=np.int64)
+        for i in range(nb):
+            counts[i], pos = _get_varint(data, pos)
+        return cls(n=n, zero=zero, vmin=vmin, vmax=vmax, kmin=_unzigzag(kmin_z), counts=counts)
+
+
+def bucket_keys(values: np.ndarray) -> np.ndarray:
+    """양수 값 -> 로그 버킷 번호."""
+    return np.ceil(np.log(np.asarray(values, dtype=np.float64)) / _LOG_GAMMA).astype(np.int64)
+
+
+def merge_all(blobs) -> Sketch:
+    """직렬화된 스케치 여러 개(기간 안 월별) -> 하나로."""
+    out = Sketch()
+    for b in blobs:
+        out = out.merge(Sketch.from_bytes(b))
+    return out
+
+
+def build_groups(inv: np.ndarray, values: np.ndarray, n_groups: int) -> list[bytes]:
+    """그룹 코드(inv)별 값 -> 그룹별 직렬화 스케치 (그룹 번호 순)."""
+    order = np.argsort(inv, kind="stable")
+    sv = np.asarray(values, dtype=np.float64)[order]
+    counts = np.bincount(inv, minlength=n_groups)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    return [Sketch.from_values(sv[s:e]).to_bytes() for s, e in zip(starts, ends)]
+
+
+def _zigzag(x: int) -> int:
+    return (x << 1) if x >= 0 else ((-x << 1) - 1)
+
+
+def _unzigzag(z: int) -> int:
+    return (z >> 1) if not z & 1 else -((z + 1) >> 1)
+
+
+def _put_varint(out: bytearray, x: int):
+    while True:
+        b = x & 0x7F
+        x >>= 7
+        if x:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return
+
+
+def _get_varint(data: bytes, pos: int) -> tuple[int, int]:
+    x = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        x |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return x, pos
+        shift += 7
@@ -0,0 +1,260 @@
+"""단지별 최근 N건 거래 링 테이블 (apt_recent_deal).
+
+최근 거래 패널(recent-trades / recent-rents)은 단지 전체 이력을 날짜식으로 정렬해 앞의 몇 건만 썼다.
+수집 로더가 배치를 넣을 때마다 push() 로 그 배치의 단지만
+
+  1) 배치 행 중 (단지, 지번, 구분)별 최신 RING_SIZE 건을 upsert (merge 모드로 바뀐 등기/해제 값도 같이 갱신, 값이 같으면 쓰지 않음)
+  2) 링에서 RING_SIZE 건을 넘는 오래된 항목 삭제
+
+하므로 링은 단지 이력 길이와 상관없이 구분별 RING_SIZE 건을 넘지 않고,
+API 는 PK 범위 한 번으로 읽는다. 화면에 쓰는 값(YYYYMMDD 날짜, 등기 여부, 동)은 미리 만들어 둔다.
+
+이름 변경/병합/중복 삭제처럼 로더를 거치지 않고 행이 바뀌거나 사라지는 경우는
+etl_row_change 를 따라가는 파생 스테이지(main, STAGE "recent_ring")가 해당 단지 링을 다시 만든다.
+처음 한 번(또는 RECENT_RING_FULL=1)은 전체 재구성.
+
+python etl/recent_ring.py
+"""
+import os
+import db
+import profiling
+from dotenv import load_dotenv
+from pathlib import Path
+
+import stage_state
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+STAGE = "recent_ring"
+# 1이면 링 전체 재구성
+RECENT_RING_FULL = os.environ.get("RECENT_RING_FULL", "0").strip() == "1"
+
+# (단지, 지번, 구분)별 보관 건수. 백엔드 apt.shared.ts 의 RECENT_RING_SIZE 와 같아야 한다
+# (요청 limit 이 이보다 크거나 기간을 지정하면 API 는 원본 테이블을 읽는다)
+RING_SIZE = 20
+
+# -----------------------------
+# SQL
+# -----------------------------
+# kind: sale | jeonse | monthly (rentType=all 은 jeonse + monthly 두 범위를 합쳐 읽는다)
+# jibun: btrim(COALESCE(jibun, '')) — 백엔드 jibun 옵셔널 필터와 같은 비교
+# src_id: 원본(apt_trade / apt_trade_rent) id, 같은 날 거래는 나중에 들어온 쪽이 앞
+DDL = """
+CREATE TABLE IF NOT EXISTS apt_recent_deal (
+  lawd_cd             text    NOT NULL,
+  apt_nm              text    NOT NULL,
+  jibun               text    NOT NULL DEFAULT '',
+  kind                text    NOT NULL,
+  deal_date           date    NOT NULL,
+  src_id              bigint  NOT NULL,
+  deal_ymd            char(8) NOT NULL,
+  amount_manwon       int,
+  deposit_manwon      int,
+  monthly_rent_manwon int,
+  exclu_use_ar        numeric,
+  floor               int,
+  deal_dong           text,
+  is_registered       boolean,
+  updated_at          timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (lawd_cd, apt_nm, jibun, kind, deal_date, src_id)
+);
+"""
+
+# 원본 테이블별: 구분 식, 링 컬럼 <- 원본 식
+# 계약일은 deal_year/month/day 로 (deal_ymd 는 YYYYMM 이라 일 단위 정렬이 안 된다)
+SOURCES = {
+    "apt_trade": {
+        "kinds": ["sale"],
+        "kind": "'sale'",
+        "values": {
+            "amount_manwon": "s.deal_amount_manwon",
+            "deposit_manwon": "NULL::int",
+            "monthly_rent_manwon": "NULL::int",
+            "exclu_use_ar": "s.exclu_use_ar",
+            "floor": "s.floor",
+            "deal_dong": "NULLIF(btrim(s.apt_dong::text), '')",
+            "is_registered": "CASE WHEN NULLIF(btrim(s.rgst_date::text), '') IS NOT NULL THEN true END",
+        },
+    },
+    "apt_trade_rent": {
+        "kinds": ["jeonse", "monthly"],
+        "kind": "CASE WHEN COALESCE(s.monthly_rent_manwon, 0) > 0 THEN 'monthly' ELSE 'jeonse' END",
+        "values": {
+            "amount_manwon": "NULL::int",
+            "deposit_manwon": "s.deposit_manwon",
+            "monthly_rent_manwon": "s.monthly_rent_manwon",
+            "exclu_use_ar": "s.exclu_use_ar",
+            "floor": "s.floor",
+            "deal_dong": "NULL::text",
+            "is_registered": "NULL::boolean",
+        },
+    },
+}
+
+# 백엔드 apt.shared.ts 의 DEAL_DAY_EXPR 와 같아야 한다 (링을 못 쓰는 요청도 같은 날짜로 3개월을 자른다)
+DEAL_DATE = "(make_date(s.deal_year, s.deal_month, 1) + (GREATEST(s.deal_day, 1) - 1))"
+VALUE_COLUMNS = list(SOURCES["apt_trade"]["values"])
+KEY = "lawd_cd, apt_nm, jibun, kind, deal_date, src_id"
+
+
+def _fill_sql(table: str, where: str) -> str:
+    """원본에서 where 에 맞는 행을 (단지, 지번, 구분)별 최신 RING_SIZE 건만 링에 upsert."""
+    src = SOURCES[table]
+    vals = ",\n    ".join(f"{expr} AS {col}" for col, expr in src["values"].items())
+    cols = ", ".join(VALUE_COLUMNS)
+    return f"""
+INSERT INTO apt_recent_deal ({KEY}, deal_ymd, {cols})
+SELECT {KEY}, to_char(deal_date, 'YYYYMMDD'), {cols}
+FROM (
+  SELECT
+    s.lawd_cd, s.apt_nm, btrim(COALESCE(s.jibun, '')) AS jibun,
+    {src["kind"]} AS kind,
+    {DEAL_DATE} AS deal_date,
+    s.id AS src_id,
+    {vals},
+    ROW_NUMBER() OVER (
+      PARTITION BY s.lawd_cd, s.apt_nm, btrim(COALESCE(s.jibun, '')), {src["kind"]}
+      ORDER BY {DEAL_DATE} DESC, s.id DESC
+    ) AS rn
+  FROM {table} s
+  WHERE {where}
+) x
+WHERE rn <= {RING_SIZE}
+ON CONFLICT ({KEY}) DO UPDATE SET
+  {", ".join(f"{c} = EXCLUDED.{c}" for c in VALUE_COLUMNS)},
+  updated_at = now()
+WHERE ({", ".join(f"apt_recent_deal.{c}" for c in VALUE_COLUMNS)})
+  IS DISTINCT FROM ({", ".join(f"EXCLUDED.{c}" for c in VALUE_COLUMNS)});
+"""
+
+
+_PUSH_SQL = {t: _fill_sql(t, "s.row_fp = ANY(%s::uuid[])") for t in SOURCES}
+
+_REBUILD_SQL = {
+    t: _fill_sql(t, "(s.lawd_cd, s.apt_nm) IN (SELECT lawd_cd, apt_nm FROM unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm))")
+    for t in SOURCES
+}
+
+_FULL_SQL = {t: _fill_sql(t, "true") for t in SOURCES}
+
+TRIM_SQL = f"""
+WITH ranked AS (
+  SELECT d.lawd_cd, d.apt_nm, d.jibun, d.kind, d.deal_date, d.src_id,
+         ROW_NUMBER() OVER (
+           PARTITION BY d.lawd_cd, d.apt_nm, d.jibun, d.kind
+           ORDER BY d.deal_date DESC, d.src_id DESC
+         ) AS rn
+  FROM apt_recent_deal d
+  JOIN (SELECT DISTINCT * FROM unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)) k
+    ON d.lawd_cd = k.lawd_cd AND d.apt_nm = k.apt_nm
+  WHERE d.kind = ANY(%s::text[])
+)
+DELETE FROM apt_recent_deal d
+USING ranked r
+WHERE r.rn > {RING_SIZE}
+  AND d.lawd_cd = r.lawd_cd AND d.apt_nm = r.apt_nm AND d.jibun = r.jibun
+  AND d.kind = r.kind AND d.deal_date = r.deal_date AND d.src_id = r.src_id;
+"""
+
+CLEAR_SQL = """
+DELETE FROM apt_recent_deal d
+USING unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+WHERE d.lawd_cd = k.lawd_cd AND d.apt_nm = k.apt_nm
+  AND d.kind = ANY(%s::text[]);
+"""
+
+
+def ensure(conn):
+    with conn.cursor() as cur:
+        cur.execute(DDL)
+    conn.commit()
+
+
+def _complexes(items: list[dict]) -> tuple[list[str], list[str]]:
+    keys = sorted({(it["lawd_cd"], it["apt_nm"]) for it in items})
+    return [k[0] for k in keys], [k[1] for k in keys]
+
+
+def push(cur, table: str, items: list[dict]) -> int:
+    """방금 적재한 배치를 링에 반영 (로더 트랜잭션 안에서, 커밋은 호출한 쪽). 반환: 밀려난 항목 수"""
+    if not items:
+        return 0
+    cur.execute(_PUSH_SQL[table], ([it["row_fp"] for it in items],))
+    lawds, apts = _complexes(items)
+    cur.execute(TRIM_SQL, (lawds, apts, SOURCES[table]["kinds"]))
+    return cur.rowcount
+
+
+def rebuild(cur, table: str, lawds: list[str], apts: list[str]):
+    """단지 링을 원본에서 다시 만든다 (행이 지워지거나 다른 단지로 옮겨간 경우)."""
+    kinds = SOURCES[table]["kinds"]
+    cur.execute(CLEAR_SQL, (lawds, apts, kinds))
+    cur.execute(_REBUILD_SQL[table], (lawds, apts))
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    conn.autocommit = False
+
+    try:
+        stage_state.ensure(conn)
+        ensure(conn)
+
+        src = stage_state.CHANGE_SOURCE
+        full = RECENT_RING_FULL or stage_state.last_run_at(conn, STAGE) is None
+        until_id = stage_state.max_id(conn, src)
+
+        with conn.cursor() as cur:
+            if full:
+                cur.execute("TRUNCATE apt_recent_deal;")
+                for table in SOURCES:
+                    cur.execute(_FULL_SQL[table])
+                    print(f"[recent_ring] full {table} rows={cur.rowcount}")
+            else:
+                # 새 거래는 로더가 이미 넣었다 -> 이름 변경/병합/삭제로 바뀐 단지만 다시
+                targets = sorted(stage_state.touched_complexes(conn, src, stage_state.get_last_id(conn, STAGE, src), until_id))
+                lawds = [t[0] for t in targets]
+                apts = [t[1] for t in targets]
+                print(f"[recent_ring] changed complexes={len(targets)}")
+                if targets:
+                    for table in SOURCES:
+                        rebuild(cur, table, lawds, apts)
+
+        stage_state.commit_marks(conn, STAGE, {src: until_id})
+        conn.commit()
+        print(f"[recent_ring] Done. full={full}")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, STAGE)
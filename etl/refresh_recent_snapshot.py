@@ -0,0 +1,216 @@
+import os
+import db
+import profiling
+from dotenv import load_dotenv
+from pathlib import Path
+
+import stage_state
+from sql_common import deal_date_expr, window_start_expr, REP_LOCATION_CTE, RENT_KIND_FILTER
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+STAGE = "recent_snapshot"
+# 1이면 전체 단지 재계산
+SNAPSHOT_FULL = os.environ.get("SNAPSHOT_FULL", "0").strip() == "1"
+
+# -----------------------------
+# SQL
+# -----------------------------
+# 지도 API(trades / rents / MVT)가 매 요청 계산하던 "최근 3개월 단지별 집계"를 미리 저장.
+# first_deal_date: 구간 안 가장 오래된 거래일 -> 구간 밖으로 밀려나면 재계산 대상
+DDL = """
+CREATE TABLE IF NOT EXISTS apt_recent_trade_snapshot (
+  lawd_cd         text NOT NULL,
+  apt_nm          text NOT NULL,
+  umd_nm          text,
+  lat             double precision NOT NULL,
+  lng             double precision NOT NULL,
+  geohash         text,
+  trade_cnt       int  NOT NULL,
+  min_price       int,
+  max_price       int,
+  last_trade_ymd  text,
+  last_deal_date  date,
+  first_deal_date date,
+  updated_at      timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (lawd_cd, apt_nm)
+);
+CREATE INDEX IF NOT EXISTS apt_recent_trade_snapshot_latlng_idx ON apt_recent_trade_snapshot (lat, lng);
+
+CREATE TABLE IF NOT EXISTS apt_recent_rent_snapshot (
+  lawd_cd          text NOT NULL,
+  apt_nm           text NOT NULL,
+  rent_type        text NOT NULL,
+  umd_nm           text,
+  lat              double precision NOT NULL,
+  lng              double precision NOT NULL,
+  geohash          text,
+  rent_cnt         int  NOT NULL,
+  min_deposit      int,
+  max_deposit      int,
+  min_monthly_rent int,
+  max_monthly_rent int,
+  last_deal_ymd    text,
+  last_deal_date   date,
+  first_deal_date  date,
+  updated_at       timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (lawd_cd, apt_nm, rent_type)
+);
+CREATE INDEX IF NOT EXISTS apt_recent_rent_snapshot_latlng_idx ON apt_recent_rent_snapshot (rent_type, lat, lng);
+"""
+
+MOVED_SQL = """
+SELECT DISTINCT lawd_cd, apt_nm FROM apt_location
+WHERE updated_at > %s;
+"""
+
+EXPIRED_SQL = f"""
+SELECT lawd_cd, apt_nm FROM apt_recent_trade_snapshot WHERE first_deal_date < {window_start_expr()}
+UNION
+SELECT lawd_cd, apt_nm FROM apt_recent_rent_snapshot WHERE first_deal_date < {window_start_expr()};
+"""
+
+ALL_COMPLEXES_SQL = f"""
+SELECT DISTINCT t.lawd_cd, t.apt_nm FROM apt_trade t
+WHERE ({deal_date_expr("t")}) >= {window_start_expr()}
+UNION
+SELECT DISTINCT r.lawd_cd, r.apt_nm FROM apt_trade_rent r
+WHERE ({deal_date_expr("r")}) >= {window_start_expr()};
+"""
+
+DELETE_SQL = """
+DELETE FROM {table} s
+USING unnest(%s::text[], %s::text[]) AS k(lawd_cd, apt_nm)
+WHERE s.lawd_cd = k.lawd_cd AND s.apt_nm = k.apt_nm;
+"""
+
+TRADE_SQL = f"""
+WITH
+target AS (SELECT * FROM unnest(%s::text[], %s::text[]) AS c(lawd_cd, apt_nm)),
+{REP_LOCATION_CTE}
+INSERT INTO apt_recent_trade_snapshot (
+  lawd_cd, apt_nm, umd_nm, lat, lng, geohash,
+  trade_cnt, min_price, max_price, last_trade_ymd, last_deal_date, first_deal_date
+)
+SELECT
+  t.lawd_cd, t.apt_nm, rl.umd_nm, rl.lat, rl.lng, rl.geohash,
+  COUNT(*)::int,
+  MIN(t.deal_amount_manwon)::int,
+  MAX(t.deal_amount_manwon)::int,
+  MAX(t.deal_ymd),
+  MAX({deal_date_expr("t")}),
+  MIN({deal_date_expr("t")})
+FROM apt_trade t
+JOIN target c ON t.lawd_cd = c.lawd_cd AND t.apt_nm = c.apt_nm
+JOIN rep_location rl ON t.lawd_cd = rl.lawd_cd AND t.apt_nm = rl.apt_nm
+WHERE ({deal_date_expr("t")}) >= {window_start_expr()}
+GROUP BY t.lawd_cd, t.apt_nm, rl.umd_nm, rl.lat, rl.lng, rl.geohash;
+"""
+
+RENT_SQL = f"""
+WITH
+target AS (SELECT * FROM unnest(%s::text[], %s::text[]) AS c(lawd_cd, apt_nm)),
+{REP_LOCATION_CTE}
+INSERT INTO apt_recent_rent_snapshot (
+  lawd_cd, apt_nm, rent_type, umd_nm, lat, lng, geohash,
+  rent_cnt, min_deposit, max_deposit, min_monthly_rent, max_monthly_rent,
+  last_deal_ymd, last_deal_date, first_deal_date
+)
+SELECT
+  r.lawd_cd, r.apt_nm, k.kind, rl.umd_nm, rl.lat, rl.lng, rl.geohash,
+  COUNT(*)::int,
+  MIN(r.deposit_manwon)::int,
+  MAX(r.deposit_manwon)::int,
+  MIN(COALESCE(r.monthly_rent_manwon, 0))::int,
+  MAX(COALESCE(r.monthly_rent_manwon, 0))::int,
+  MAX(r.deal_ymd),
+  MAX({deal_date_expr("r")}),
+  MIN({deal_date_expr("r")})
+FROM apt_trade_rent r
+JOIN target c ON r.lawd_cd = c.lawd_cd AND r.apt_nm = c.apt_nm
+JOIN rep_location rl ON r.lawd_cd = rl.lawd_cd AND r.apt_nm = rl.apt_nm
+CROSS JOIN (VALUES ('all'), ('jeonse'), ('monthly')) AS k(kind)
+WHERE ({deal_date_expr("r")}) >= {window_start_expr()}
+  AND {RENT_KIND_FILTER}
+GROUP BY r.lawd_cd, r.apt_nm, k.kind, rl.umd_nm, rl.lat, rl.lng, rl.geohash;
+"""
+
+
+# -----------------------------
+# main
+# -----------------------------
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    conn.autocommit = False
+
+    try:
+        stage_state.ensure(conn)
+        with conn.cursor() as cur:
+            cur.execute(DDL)
+        conn.commit()
+
+        last_run = None if SNAPSHOT_FULL else stage_state.last_run_at(conn, STAGE)
+        full = SNAPSHOT_FULL or last_run is None
+
+        with conn.cursor() as cur:
+            if full:
+                marks = {src: stage_state.max_id(conn, src) for src in stage_state.SOURCES + (stage_state.CHANGE_SOURCE,)}
+                cur.execute(ALL_COMPLEXES_SQL)
+                targets = {(r[0], r[1]) for r in cur.fetchall()}
+                cur.execute("TRUNCATE apt_recent_trade_snapshot, apt_recent_rent_snapshot;")
+            else:
+                # 1) 새 거래/변경  2) 위치 변경  3) 3개월 구간에서 거래가 빠져나가는 단지
+                targets, marks = stage_state.pending(conn, STAGE)
+                cur.execute(MOVED_SQL, (last_run,))
+                targets |= {(r[0], r[1]) for r in cur.fetchall()}
+                cur.execute(EXPIRED_SQL)
+                targets |= {(r[0], r[1]) for r in cur.fetchall()}
+
+        targets = sorted(targets)
+        lawds = [t[0] for t in targets]
+        apts = [t[1] for t in targets]
+        print(f"[snapshot] target complexes={len(targets)} full={full}")
+
+        with conn.cursor() as cur:
+            for table in ("apt_recent_trade_snapshot", "apt_recent_rent_snapshot"):
+                cur.execute(DELETE_SQL.format(table=table), (lawds, apts))
+            cur.execute(TRADE_SQL, (lawds, apts))
+            n_trade = cur.rowcount
+            cur.execute(RENT_SQL, (lawds, apts))
+            n_rent = cur.rowcount
+        stage_state.commit_marks(conn, STAGE, marks)
+        conn.commit()
+
+        print(f"[snapshot] Done. trade rows={n_trade} rent rows={n_rent}")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, STAGE)
@@ -0,0 +1,342 @@
+import os
+from dotenv import load_dotenv
+from pathlib import Path
+
+import complex_resolver
+import db
+import profiling
+import row_fp
+import stage_state
+from merge_upsert import SPECS
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# -----------------------------
+# 설정
+# -----------------------------
+DB_HOST = os.environ.get("PGHOST", "localhost").strip()
+DB_PORT = int(os.environ.get("PGPORT", "5432").strip())
+DB_NAME = os.environ.get("PGDATABASE", "proptech").strip()
+DB_USER = os.environ.get("PGUSER", "postgres").strip()
+DB_PASSWORD = os.environ.get("PGPASSWORD", "").strip()
+
+STAGE = "resolve_complexes"
+# 1이면 전체 행을 다시 훑어 alias 등록 (처음 도입할 때 기존 데이터 정리용)
+RESOLVE_FULL = os.environ.get("RESOLVE_FULL", "0").strip() == "1"
+# 대표 좌표가 이 거리(m) 안이고 이름이 같으면(일반 접미어 차이만 허용) 같은 단지로 합침
+LOCATION_MERGE_M = float(os.environ.get("LOCATION_MERGE_M", "60"))
+
+# -----------------------------
+# SQL
+# -----------------------------
+# 수집 때 Resolver 를 거치지 않은 행(도입 이전 데이터, 다른 경로로 적재된 행)의 표기.
+# 많이 쓰인 표기부터 등록해서 그 표기가 대표가 되게 한다.
+SPELLINGS_SQL = """
+SELECT lawd_cd, umd_nm, apt_nm, COALESCE(jibun, '') AS jibun, COUNT(*) AS n
+FROM (
+  SELECT lawd_cd, umd_nm, apt_nm, jibun FROM apt_trade WHERE id > %s
+  UNION ALL
+  SELECT lawd_cd, umd_nm, apt_nm, jibun FROM apt_trade_rent WHERE id > %s
+) x
+WHERE umd_nm IS NOT NULL AND apt_nm IS NOT NULL
+  AND NOT EXISTS (
+    SELECT 1 FROM apt_complex_alias a
+    WHERE a.lawd_cd = x.lawd_cd AND a.umd_nm = x.umd_nm
+      AND a.apt_nm = x.apt_nm AND a.jibun = COALESCE(x.jibun, '')
+  )
+GROUP BY 1, 2, 3, 4
+ORDER BY n DESC, apt_nm;
+"""
+
+# 가까운 대표 좌표 쌍 (대표 위치 규칙은 백엔드 rep_location 과 동일)
+# 증분 실행이면 지난 실행 이후 위치가 생기거나 바뀐 단지 기준으로만 찾는다
+NEAR_PAIRS_SQL = """
+WITH rep AS (
+  SELECT DISTINCT ON (lawd_cd, apt_nm) lawd_cd, apt_nm, geom, updated_at
+  FROM apt_location
+  WHERE geom IS NOT NULL
+  ORDER BY lawd_cd, apt_nm, id
+),
+moved AS (
+  SELECT * FROM rep WHERE %s::timestamptz IS NULL OR updated_at > %s
+)
+SELECT a.lawd_cd, a.apt_nm, b.apt_nm
+FROM moved a
+JOIN rep b
+  ON a.lawd_cd = b.lawd_cd
+ AND a.apt_nm <> b.apt_nm
+ AND ST_DWithin(a.geom::geography, b.geom::geography, %s);
+"""
+
+ROW_COUNT_SQL = """
+SELECT lawd_cd, apt_nm, COUNT(*)
+FROM (
+  SELECT lawd_cd, apt_nm FROM apt_trade
+  UNION ALL
+  SELECT lawd_cd, apt_nm FROM apt_trade_rent
+) x
+WHERE (lawd_cd, apt_nm) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+GROUP BY 1, 2;
+"""
+
+MERGE_ALIAS_SQL = """
+UPDATE apt_complex_alias a
+SET canon_apt_nm = m.winner, method = 'location', updated_at = now()
+FROM unnest(%s::text[], %s::text[], %s::text[]) AS m(lawd_cd, loser, winner)
+WHERE a.lawd_cd = m.lawd_cd AND a.canon_apt_nm = m.loser;
+"""
+
+# 이번 실행에서 정리할 변형 표기 (전체 행을 매번 모든 변형과 조인하지 않도록)
+#   - 지난 실행 이후 등록/재매핑된 alias (위치 병합 포함)
+#   - 워터마크 이후 들어온 행 / 지난 실행 이후 바뀐 위치 행이 쓰는 변형 표기
+# 전체 실행(last_run IS NULL)이면 모든 변형
+TARGET_ALIAS_SQL = """
+CREATE TEMP TABLE _resolve_alias ON COMMIT DROP AS
+SELECT a.lawd_cd, a.umd_nm, a.apt_nm, a.jibun, a.canon_apt_nm
+FROM apt_complex_alias a
+WHERE a.apt_nm <> a.canon_apt_nm
+  AND (%(last_run)s::timestamptz IS NULL OR a.updated_at > %(last_run)s)
+UNION
+SELECT a.lawd_cd, a.umd_nm, a.apt_nm, a.jibun, a.canon_apt_nm
+FROM apt_trade t
+JOIN apt_complex_alias a
+  ON t.lawd_cd = a.lawd_cd AND t.umd_nm = a.umd_nm
+ AND t.apt_nm = a.apt_nm AND COALESCE(t.jibun, '') = a.jibun
+WHERE %(last_run)s::timestamptz IS NOT NULL
+  AND t.id > %(since_trade)s AND t.id <= %(until_trade)s
+  AND a.apt_nm <> a.canon_apt_nm
+UNION
+SELECT a.lawd_cd, a.umd_nm, a.apt_nm, a.jibun, a.canon_apt_nm
+FROM apt_trade_rent t
+JOIN apt_complex_alias a
+  ON t.lawd_cd = a.lawd_cd AND t.umd_nm = a.umd_nm
+ AND t.apt_nm = a.apt_nm AND COALESCE(t.jibun, '') = a.jibun
+WHERE %(last_run)s::timestamptz IS NOT NULL
+  AND t.id > %(since_rent)s AND t.id <= %(until_rent)s
+  AND a.apt_nm <> a.canon_apt_nm
+UNION
+SELECT a.lawd_cd, a.umd_nm, a.apt_nm, a.jibun, a.canon_apt_nm
+FROM apt_location l
+JOIN apt_complex_alias a
+  ON l.lawd_cd = a.lawd_cd AND l.umd_nm = a.umd_nm
+ AND l.apt_nm = a.apt_nm AND COALESCE(l.jibun, '') = a.jibun
+WHERE l.updated_at > %(last_run)s
+  AND a.apt_nm <> a.canon_apt_nm;
+CREATE INDEX ON _resolve_alias (lawd_cd, umd_nm, apt_nm, jibun);
+ANALYZE _resolve_alias;
+"""
+
+# 대표 표기로 바꿨을 때 같은 거래가 이미 있으면(같은 거래가 두 표기로 들어온 경우) 변형 쪽을 지운다.
+# 대표 표기 행이 우선, 변형끼리 겹치면 id 가 작은 쪽만 남긴다. 대표 표기 행은 지우지 않는다.
+def _dedup_sql(table: str) -> str:
+    spec = SPECS[table]
+    keys = [c for c in spec["not_null"] + spec["key"] if c != "apt_nm"]
+    cols = ", ".join(keys)
+    return f"""
+WITH cand AS (
+  SELECT t.id, a.canon_apt_nm AS canon, 1 AS variant, {", ".join(f"t.{c}" for c in keys)}
+  FROM {table} t
+  JOIN _resolve_alias a
+    ON t.lawd_cd = a.lawd_cd AND t.umd_nm = a.umd_nm
+   AND t.apt_nm = a.apt_nm AND COALESCE(t.jibun, '') = a.jibun
+),
+ranked AS (
+  SELECT id, variant, ROW_NUMBER() OVER (PARTITION BY canon, {cols} ORDER BY variant, id) AS rn
+  FROM (
+    SELECT * FROM cand
+    UNION ALL
+    SELECT c.id, c.apt_nm, 0, {", ".join(f"c.{c}" for c in keys)}
+    FROM {table} c
+    WHERE (c.lawd_cd, c.apt_nm) IN (SELECT DISTINCT lawd_cd, canon FROM cand)
+  ) x
+),
+gone AS (
+  DELETE FROM {table} d
+  WHERE d.id IN (SELECT id FROM ranked WHERE rn > 1 AND variant = 1)
+  RETURNING d.lawd_cd, d.apt_nm, d.deal_ymd
+),
+log AS (
+  INSERT INTO etl_row_change (source, lawd_cd, apt_nm, deal_ymd)
+  SELECT DISTINCT '{table}', lawd_cd, apt_nm, deal_ymd FROM gone
+)
+SELECT COUNT(*) FROM gone;
+"""
+
+
+# 바뀐 단지는 옛 이름/새 이름 모두 etl_row_change 에 남겨 파생 스테이지가 둘 다 다시 계산하게 한다
+def _rename_sql(table: str) -> str:
+    fp = row_fp.sql_expr(table, "t", {"apt_nm": "a.canon_apt_nm"})
+    return f"""
+WITH moved AS (
+  UPDATE {table} t
+  SET apt_nm = a.canon_apt_nm,
+      row_fp = {fp}
+  FROM _resolve_alias a
+  WHERE t.lawd_cd = a.lawd_cd AND t.umd_nm = a.umd_nm
+    AND t.apt_nm = a.apt_nm AND COALESCE(t.jibun, '') = a.jibun
+  RETURNING t.lawd_cd, a.apt_nm AS old_nm, a.canon_apt_nm AS new_nm, t.deal_ymd
+),
+log AS (
+  INSERT INTO etl_row_change (source, lawd_cd, apt_nm, deal_ymd)
+  SELECT DISTINCT '{table}', lawd_cd, old_nm, deal_ymd FROM moved
+  UNION
+  SELECT DISTINCT '{table}', lawd_cd, new_nm, deal_ymd FROM moved
+)
+SELECT COUNT(*) FROM moved;
+"""
+
+
+# apt_location 은 (lawd_cd, umd_nm, apt_nm, jibun) 가 유일 -> 이름을 바꾸기 전에 겹칠 변형 행을 지운다
+LOCATION_DEDUP_SQL = """
+WITH cand AS (
+  SELECT l.id, l.lawd_cd, l.umd_nm, a.canon_apt_nm AS canon, COALESCE(l.jibun, '') AS jibun, 1 AS variant
+  FROM apt_location l
+  JOIN _resolve_alias a
+    ON l.lawd_cd = a.lawd_cd AND l.umd_nm = a.umd_nm
+   AND l.apt_nm = a.apt_nm AND COALESCE(l.jibun, '') = a.jibun
+),
+ranked AS (
+  SELECT id, variant, ROW_NUMBER() OVER (PARTITION BY lawd_cd, umd_nm, canon, jibun ORDER BY variant, id) AS rn
+  FROM (
+    SELECT * FROM cand
+    UNION ALL
+    SELECT c.id, c.lawd_cd, c.umd_nm, c.apt_nm, COALESCE(c.jibun, ''), 0
+    FROM apt_location c
+    JOIN (SELECT DISTINCT lawd_cd, umd_nm, canon, jibun FROM cand) k
+      ON c.lawd_cd = k.lawd_cd AND c.umd_nm = k.umd_nm
+     AND c.apt_nm = k.canon AND COALESCE(c.jibun, '') = k.jibun
+  ) x
+)
+DELETE FROM apt_location WHERE id IN (SELECT id FROM ranked WHERE rn > 1 AND variant = 1);
+"""
+
+LOCATION_RENAME_SQL = """
+UPDATE apt_location l
+SET apt_nm = a.canon_apt_nm, updated_at = now()
+FROM _resolve_alias a
+WHERE l.lawd_cd = a.lawd_cd AND l.umd_nm = a.umd_nm
+  AND l.apt_nm = a.apt_nm AND COALESCE(l.jibun, '') = a.jibun;
+"""
+
+
+# -----------------------------
+# main
+# -----------------------------
+def _find(parent: dict, x):
+    while parent.get(x, x) != x:
+        x = parent[x]
+    return x
+
+
+def location_merges(conn, last_run) -> list[tuple[str, str, str]]:
+    """가까운 단지 쌍 중 이름이 같은 단지인 것 -> [(lawd_cd, loser, winner)]. 거래가 많은 쪽이 대표.
+
+    related() 는 번호(1단지/2차)가 다르거나 한쪽에만 있으면 False 라서
+    번호 없는 이름을 거쳐 서로 다른 차수가 한 단지로 이어지지 않는다.
+    """
+    with conn.cursor() as cur:
+        cur.execute(NEAR_PAIRS_SQL, (last_run, last_run, LOCATION_MERGE_M))
+        pairs = sorted({
+            (lawd, min(a, b), max(a, b)) for lawd, a, b in cur.fetchall()
+            if complex_resolver.related(complex_resolver.name_key(a), complex_resolver.name_key(b))
+        })
+        if not pairs:
+            return []
+        names = sorted({(lawd, n) for lawd, a, b in pairs for n in (a, b)})
+        cur.execute(ROW_COUNT_SQL, ([n[0] for n in names], [n[1] for n in names]))
+        counts = {(r[0], r[1]): r[2] for r in cur.fetchall()}
+
+    # A~B, B~C 처럼 이어지면 한 단지로 (union-find, 루트 = 거래 많은 쪽)
+    parent: dict = {}
+    for lawd, a, b in pairs:
+        ra, rb = _find(parent, (lawd, a)), _find(parent, (lawd, b))
+        if ra == rb:
+            continue
+        if (counts.get(ra, 0), ra[1]) < (counts.get(rb, 0), rb[1]):
+            ra, rb = rb, ra
+        parent[rb] = ra
+    return [(x[0], x[1], _find(parent, x)[1]) for x in parent if _find(parent, x) != x]
+
+
+def main():
+    if not DB_PASSWORD:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    conn = db.connect(
+        host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    conn.autocommit = False
+
+    try:
+        stage_state.ensure(conn)
+        for table in ("apt_trade", "apt_trade_rent"):
+            row_fp.ensure(conn, table)
+        resolver = complex_resolver.Resolver(conn)
+
+        last_run = None if RESOLVE_FULL else stage_state.last_run_at(conn, STAGE)
+        full = RESOLVE_FULL or last_run is None
+        since = {src: 0 if full else stage_state.get_last_id(conn, STAGE, src) for src in stage_state.SOURCES}
+        marks = {src: stage_state.max_id(conn, src) for src in stage_state.SOURCES}
+
+        with conn.cursor() as cur:
+            # 1) 새 표기 등록 (이름 / 지번 매칭)
+            cur.execute(SPELLINGS_SQL, (since["apt_trade"], since["apt_trade_rent"]))
+            spellings = cur.fetchall()
+            for lawd_cd, umd_nm, apt_nm, jibun, _ in spellings:
+                resolver.resolve(lawd_cd, umd_nm, apt_nm, jibun)
+            resolver.flush(cur)
+
+        # 2) 위치 기반 병합
+        merges = location_merges(conn, None if full else last_run)
+        with conn.cursor() as cur:
+            if merges:
+                cur.execute(MERGE_ALIAS_SQL, ([m[0] for m in merges], [m[1] for m in merges], [m[2] for m in merges]))
+                for lawd_cd, loser, winner in merges:
+                    print(f"[resolve] location merge {lawd_cd} '{loser}' -> '{winner}'")
+
+            # 3) 기존 행을 대표 표기로 (이번 실행 대상 변형만)
+            cur.execute(TARGET_ALIAS_SQL, {
+                "last_run": None if full else last_run,
+                "since_trade": since["apt_trade"], "until_trade": marks["apt_trade"],
+                "since_rent": since["apt_trade_rent"], "until_rent": marks["apt_trade_rent"],
+            })
+            cur.execute("SELECT COUNT(*) FROM _resolve_alias;")
+            n_alias = cur.fetchone()[0]
+            renamed = {}
+            for table in ("apt_trade", "apt_trade_rent"):
+                cur.execute(_dedup_sql(table))
+                dup = cur.fetchone()[0]
+                cur.execute(_rename_sql(table))
+                renamed[table] = (cur.fetchone()[0], dup)
+            cur.execute(LOCATION_DEDUP_SQL)
+            loc_dup = cur.rowcount
+            cur.execute(LOCATION_RENAME_SQL)
+            loc_renamed = cur.rowcount
+
+        stage_state.commit_marks(conn, STAGE, marks)
+        conn.commit()
+
+        print(
+            f"[resolve] Done. full={full} new_spellings={len(spellings)} "
+            f"location_merges={len(merges)} target_aliases={n_alias} "
+            + " ".join(f"{t}_renamed={r} {t}_dup_deleted={d}" for t, (r, d) in renamed.items())
+            + f" location_renamed={loc_renamed} location_dup_deleted={loc_dup}"
+        )
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main, STAGE)
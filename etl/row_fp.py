@@ -0,0 +1,69 @@
+"""거래 행 지문(row_fp): 자연키를 16바이트 uuid 하나로.
+
+apt_trade / apt_trade_rent 의 중복 판정은 자연키(merge_upsert.SPECS 의 not_null + key) 전체 비교였다.
+자연키를 고정 포맷 문자열로 직렬화해 md5 -> uuid 로 저장하고 그 컬럼에 unique index 를 두면
+충돌 검사가 좁은 인덱스 한 번으로 끝난다.
+
+직렬화 규칙은 Python(fingerprint) 과 SQL(sql_expr) 이 같아야 한다.
+  - 컬럼 순서: SPECS not_null + key
+  - 구분자 chr(31), NULL 은 '\\N'
+  - 면적(numeric)은 소수 4자리 반올림, 나머지는 str() == ::text
+파서가 계산해서 넘기고, 단지명이 대표 표기로 바뀐 행은 적재 직전에 다시 계산한다.
+"""
+import hashlib
+import uuid
+from decimal import Decimal, ROUND_HALF_UP
+
+from merge_upsert import SPECS
+
+SEP = "\x1f"
+NULL_TOKEN = "\\N"
+DECIMAL_COLUMNS = {"exclu_use_ar"}
+_Q = Decimal("0.0001")
+
+FP_COLUMNS = {table: spec["not_null"] + spec["key"] for table, spec in SPECS.items()}
+
+ENSURE_SQL = """
+ALTER TABLE {table} ADD COLUMN IF NOT EXISTS row_fp uuid;
+CREATE UNIQUE INDEX IF NOT EXISTS {table}_row_fp_uidx ON {table} (row_fp);
+"""
+
+
+def _fmt(col: str, v) -> str:
+    if v is None:
+        return NULL_TOKEN
+    if col in DECIMAL_COLUMNS:
+        return str(Decimal(str(v)).quantize(_Q, rounding=ROUND_HALF_UP))
+    return str(v)
+
+
+def fingerprint(table: str, item: dict) -> str:
+    raw = SEP.join(_fmt(c, item.get(c)) for c in FP_COLUMNS[table])
+    return str(uuid.UUID(bytes=hashlib.md5(raw.encode("utf-8")).digest()))
+
+
+def stamp(table: str, items: list[dict], missing_only: bool = False) -> list[dict]:
+    for it in items:
+        if missing_only and it.get("row_fp"):
+            continue
+        it["row_fp"] = fingerprint(table, it)
+    return items
+
+
+def sql_expr(table: str, alias: str, overrides: dict | None = None) -> str:
+    """fingerprint() 와 같은 값을 내는 SQL 식. overrides: {컬럼: 대신 쓸 SQL 식}"""
+    overrides = overrides or {}
+    parts = []
+    for c in FP_COLUMNS[table]:
+        src = overrides.get(c, f"{alias}.{c}")
+        if c in DECIMAL_COLUMNS:
+            parts.append(f"COALESCE(round(({src})::numeric, 4)::text, '\\N')")
+        else:
+            parts.append(f"COALESCE(({src})::text, '\\N')")
+    return "md5(" + " || chr(31) || ".join(parts) + ")::uuid"
+
+
+def ensure(conn, table: str):
+    with conn.cursor() as cur:
+        cur.execute(ENSURE_SQL.format(table=table))
+    conn.commit()
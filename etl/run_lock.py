@@ -0,0 +1,60 @@
+"""실행 배타 락 (Postgres advisory lock).
+
+(dataset, region) 마다 세션 단위 advisory lock 을 건다.
+- dataset: sale / rent (같은 테이블을 쓰는 backfill 과 daily 가 같은 락을 공유)
+           geocode / derived 처럼 지역 구분이 없는 스테이지는 region="*"
+- 이미 다른 실행(크론 one-shot, 다른 데몬)이 잡고 있으면 기다리지 않고 건너뛴다
+
+락은 잡은 커넥션이 끊기면 서버가 풀어 주므로, 프로세스가 죽어도 남지 않는다.
+"""
+import os
+from contextlib import contextmanager
+
+TRY_LOCK_SQL = "SELECT pg_try_advisory_lock(hashtext(%s), hashtext(%s));"
+UNLOCK_SQL = "SELECT pg_advisory_unlock(hashtext(%s), hashtext(%s));"
+
+ALL_REGIONS = "*"
+
+
+def regions_from_env(default: str = "50110,50130") -> list[str]:
+    return [x.strip() for x in os.environ.get("LAWD_CDS", default).split(",") if x.strip()]
+
+
+def try_lock(conn, dataset: str, region: str = ALL_REGIONS) -> bool:
+    with conn.cursor() as cur:
+        cur.execute(TRY_LOCK_SQL, (dataset, region))
+        ok = bool(cur.fetchone()[0])
+    if not conn.autocommit:
+        conn.commit()
+    return ok
+
+
+def unlock(conn, dataset: str, region: str = ALL_REGIONS):
+    with conn.cursor() as cur:
+        cur.execute(UNLOCK_SQL, (dataset, region))
+    if not conn.autocommit:
+        conn.commit()
+
+
+@contextmanager
+def held(conn, dataset: str, regions: list[str]):
+    """regions 중 잡은 것만 돌려준다. 블록이 끝나면 해제.
+
+    with run_lock.held(conn, "sale", ["50110", "50130"]) as got:
+        ...  # got 에 있는 지역만 처리
+    """
+    got = []
+    try:
+        for region in regions:
+            if try_lock(conn, dataset, region):
+                got.append(region)
+            else:
+                print(f"[lock] {dataset}/{region} 다른 실행이 진행 중 -> 건너뜀")
+        yield got
+    finally:
+        for region in got:
+            try:
+                unlock(conn, dataset, region)
+            except Exception as e:
+                # 커넥션이 끊겼다면 서버가 이미 락을 풀었다
+                print(f"[lock] unlock {dataset}/{region} 실패: {e}")
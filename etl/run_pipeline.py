@@ -1,11 +1,15 @@
 import os
 import sys
 import argparse
+import time
 import subprocess
 from pathlib import Path
 from dotenv import load_dotenv
 import requests
 
+import db
+import run_lock
+
 REPO_ROOT = Path(__file__).resolve().parents[1]
 
 def _load_env():
@@ -33,6 +37,28 @@ def _run_py(rel_path: str, extra_env: dict | None = None) -> None:
     print(f"\n[RUN] {' '.join(cmd)}")
     subprocess.run(cmd, cwd=str(REPO_ROOT), env=env, check=True)
 
+def _lock_conn():
+    conn = db.connect(**db.dsn_from_env())
+    conn.autocommit = True
+    return conn
+
+def _run_ingest(conn, dataset: str, rel_path: str, extra_env: dict) -> None:
+    """(dataset, region) 락을 잡은 지역만 수집. 다른 실행이 잡고 있는 지역은 건너뜀."""
+    regions = [x.strip() for x in extra_env.get("LAWD_CDS", "").split(",") if x.strip()] or run_lock.regions_from_env()
+    with run_lock.held(conn, dataset, regions) as got:
+        if not got:
+            print(f"[SKIP] {rel_path}: 모든 지역이 실행 중")
+            return
+        _run_py(rel_path, extra_env={**extra_env, "LAWD_CDS": ",".join(got)})
+
+def _run_stages(conn, lock_name: str, rel_paths: list[str], extra_env: dict) -> None:
+    with run_lock.held(conn, lock_name, [run_lock.ALL_REGIONS]) as got:
+        if not got:
+            print(f"[SKIP] {lock_name}: 다른 실행이 진행 중")
+            return
+        for rel in rel_paths:
+            _run_py(rel, extra_env=extra_env)
+
 def _refresh_api():
     url = os.environ.get("API_REFRESH_URL", "").strip()
     token = os.environ.get("ADMIN_TOKEN", "").strip()
@@ -52,14 +78,19 @@ def _refresh_api():
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--mode", choices=["backfill", "daily", "geocode"], default="daily")
+    parser.add_argument("--mode", choices=["backfill", "daily", "geocode", "export", "stats", "index", "resolve", "maintain", "daemon"], default="daily")
     parser.add_argument("--domain", choices=["sale", "rent", "all"], default="sale",
                         help="sale=매매, rent=전월세, all=둘다")
     parser.add_argument("--start", help="START_YYYYMM for backfill (e.g. 200601)")
     parser.add_argument("--end", help="END_YYYYMM for backfill (e.g. 201912)")
     parser.add_argument("--lawd", help="LAWD_CDS comma separated (e.g. 50110,50130)")
-    parser.add_argument("--lookback", type=int, help="DAILY_LOOKBACK_MONTHS (default 3)")
+    parser.add_argument("--lookback", type=int,
+                        help="최근 N개월 고정 조회 (LOOKBACK_MODE=fixed, DAILY_LOOKBACK_MONTHS). 기본은 적응형 (etl/lookback.py)")
+    parser.add_argument("--load-mode", choices=["insert", "merge"],
+                        help="LOAD_MODE (기본: daily=merge, backfill=insert)")
     parser.add_argument("--refresh", action="store_true", help="Call API_REFRESH_URL after pipeline")
+    parser.add_argument("--profile", action="store_true",
+                        help="스테이지별 CPU/메모리 프로파일을 runs/<시각>/ 에 저장 (etl/profiling.py)")
     args = parser.parse_args()
 
     env_path = _load_env()
@@ -69,11 +100,18 @@ def main():
     if args.lawd:
         extra_env["LAWD_CDS"] = args.lawd
     if args.lookback is not None:
+        extra_env["LOOKBACK_MODE"] = "fixed"
         extra_env["DAILY_LOOKBACK_MONTHS"] = str(args.lookback)
+    if args.load_mode:
+        extra_env["LOAD_MODE"] = args.load_mode
     if args.start:
         extra_env["START_YYYYMM"] = args.start
     if args.end:
         extra_env["END_YYYYMM"] = args.end
+    if args.profile:
+        extra_env["ETL_PROFILE"] = "1"
+        extra_env["ETL_RUN_DIR"] = os.environ.get("ETL_RUN_DIR") or str(REPO_ROOT / "runs" / time.strftime("%Y%m%d-%H%M%S"))
+        print(f"[PROFILE] run dir: {extra_env['ETL_RUN_DIR']}")
 
     SALE_BACKFILL = "etl/ingest_apt_trade.py"
     SALE_DAILY = "etl/ingest_daily_last3m.py"
@@ -81,27 +119,72 @@ def main():
     RENT_BACKFILL = "etl/ingest_rent_backfill.py"
     RENT_DAILY = "etl/ingest_rent_daily_last3m.py"
 
+    # 단지명 표기 통일 (alias 등록 + 위치 기반 병합 + 기존 행 대표 표기로) -> 지오코딩 호출 수를 줄이려고 그 앞에
+    RESOLVE = "etl/resolve_complexes.py"
     GEOCODE = "etl/geocode_kakao_fill_locations.py"
+    EXPORT = "etl/export_parquet.py"
+    # BRIN 인덱스 + 오래된 구간 (단지, 날짜) 순 다시 쓰기 (주 1회 정도 크론으로)
+    MAINTAIN = "etl/maintain_layout.py"
+
+    # 적재 후 파생 테이블 (이번 실행에서 바뀐 단지만 재계산)
+    DERIVED = [
+        "etl/build_complex_stats.py",
+        "etl/build_price_sketch.py",
+        "etl/refresh_recent_snapshot.py",
+        "etl/aggregate_map_cells.py",  # 스냅샷을 읽으므로 그 다음에
+        "etl/recent_ring.py",
+        "etl/build_comparables.py",
+        "etl/build_price_index.py",
+        "etl/build_rent_prediction.py",
+    ]
+    SEARCH_INDEX = "etl/index_opensearch.py"
+    # OpenSearch 가 설정된 환경에서만 검색 색인까지 갱신
+    if os.environ.get("OPENSEARCH_URL", "").strip():
+        DERIVED.append(SEARCH_INDEX)
+
+    if args.mode == "daemon":
+        # 상주 스케줄러: ETL_SCHEDULE 주기로 daily 수집 + 파생 스테이지 (etl/scheduler.py)
+        os.environ.update(extra_env)
+        import scheduler
+        scheduler.main()
+        return
 
+    # 같은 데이터셋/지역을 다른 실행(데몬, 겹친 크론)이 처리 중이면 건너뜀 (etl/run_lock.py)
+    conn = _lock_conn()
     try:
         if args.mode == "geocode":
-            _run_py(GEOCODE, extra_env=extra_env)
+            _run_stages(conn, "derived", [GEOCODE], extra_env)
+
+        elif args.mode == "resolve":
+            _run_stages(conn, "derived", [RESOLVE], extra_env)
+
+        elif args.mode == "export":
+            _run_stages(conn, "export", [EXPORT], extra_env)
+
+        elif args.mode == "index":
+            _run_stages(conn, "derived", [SEARCH_INDEX], extra_env)
+
+        elif args.mode == "maintain":
+            _run_stages(conn, "maintain", [MAINTAIN], {**extra_env, "LAYOUT_FORCE": "1"})
+
+        elif args.mode == "stats":
+            _run_stages(conn, "derived", DERIVED, extra_env)
 
         elif args.mode == "backfill":
             if args.domain in ("sale", "all"):
-                _run_py(SALE_BACKFILL, extra_env=extra_env)
+                _run_ingest(conn, "sale", SALE_BACKFILL, extra_env)
             if args.domain in ("rent", "all"):
-                _run_py(RENT_BACKFILL, extra_env=extra_env)
+                _run_ingest(conn, "rent", RENT_BACKFILL, extra_env)
 
-            _run_py(GEOCODE, extra_env=extra_env)
+            _run_stages(conn, "derived", [RESOLVE, GEOCODE] + DERIVED, extra_env)
 
         else:  # daily
             if args.domain in ("sale", "all"):
-                _run_py(SALE_DAILY, extra_env=extra_env)
+                _run_ingest(conn, "sale", SALE_DAILY, extra_env)
             if args.domain in ("rent", "all"):
-                _run_py(RENT_DAILY, extra_env=extra_env)
+                _run_ingest(conn, "rent", RENT_DAILY, extra_env)
 
-            _run_py(GEOCODE, extra_env=extra_env)
+            _run_stages(conn, "derived", [RESOLVE, GEOCODE] + DERIVED, extra_env)
 
         if args.refresh:
             _refresh_api()
@@ -111,6 +194,8 @@ def main():
     except subprocess.CalledProcessError as e:
         print(f"\n[FAIL] command failed: {e}")
         sys.exit(e.returncode)
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,216 @@
+"""ETL 스케줄러 데몬 (run_pipeline.py --mode daemon).
+
+외부 크론의 one-shot 실행 대신 한 프로세스가 상주하면서
+- 데이터셋별 주기(ETL_SCHEDULE) + 지터로 daily 수집을 돌리고
+- (dataset, region) advisory lock 으로 다른 실행과 겹치는 지역은 건너뛰고 (run_lock.py)
+- 수집이 한 번이라도 돌았으면 지오코딩 -> 파생 스테이지를 이어서 실행한다
+
+스크립트는 서브프로세스가 아니라 같은 프로세스에서 모듈을 다시 읽어 main() 을 부르므로
+DB 커넥션 풀(db.install_pool)과 http_client 의 호스트별 세션이 실행 사이에 유지된다.
+"""
+import os
+import random
+import signal
+import threading
+import time
+import importlib
+from pathlib import Path
+
+import psycopg2
+from dotenv import load_dotenv
+
+import db
+import profiling
+import run_lock
+
+
+def _load_env():
+    repo_root = Path(__file__).resolve().parents[1]
+    env_path = repo_root / "backend" / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        return str(env_path)
+    load_dotenv()
+    return None
+
+
+_ENV_PATH = _load_env()
+
+# dataset=분 단위 주기
+DEFAULT_SCHEDULE = "sale=360,rent=360"
+JITTER_SEC = float(os.environ.get("SCHEDULE_JITTER_SEC", "300"))
+TICK_SEC = float(os.environ.get("SCHEDULE_TICK_SEC", "30"))
+POOL_MAXCONN = int(os.environ.get("SCHEDULE_POOL_MAXCONN", "4"))
+
+# dataset -> daily 수집 모듈
+INGEST_MODULES = {
+    "sale": "ingest_daily_last3m",
+    "rent": "ingest_rent_daily_last3m",
+}
+
+# run_pipeline.py 의 RESOLVE -> GEOCODE -> DERIVED 와 같은 순서
+POST_MODULES = [
+    "resolve_complexes",
+    "geocode_kakao_fill_locations",
+    "build_complex_stats",
+    "build_price_sketch",
+    "refresh_recent_snapshot",
+    "aggregate_map_cells",
+    "recent_ring",
+    "build_comparables",
+    "build_price_index",
+    "build_rent_prediction",
+]
+SEARCH_INDEX_MODULE = "index_opensearch"
+# 파생 스테이지 뒤 BRIN 요약, 다시 쓰기는 모듈이 LAYOUT_INTERVAL_H 마다 한 번만
+LAYOUT_MODULE = "maintain_layout"
+
+
+def parse_schedule(spec: str) -> dict[str, float]:
+    """"sale=360,rent=720" -> {"sale": 21600.0, "rent": 43200.0} (초)"""
+    out = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, minutes = part.partition("=")
+        name = name.strip()
+        if name not in INGEST_MODULES:
+            raise RuntimeError(f"ETL_SCHEDULE: 알 수 없는 dataset '{name}' (가능: {', '.join(INGEST_MODULES)})")
+        out[name] = float(minutes) * 60
+    return out
+
+
+def _run_module(name: str, env: dict | None = None):
+    """모듈을 (다시) 읽어 main() 실행. 모듈 상수가 env 를 읽으므로 env 는 import 전에 바꾼다."""
+    env = env or {}
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update({k: str(v) for k, v in env.items()})
+    try:
+        print(f"\n[RUN] {name} {' '.join(f'{k}={v}' for k, v in env.items())}".rstrip())
+        mod = importlib.import_module(name)
+        mod = importlib.reload(mod)
+        profiling.run(mod.main, name)
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+class Scheduler:
+    def __init__(self, schedule: dict[str, float], regions: list[str]):
+        self.schedule = schedule
+        self.regions = regions
+        self.stop = threading.Event()
+        self.lock_conn = None
+        now = time.time()
+        # 시작 직후 여러 데몬이 동시에 몰리지 않도록 첫 실행에도 지터
+        self.next_due = {name: now + random.uniform(0, JITTER_SEC) for name in schedule}
+
+    # --- 락 전용 커넥션 (풀과 별개로 계속 붙잡고 있어야 세션 락이 유지된다) ---
+    def _lock_conn(self):
+        if self.lock_conn is None or self.lock_conn.closed:
+            self.lock_conn = psycopg2.connect(**db.dsn_from_env())
+            self.lock_conn.autocommit = True
+        return self.lock_conn
+
+    def _post_modules(self):
+        mods = list(POST_MODULES)
+        if os.environ.get("OPENSEARCH_URL", "").strip():
+            mods.append(SEARCH_INDEX_MODULE)
+        mods.append(LAYOUT_MODULE)
+        return mods
+
+    def run_ingest(self, dataset: str) -> bool:
+        """지역별로 락을 잡고 수집. 한 지역이라도 돌았으면 True."""
+        ran = False
+        module = INGEST_MODULES[dataset]
+        for region in self.regions:
+            if self.stop.is_set():
+                break
+            with run_lock.held(self._lock_conn(), dataset, [region]) as got:
+                if not got:
+                    continue
+                try:
+                    _run_module(module, {"LAWD_CDS": region})
+                    ran = True
+                except Exception as e:
+                    print(f"[FAIL] {dataset}/{region}: {type(e).__name__}: {e}")
+        return ran
+
+    def run_post(self):
+        with run_lock.held(self._lock_conn(), "derived", [run_lock.ALL_REGIONS]) as got:
+            if not got:
+                return
+            for module in self._post_modules():
+                if self.stop.is_set():
+                    return
+                try:
+                    _run_module(module)
+                except Exception as e:
+                    # 지오코딩이 실패해도 파생 스테이지는 기존 위치로 계속 갱신
+                    print(f"[FAIL] {module}: {type(e).__name__}: {e}")
+
+    def tick(self):
+        now = time.time()
+        due = sorted((t, name) for name, t in self.next_due.items() if t <= now)
+        ran_any = False
+        for _, name in due:
+            if self.stop.is_set():
+                return
+            t0 = time.monotonic()
+            try:
+                ran_any |= self.run_ingest(name)
+            except Exception as e:
+                # 락 커넥션 장애 등: 다음 주기에 다시
+                print(f"[FAIL] {name}: {type(e).__name__}: {e}")
+                self.lock_conn = None
+            # 주기는 끝난 시점 기준 -> 긴 실행이 다음 실행과 겹치지 않는다
+            self.next_due[name] = time.time() + self.schedule[name] + random.uniform(0, JITTER_SEC)
+            print(f"[SCHED] {name} took {time.monotonic() - t0:.1f}s, next in {self.next_due[name] - time.time():.0f}s")
+        if ran_any and not self.stop.is_set():
+            try:
+                self.run_post()
+            except Exception as e:
+                print(f"[FAIL] post stages: {type(e).__name__}: {e}")
+                self.lock_conn = None
+
+    def run_forever(self):
+        print(f"[SCHED] schedule={ {k: v / 60 for k, v in self.schedule.items()} } min regions={self.regions} jitter={JITTER_SEC}s")
+        while not self.stop.is_set():
+            self.tick()
+            self.stop.wait(TICK_SEC)
+        print("[SCHED] stopped")
+
+    def close(self):
+        if self.lock_conn is not None and not self.lock_conn.closed:
+            self.lock_conn.close()
+        db.close_pool()
+
+
+def main():
+    dsn = db.dsn_from_env()
+    if not dsn["password"]:
+        raise RuntimeError("PGPASSWORD(.env) 비어있음")
+
+    schedule = parse_schedule(os.environ.get("ETL_SCHEDULE", DEFAULT_SCHEDULE))
+    db.install_pool(1, POOL_MAXCONN, **dsn)
+    sched = Scheduler(schedule, run_lock.regions_from_env())
+
+    def _stop(signum, frame):
+        print(f"[SCHED] signal {signum}, finishing current step")
+        sched.stop.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    try:
+        sched.run_forever()
+    finally:
+        sched.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""수집 스풀: fetch/parse 한 페이지를 로컬 디스크에 먼저 쓰고, 별도 로더가 Postgres 로 옮긴다.
+
+Postgres 가 느리거나 재시작/점검 중이면 수집 스크립트는 fetch 루프가 멈추거나
+다음 conn.commit() 에서 죽어서, 이미 받아 온 페이지(와 쓴 호출 할당량)를 잃었다.
+INGEST_SPOOL=1 이면 수집 엔진(ingest_engine.run)이
+
+  - 적재 스레드: 파싱된 items / RAW 페이지를 스풀 세그먼트에 append (DB 안 씀)
+  - 드레인 스레드(Drainer): 봉인된 세그먼트를 하나씩 자기 커넥션으로 적재
+    세그먼트 하나 = 트랜잭션 하나 (LOAD_BATCH_ROWS 보다 큰 배치),
+    적재와 같은 트랜잭션에서 etl_spool_state.last_seq 를 올리고 커밋 후 파일 삭제
+    DB 오류(연결 끊김, 락 타임아웃 등)면 롤백 -> 재접속 -> 백오프 후 같은 세그먼트부터 다시
+
+로 나눠 돌린다. DB 가 멈춰도 fetch 는 계속 돌고, 프로세스가 죽어도 다음 실행이 남은 세그먼트부터 이어서 넣는다.
+
+세그먼트 파일 (SPOOL_DIR/<label>/)
+  seg-<seq>.open   쓰는 중 (gzip). 비정상 종료로 남으면 다음 실행이 온전한 레코드까지만 살려서 봉인
+  seg-<seq>.seg    봉인됨 -> 드레인 대상
+  레코드 = 한 줄 "<crc32 hex>\\t<json>", 드레인 때 crc 가 안 맞는 세그먼트는 quarantine/ 으로 옮기고 건너뛴다
+  spool.seq        다음 세그먼트 번호 (드레인된 파일은 지워져도 번호는 계속 증가)
+  spool.id         스풀 디렉터리 식별자 (디렉터리를 지우고 새로 만들면 seq 가 1부터 다시 시작해도 안전)
+
+세그먼트는 SPOOL_SEGMENT_ROWS 건 또는 SPOOL_SEGMENT_SEC 초마다 봉인한다.
+
+내구성: 레코드마다 gzip 을 Z_SYNC_FLUSH 로 비워 OS 에 넘기고 (프로세스가 죽어도 그 레코드까지 복구 가능),
+SPOOL_FSYNC_SEC 마다 fsync (전원/OS 장애 때 잃는 건 그 시간만큼). 봉인 rename 과 spool.seq 갱신 뒤에는 디렉터리도 fsync.
+"""
+import os
+import json
+import gzip
+import time
+import uuid
+import zlib
+import fcntl
+import threading
+from pathlib import Path
+
+import psycopg2
+
+import db
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+ENABLED = os.environ.get("INGEST_SPOOL", "0").strip() == "1"
+# 1이면 fetch 없이 남은 세그먼트만 적재
+DRAIN_ONLY = os.environ.get("SPOOL_DRAIN_ONLY", "0").strip() == "1"
+SPOOL_DIR = Path(os.environ.get("SPOOL_DIR", str(REPO_ROOT / "data" / "spool")).strip())
+# 봉인 기준: 건수 / 경과 초
+SEGMENT_ROWS = int(os.environ.get("SPOOL_SEGMENT_ROWS", "50000"))
+SEGMENT_SEC = float(os.environ.get("SPOOL_SEGMENT_SEC", "30"))
+# 수집이 끝난 뒤 남은 세그먼트를 기다려 줄 시간 (넘으면 다음 실행이 이어서)
+DRAIN_WAIT_SEC = float(os.environ.get("SPOOL_DRAIN_WAIT_SEC", "600"))
+# 쓰는 중인 세그먼트 fsync 주기 (0 이면 레코드마다)
+FSYNC_SEC = float(os.environ.get("SPOOL_FSYNC_SEC", "1"))
+# DB 오류 재시도 백오프 (초, 지수 증가 상한)
+RETRY_MIN_SEC = 1.0
+RETRY_MAX_SEC = 60.0
+POLL_SEC = 1.0
+
+# 재시도할 DB 오류 (데이터 오류는 그대로 올린다)
+RETRYABLE = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+STATE_DDL = """
+CREATE TABLE IF NOT EXISTS etl_spool_state (
+  name       text   NOT NULL,
+  spool_id   text   NOT NULL,
+  last_seq   bigint NOT NULL DEFAULT 0,
+  updated_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (name, spool_id)
+);
+"""
+
+GET_STATE_SQL = "SELECT last_seq FROM etl_spool_state WHERE name = %s AND spool_id = %s;"
+
+SET_STATE_SQL = """
+INSERT INTO etl_spool_state (name, spool_id, last_seq) VALUES (%s, %s, %s)
+ON CONFLICT (name, spool_id) DO UPDATE SET last_seq = EXCLUDED.last_seq, updated_at = now();
+"""
+
+
+class SpoolCorrupt(Exception):
+    pass
+
+
+def _encode(record: dict) -> bytes:
+    body = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"%08x\t%s\n" % (zlib.crc32(body), body)
+
+
+def _decode(line: bytes) -> dict:
+    crc, sep, body = line.rstrip(b"\n").partition(b"\t")
+    if not sep or len(crc) != 8 or int(crc, 16) != zlib.crc32(body):
+        raise SpoolCorrupt("crc mismatch")
+    return json.loads(body)
+
+
+def read_segment(path: Path):
+    """봉인된 세그먼트의 레코드. 잘리거나 crc 가 안 맞으면 SpoolCorrupt."""
+    try:
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    raise SpoolCorrupt(f"{path.name}: 잘린 레코드")
+                yield _decode(line)
+    except (EOFError, OSError, zlib.error, ValueError) as e:
+        raise SpoolCorrupt(f"{path.name}: {e}") from e
+
+
+class Spool:
+    """한 수집 라벨의 세그먼트 디렉터리. 쓰기는 한 프로세스만 (파일 락)."""
+
+    def __init__(self, name: str, root: Path = SPOOL_DIR):
+        self.name = name
+        self.dir = root / name
+        (self.dir / "quarantine").mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.dir / ".lock", "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f"스풀 {self.dir} 를 다른 프로세스가 쓰는 중")
+
+        id_path = self.dir / "spool.id"
+        if not id_path.exists():
+            _write_atomic(id_path, uuid.uuid4().hex)
+        self.id = id_path.read_text().strip()
+
+        self._mu = threading.Lock()
+        self._f = None
+        self._seq = 0
+        self._rows = 0
+        self._opened_at = 0.0
+        self._synced_at = 0.0
+        # 드레인된 세그먼트 파일은 지워지므로 다음 seq 는 spool.seq 에 따로 남긴다
+        self._seq_path = self.dir / "spool.seq"
+        saved = int(self._seq_path.read_text().strip()) if self._seq_path.exists() else 1
+        self._next_seq = max([saved] + [s + 1 for s, _ in self._segments("*")])
+        self._recover()
+
+    # --- 세그먼트 목록 ---
+    def _segments(self, suffix: str) -> list[tuple[int, Path]]:
+        out = []
+        for p in self.dir.glob(f"seg-*.{suffix}"):
+            try:
+                out.append((int(p.name[4:].split(".")[0]), p))
+            except ValueError:
+                continue
+        return sorted(out)
+
+    def sealed(self) -> list[tuple[int, Path]]:
+        return self._segments("seg")
+
+    def _path(self, seq: int, suffix: str) -> Path:
+        return self.dir / f"seg-{seq:012d}.{suffix}"
+
+    def _recover(self):
+        """비정상 종료로 남은 .open: 온전한 레코드까지만 새로 써서 봉인."""
+        for seq, path in self._segments("open"):
+            kept = dropped = 0
+            tmp = self._path(seq, "recover")
+            with gzip.open(tmp, "wb") as out:
+                try:
+                    with gzip.open(path, "rb") as f:
+                        for line in f:
+                            if not line.endswith(b"\n"):
+                                dropped += 1
+                                break
+                            _decode(line)
+                            out.write(line)
+                            kept += 1
+                except EOFError:
+                    # 닫지 않은 gzip 은 끝 표시가 없다 (잘린 레코드는 위에서 센다)
+                    pass
+                except (OSError, zlib.error, ValueError, SpoolCorrupt):
+                    dropped += 1
+            _fsync_file(tmp)
+            os.replace(tmp, self._path(seq, "seg"))
+            path.unlink()
+            _fsync_dir(self.dir)
+            print(f"[spool {self.name}] recovered seg {seq}: records={kept} dropped_tail={dropped}")
+
+    # --- 쓰기 ---
+    def append(self, kind: str, payload, rows: int = 1) -> int:
+        """레코드 하나 추가 (kind: items | page). 세그먼트가 가득 차거나 오래되면 봉인. 반환: 세그먼트 번호"""
+        line = _encode({"kind": kind, "data": payload})
+        with self._mu:
+            if self._f is None:
+                self._seq = self._next_seq
+                self._next_seq += 1
+                _write_atomic(self._seq_path, str(self._next_seq))
+                self._f = gzip.open(self._path(self._seq, "open"), "wb", compresslevel=5)
+                _fsync_dir(self.dir)
+                self._rows = 0
+                self._opened_at = self._synced_at = time.monotonic()
+            seq = self._seq
+            self._f.write(line)
+            # 압축 버퍼를 레코드 경계까지 비워 파일에 쓴다 (죽어도 여기까지는 _recover 가 읽는다)
+            self._f.flush(zlib.Z_SYNC_FLUSH)
+            self._rows += rows
+            now = time.monotonic()
+            if now - self._synced_at >= FSYNC_SEC:
+                os.fsync(self._f.fileobj.fileno())
+                self._synced_at = now
+            if self._rows >= SEGMENT_ROWS or time.monotonic() - self._opened_at >= SEGMENT_SEC:
+                self._seal_locked()
+            return seq
+
+    def seal(self):
+        with self._mu:
+            self._seal_locked()
+
+    def seal_if_stale(self):
+        """append 가 뜸할 때도 SEGMENT_SEC 가 지나면 드레인할 수 있게 (드레인 스레드가 호출)."""
+        with self._mu:
+            if self._f is not None and time.monotonic() - self._opened_at >= SEGMENT_SEC:
+                self._seal_locked()
+
+    def _seal_locked(self):
+        if self._f is None:
+            return
+        self._f.close()
+        path = self._path(self._seq, "open")
+        _fsync_file(path)
+        os.replace(path, self._path(self._seq, "seg"))
+        # rename 자체도 디렉터리 fsync 전에는 디스크에 없을 수 있다
+        _fsync_dir(self.dir)
+        self._f = None
+
+    def quarantine(self, path: Path):
+        os.replace(path, self.dir / "quarantine" / path.name)
+        _fsync_dir(self.dir)
+
+    def close(self):
+        self.seal()
+        self._lock_file.close()
+
+
+def _fsync_file(path: Path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path: Path, text: str):
+    """spool.seq 가 되돌아가면 이미 커밋된 번호를 다시 써서 드레인이 건너뛴다 -> 파일/디렉터리 모두 fsync"""
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path.parent)
+
+
+# -----------------------------
+# 드레인
+# -----------------------------
+class Drainer(threading.Thread):
+    """봉인된 세그먼트를 순서대로 적재. apply(cur, records) 가 한 세그먼트를 넣는다 (커밋은 여기서)."""
+
+    def __init__(self, spool: Spool, apply):
+        super().__init__(name=f"spool-drain-{spool.name}", daemon=True)
+        self.spool = spool
+        self.apply = apply
+        self.conn = None
+        self.finishing = threading.Event()
+        self.deadline: float | None = None
+        self.error: BaseException | None = None
+        self.stats = {"segments": 0, "records": 0, "retries": 0, "quarantined": 0, "skipped": 0}
+        self.quarantined: list[int] = []
+
+    def finish(self, wait_sec: float = DRAIN_WAIT_SEC):
+        """수집이 끝남: 남은 세그먼트를 wait_sec 안에서 다 넣고 멈춘다."""
+        self.spool.seal()
+        self.deadline = time.monotonic() + wait_sec
+        self.finishing.set()
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return len(self.spool.sealed())
+
+    def _connect(self):
+        self.conn = db.connect(**db.dsn_from_env())
+        self.conn.autocommit = False
+        with self.conn.cursor() as cur:
+            cur.execute(STATE_DDL)
+        self.conn.commit()
+
+    def _last_seq(self) -> int:
+        with self.conn.cursor() as cur:
+            cur.execute(GET_STATE_SQL, (self.spool.name, self.spool.id))
+            row = cur.fetchone()
+        self.conn.commit()
+        return row[0] if row else 0
+
+    def _drain_one(self, seq: int, path: Path, last_seq: int):
+        if seq <= last_seq:
+            # 커밋은 됐는데 파일을 지우기 전에 죽은 경우
+            path.unlink(missing_ok=True)
+            self.stats["skipped"] += 1
+            return
+        try:
+            records = list(read_segment(path))
+        except SpoolCorrupt as e:
+            print(f"[spool {self.spool.name}] quarantine seg {seq}: {e}")
+            self.spool.quarantine(path)
+            self.quarantined.append(seq)
+            self.stats["quarantined"] += 1
+            return
+        with self.conn.cursor() as cur:
+            self.apply(cur, records)
+            cur.execute(SET_STATE_SQL, (self.spool.name, self.spool.id, seq))
+        self.conn.commit()
+        path.unlink()
+        self.stats["segments"] += 1
+        self.stats["records"] += len(records)
+
+    def run(self):
+        backoff = RETRY_MIN_SEC
+        try:
+            while True:
+                if self.finishing.is_set() and self.deadline is not None and time.monotonic() > self.deadline:
+                    return
+                self.spool.seal_if_stale()
+                segments = self.spool.sealed()
+                if not segments:
+                    if self.finishing.is_set():
+                        return
+                    time.sleep(POLL_SEC)
+                    continue
+                try:
+                    if self.conn is None:
+                        self._connect()
+                    last_seq = self._last_seq()
+                    for seq, path in segments:
+                        self._drain_one(seq, path, last_seq)
+                    backoff = RETRY_MIN_SEC
+                except RETRYABLE as e:
+                    self.stats["retries"] += 1
+                    print(f"[spool {self.spool.name}] DB 오류, {backoff:.0f}s 후 재시도: {type(e).__name__}: {str(e).strip()[:200]}")
+                    # 끊긴 커넥션일 수 있으니 다음 시도는 새 커넥션으로
+                    try:
+                        self.conn.close()
+                    except Exception:
+                        pass
+                    self.conn = None
+                    # 백오프 중에 finish() 가 오면 깨어나고, 마감 시각을 넘겨 자지는 않는다
+                    if self.finishing.is_set():
+                        time.sleep(max(0.0, min(backoff, (self.deadline or 0.0) - time.monotonic())))
+                    else:
+                        self.finishing.wait(backoff)
+                    backoff = min(backoff * 2, RETRY_MAX_SEC)
+        except BaseException as e:
+            self.error = e
+        finally:
+            if self.conn is not None:
+                self.conn.close()
@@ -0,0 +1,44 @@
+"""ETL 파생 스테이지 공용 SQL 조각.
+
+백엔드(backend/src/domains/apt/apt.shared.ts)의 날짜 변환식과 같은 규칙을 써야
+미리 계산한 값과 API 가 직접 계산하던 값이 어긋나지 않는다.
+"""
+
+# 최근 구간(지도 / 최근 거래)의 기준 — 백엔드의 INTERVAL '3 months' 와 동일
+RECENT_WINDOW = "3 months"
+
+
+def deal_date_expr(alias: str) -> str:
+    """deal_ymd 가 'YYYYMMDD' 또는 'YYYYMM' 인 경우까지 안전하게 date 로 변환."""
+    return f"""
+  CASE
+    WHEN length({alias}.deal_ymd) = 8 THEN to_date({alias}.deal_ymd, 'YYYYMMDD')
+    WHEN length({alias}.deal_ymd) = 6 THEN to_date({alias}.deal_ymd || '01', 'YYYYMMDD')
+    ELSE NULL
+  END
+"""
+
+
+def window_start_expr() -> str:
+    return f"(CURRENT_DATE - INTERVAL '{RECENT_WINDOW}')"
+
+
+# 백엔드 rep_location 과 같은 대표 위치 규칙 (lawd_cd, apt_nm 별 최소 id)
+REP_LOCATION_CTE = """
+rep_location AS (
+  SELECT DISTINCT ON (lawd_cd, apt_nm)
+    lawd_cd, apt_nm, umd_nm, lat, lng, geohash
+  FROM apt_location
+  WHERE lat IS NOT NULL AND lng IS NOT NULL
+  ORDER BY lawd_cd, apt_nm, id
+)
+"""
+
+# 전월세 구분 (백엔드 rentType 필터와 동일)
+RENT_KIND_FILTER = """
+  (
+    k.kind = 'all'
+    OR (k.kind = 'jeonse' AND COALESCE(r.monthly_rent_manwon, 0) = 0)
+    OR (k.kind = 'monthly' AND COALESCE(r.monthly_rent_manwon, 0) > 0)
+  )
+"""
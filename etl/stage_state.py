@@ -0,0 +1,164 @@
+"""배치 스테이지 공용 상태(워터마크) 관리.
+
+apt_trade / apt_trade_rent 는 id 가 증가하는 append 위주 테이블이라,
+스테이지별로 "마지막으로 처리한 id" 만 저장해 두면 이번 실행에서
+새로 들어온 행(= 영향을 받은 단지)만 골라 재계산할 수 있다.
+merge 모드에서 UPDATE 된 행은 id 가 그대로이므로 etl_row_change 로그의 id 를
+같은 방식으로 따라간다.
+
+id 는 nextval 시점에 정해지고 커밋은 나중이라, MAX(id) 를 읽는 순간 더 작은 id 를 쥔
+쓰기 트랜잭션이 아직 진행 중일 수 있다 (그 행은 워터마크 아래로 늦게 커밋돼 영영 빠진다).
+그래서 max_id 는 MAX(id) 를 읽은 뒤 그 테이블에 쓰고 있던 트랜잭션이 모두 끝날 때까지
+기다렸다가 돌려준다. INSERT 는 nextval 전에 테이블 RowExclusiveLock 을 잡으므로
+그때 락을 쥔 트랜잭션만 기다리면 MAX(id) 이하의 id 는 모두 커밋(또는 롤백)된 상태가 된다.
+"""
+import os
+import time
+
+from merge_upsert import CHANGE_LOG_DDL
+
+# 진행 중인 쓰기 트랜잭션을 기다리는 최대 시간 (넘기면 스테이지 실패, 다음 실행에서 다시)
+WRITER_WAIT_SEC = float(os.environ.get("STAGE_WRITER_WAIT_SEC", "600"))
+WRITER_POLL_SEC = 0.2
+
+ENSURE_SQL = """
+CREATE TABLE IF NOT EXISTS etl_stage_state (
+  stage      text NOT NULL,
+  source     text NOT NULL,
+  last_id    bigint NOT NULL DEFAULT 0,
+  updated_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (stage, source)
+);
+"""
+
+GET_SQL = "SELECT last_id FROM etl_stage_state WHERE stage = %s AND source = %s;"
+
+LAST_RUN_SQL = "SELECT MIN(updated_at) FROM etl_stage_state WHERE stage = %s;"
+
+SET_SQL = """
+INSERT INTO etl_stage_state (stage, source, last_id)
+VALUES (%s, %s, %s)
+ON CONFLICT (stage, source)
+DO UPDATE SET last_id = EXCLUDED.last_id, updated_at = now();
+"""
+
+# source 는 코드 안의 상수(apt_trade / apt_trade_rent)만 받는다
+MAX_ID_SQL = "SELECT COALESCE(MAX(id), 0) FROM {source};"
+
+# MAX(id) 를 읽은 직후 source 에 쓰고 있는 (다른) 트랜잭션들
+WRITERS_SQL = """
+SELECT DISTINCT virtualtransaction
+FROM pg_locks
+WHERE locktype = 'relation'
+  AND relation = %s::regclass
+  AND mode = 'RowExclusiveLock'
+  AND granted
+  AND pid IS DISTINCT FROM pg_backend_pid();
+"""
+
+# 각 트랜잭션은 끝날 때까지 자기 virtualxid 락을 쥐고 있다
+RUNNING_SQL = """
+SELECT COUNT(*)
+FROM pg_locks
+WHERE locktype = 'virtualxid' AND virtualxid = ANY(%s);
+"""
+
+TOUCHED_COMPLEX_SQL = """
+SELECT DISTINCT lawd_cd, apt_nm
+FROM {source}
+WHERE id > %s AND id <= %s;
+"""
+
+SOURCES = ("apt_trade", "apt_trade_rent")
+CHANGE_SOURCE = "etl_row_change"
+
+TOUCHED_CHANGE_SQL = """
+SELECT DISTINCT lawd_cd, apt_nm
+FROM etl_row_change
+WHERE id > %s AND id <= %s;
+"""
+
+
+def ensure(conn):
+    with conn.cursor() as cur:
+        cur.execute(ENSURE_SQL)
+        cur.execute(CHANGE_LOG_DDL)
+    conn.commit()
+
+
+def get_last_id(conn, stage: str, source: str) -> int:
+    with conn.cursor() as cur:
+        cur.execute(GET_SQL, (stage, source))
+        row = cur.fetchone()
+    return int(row[0]) if row else 0
+
+
+def set_last_id(conn, stage: str, source: str, last_id: int):
+    """호출한 쪽 트랜잭션 안에서 갱신 (결과 테이블과 같이 커밋되도록)."""
+    with conn.cursor() as cur:
+        cur.execute(SET_SQL, (stage, source, last_id))
+
+
+def last_run_at(conn, stage: str):
+    """스테이지가 마지막으로 워터마크를 커밋한 시각 (처음이면 None)."""
+    with conn.cursor() as cur:
+        cur.execute(LAST_RUN_SQL, (stage,))
+        return cur.fetchone()[0]
+
+
+def _wait_writers(cur, source: str):
+    cur.execute(WRITERS_SQL, (source,))
+    vxids = [r[0] for r in cur.fetchall()]
+    if not vxids:
+        return
+    deadline = time.monotonic() + WRITER_WAIT_SEC
+    while True:
+        cur.execute(RUNNING_SQL, (vxids,))
+        running = cur.fetchone()[0]
+        if not running:
+            return
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{source} 쓰기 트랜잭션 {running}개가 {WRITER_WAIT_SEC:.0f}초 넘게 진행 중 (워터마크 보류)")
+        time.sleep(WRITER_POLL_SEC)
+
+
+def max_id(conn, source: str) -> int:
+    """워터마크로 써도 안전한 MAX(id): 이 값 이하의 id 는 더 이상 새로 커밋되지 않는다."""
+    assert source in SOURCES or source == CHANGE_SOURCE, source
+    with conn.cursor() as cur:
+        cur.execute(MAX_ID_SQL.format(source=source))
+        until_id = int(cur.fetchone()[0])
+        _wait_writers(cur, source)
+    return until_id
+
+
+def touched_complexes(conn, source: str, since_id: int, until_id: int) -> set[tuple[str, str]]:
+    """(since_id, until_id] 구간에 들어온 행의 (lawd_cd, apt_nm) 집합."""
+    if source == CHANGE_SOURCE:
+        sql = TOUCHED_CHANGE_SQL
+    else:
+        assert source in SOURCES, source
+        sql = TOUCHED_COMPLEX_SQL.format(source=source)
+    with conn.cursor() as cur:
+        cur.execute(sql, (since_id, until_id))
+        return {(r[0], r[1]) for r in cur.fetchall()}
+
+
+def pending(conn, stage: str, full: bool = False):
+    """스테이지가 처리해야 할 단지와, 커밋 시 기록할 워터마크를 함께 돌려준다.
+
+    반환: (complexes, {source: until_id})
+    """
+    marks = {}
+    complexes: set[tuple[str, str]] = set()
+    for source in SOURCES + (CHANGE_SOURCE,):
+        until_id = max_id(conn, source)
+        since_id = 0 if full else get_last_id(conn, stage, source)
+        complexes |= touched_complexes(conn, source, since_id, until_id)
+        marks[source] = until_id
+    return complexes, marks
+
+
+def commit_marks(conn, stage: str, marks: dict):
+    for source, until_id in marks.items():
+        set_last_id(conn, stage, source, until_id)
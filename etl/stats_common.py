@@ -0,0 +1,75 @@
+"""NumPy 기반 그룹 통계 유틸 (단지 × 면적대 × 월).
+
+파이썬 루프 없이 정렬 + bincount 로 그룹별 합계/분위수를 구한다.
+"""
+import numpy as np
+
+# 1평 = 3.305785㎡
+PYEONG_M2 = 3.305785
+
+# 전용면적 구간(㎡): 소형 / 중소형 / 국민평형 / 중대형 / 대형
+# bucket 번호 = 구간 인덱스, 면적이 없으면 -1
+AREA_BUCKET_EDGES = np.array([40.0, 60.0, 85.0, 102.0, 135.0])
+AREA_BUCKET_LABELS = ["~40", "40~60", "60~85", "85~102", "102~135", "135~"]
+
+
+def area_bucket(exclu_use_ar: np.ndarray) -> np.ndarray:
+    ar = np.asarray(exclu_use_ar, dtype=np.float64)
+    out = np.searchsorted(AREA_BUCKET_EDGES, ar, side="right").astype(np.int16)
+    out[~np.isfinite(ar)] = -1
+    return out
+
+
+def ym_to_index(ym: np.ndarray) -> np.ndarray:
+    """'YYYYMM' 문자열 배열 -> year*12 + (month-1) 정수."""
+    v = np.asarray(ym).astype("U6").astype(np.int64)
+    return (v // 100) * 12 + (v % 100) - 1
+
+
+def index_to_ym(idx: np.ndarray) -> list[str]:
+    idx = np.asarray(idx, dtype=np.int64)
+    return [f"{y:04d}{m:02d}" for y, m in zip(idx // 12, idx % 12 + 1)]
+
+
+def encode(values) -> tuple[np.ndarray, np.ndarray]:
+    """임의 값 배열 -> (고유값, 정수 코드)."""
+    uniq, inv = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return uniq, inv.astype(np.int64)
+
+
+def combine_keys(*parts: np.ndarray, sizes: list[int]) -> np.ndarray:
+    """여러 개의 0 이상 정수 코드를 하나의 int64 키로 합친다 (mixed radix)."""
+    key = np.zeros(len(parts[0]), dtype=np.int64)
+    for p, size in zip(parts, sizes):
+        key = key * size + np.asarray(p, dtype=np.int64)
+    return key
+
+
+def group_sum(inv: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    return np.bincount(inv, weights=values, minlength=n_groups)
+
+
+def group_count(inv: np.ndarray, n_groups: int) -> np.ndarray:
+    return np.bincount(inv, minlength=n_groups)
+
+
+def group_quantiles(inv: np.ndarray, values: np.ndarray, n_groups: int, qs) -> np.ndarray:
+    """그룹별 분위수 (선형 보간, numpy.percentile 'linear' 와 동일).
+
+    반환 shape = (n_groups, len(qs)), 값이 없는 그룹은 NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    order = np.lexsort((values, inv))
+    sv = values[order]
+
+    counts = np.bincount(inv, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    out = np.full((n_groups, len(qs)), np.nan)
+    has = counts > 0
+    for j, q in enumerate(qs):
+        pos = starts[has] + q * (counts[has] - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        frac = pos - lo
+        out[has, j] = sv[lo] * (1 - frac) + sv[hi] * frac
+    return out
@@ -0,0 +1,5 @@
+# etl 스크립트는 서로를 최상위 모듈로 import 한다 (python etl/xxx.py 로 실행)
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
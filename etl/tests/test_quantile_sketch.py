@@ -0,0 +1,57 @@
+"""quantile_sketch 직렬화 / 병합 (백엔드 chart/quantile-sketch.ts 와 같은 형식)."""
+import numpy as np
+
+import quantile_sketch as qs
+
+# 백엔드 quantile-sketch.spec.ts 가 같은 바이트를 디코드한다 (형식이 바뀌면 양쪽을 같이 고칠 것)
+GOLDEN_A = "010401006ece0306010100000001"  # [0, 100, 103, 110]
+GOLDEN_B = "0103006278cc030b0101000000000000000001"  # [101, 120, 98]
+GOLDEN_MERGED = "0107010078cc030b0102010000000100000001"
+
+
+def test_golden_bytes():
+    a = qs.Sketch.from_values([0, 100, 103, 110])
+    b = qs.Sketch.from_values([101, 120, 98])
+    assert a.to_bytes().hex() == GOLDEN_A
+    assert b.to_bytes().hex() == GOLDEN_B
+    merged = qs.merge_all([bytes.fromhex(GOLDEN_A), bytes.fromhex(GOLDEN_B)])
+    assert merged.to_bytes().hex() == GOLDEN_MERGED
+    assert merged.quantile(0) == 0.0
+    assert merged.quantile(1) == 120.0
+    assert abs(merged.quantile(0.5) - 100.49456770856492) < 1e-9
+
+
+def test_round_trip():
+    rng = np.random.default_rng(7)
+    values = np.concatenate([np.zeros(5), rng.lognormal(10, 1.5, 500)])
+    s = qs.Sketch.from_values(values)
+    back = qs.Sketch.from_bytes(s.to_bytes())
+    assert (back.n, back.zero, back.vmin, back.vmax, back.kmin) == (s.n, s.zero, s.vmin, s.vmax, s.kmin)
+    assert np.array_equal(back.counts, s.counts)
+    assert back.to_bytes() == s.to_bytes()
+
+
+def test_round_trip_empty_and_negative_kmin():
+    assert qs.Sketch.from_bytes(qs.Sketch().to_bytes()).n == 0
+    # 값은 정수로 반올림되므로 kmin 음수는 직접 만든다 (zigzag)
+    s = qs.Sketch(n=2, vmin=1, vmax=1, kmin=-3, counts=np.array([1, 1], dtype=np.int64))
+    assert qs.Sketch.from_bytes(s.to_bytes()).kmin == -3
+
+
+def test_merged_quantiles_within_alpha():
+    rng = np.random.default_rng(42)
+    chunks = [np.rint(rng.lognormal(9 + i * 0.1, 0.6, 200 + 37 * i)) for i in range(12)]
+    chunks.append(np.zeros(30))
+    merged = qs.merge_all(qs.Sketch.from_values(c).to_bytes() for c in chunks)
+
+    exact = np.sort(np.concatenate(chunks))
+    assert merged.n == len(exact)
+    # 병합은 순서와 무관하고 한 번에 만든 스케치와 같다
+    assert merged.to_bytes() == qs.Sketch.from_values(exact).to_bytes()
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+        want = exact[int(q * (len(exact) - 1))]
+        got = merged.quantile(q)
+        if want == 0:
+            assert got == 0.0
+        else:
+            assert abs(got - want) <= qs.ALPHA * want + 1e-9, (q, got, want)
@@ -0,0 +1,56 @@
+"""row_fp.fingerprint 직렬화 (sql_expr 와 같은 규칙이어야 한다)."""
+import hashlib
+import re
+import uuid
+from decimal import Decimal
+
+import row_fp
+
+TRADE = {
+    "lawd_cd": "50110", "umd_nm": "연동", "apt_nm": "한라", "deal_year": 2024, "deal_month": 3,
+    "deal_day": 7, "deal_amount_manwon": 55000, "jibun": "123-4", "exclu_use_ar": Decimal("84.9"),
+    "floor": 5, "apt_dong": None,
+}
+
+
+def _md5_uuid(raw: str) -> str:
+    return str(uuid.UUID(bytes=hashlib.md5(raw.encode("utf-8")).digest()))
+
+
+def test_fingerprint_format():
+    # 면적은 numeric round(x, 4)::text 처럼 소수 4자리, NULL 은 \N, 구분자 chr(31)
+    raw = "\x1f".join(["50110", "연동", "한라", "2024", "3", "7", "55000", "123-4", "84.9000", "5", "\\N"])
+    assert row_fp.fingerprint("apt_trade", TRADE) == _md5_uuid(raw)
+
+
+def test_decimal_formatting():
+    fps = {
+        row_fp.fingerprint("apt_trade", {**TRADE, "exclu_use_ar": v})
+        for v in (Decimal("84.9"), Decimal("84.90000"), "84.9", 84.9, Decimal("84.90004"))
+    }
+    assert len(fps) == 1
+    assert row_fp._fmt("exclu_use_ar", Decimal("59.99995")) == "60.0000"
+    assert row_fp._fmt("exclu_use_ar", Decimal("59.99994")) == "59.9999"
+    assert row_fp._fmt("exclu_use_ar", 0) == "0.0000"
+
+
+def test_null_is_not_empty():
+    a = row_fp.fingerprint("apt_trade", {**TRADE, "jibun": None})
+    b = row_fp.fingerprint("apt_trade", {**TRADE, "jibun": ""})
+    assert a != b
+    assert row_fp._fmt("jibun", None) == row_fp.NULL_TOKEN == "\\N"
+    # 빠진 키도 NULL
+    c = row_fp.fingerprint("apt_trade", {k: v for k, v in TRADE.items() if k != "jibun"})
+    assert a == c
+
+
+def test_sql_expr_matches_python_rules():
+    for table, cols in row_fp.FP_COLUMNS.items():
+        sql = row_fp.sql_expr(table, "t")
+        # 같은 컬럼 순서, 같은 구분자 / NULL 표기 / 면적 반올림
+        assert re.findall(r"\(t\.(\w+)\)", sql) == cols
+        assert sql.count("chr(31)") == len(cols) - 1 and row_fp.SEP == chr(31)
+        assert sql.count(f"'{row_fp.NULL_TOKEN}'") == len(cols)
+        for c in row_fp.DECIMAL_COLUMNS & set(cols):
+            assert f"round((t.{c})::numeric, 4)::text" in sql
+        assert sql.startswith("md5(") and sql.endswith(")::uuid")
@@ -0,0 +1,69 @@
+"""spool._recover: 비정상 종료로 남은 .open 세그먼트에서 온전한 레코드만 살린다."""
+import gzip
+import zlib
+
+import pytest
+
+import spool
+
+
+def _records(s: spool.Spool) -> list[dict]:
+    out = []
+    for _, path in s.sealed():
+        out.extend(spool.read_segment(path))
+    return out
+
+
+def _open_segment(d, lines: list[bytes], keep_last: float = 1.0):
+    """Z_SYNC_FLUSH 로 레코드마다 비운 gzip (닫지 않은 상태). 마지막 레코드의 압축 바이트는 keep_last 비율만 남긴다."""
+    comp = zlib.compressobj(5, zlib.DEFLATED, 31)
+    chunks = [comp.compress(line) + comp.flush(zlib.Z_SYNC_FLUSH) for line in lines]
+    chunks[-1] = chunks[-1][:int(len(chunks[-1]) * keep_last)]
+    d.mkdir(parents=True, exist_ok=True)
+    (d / "seg-000000000001.open").write_bytes(b"".join(chunks))
+
+
+def test_recover_unclosed_segment(tmp_path):
+    s = spool.Spool("t", root=tmp_path)
+    for i in range(5):
+        s.append("items", [{"i": i}])
+    # 죽은 것처럼: 봉인/close 없이 락만 놓는다
+    s._lock_file.close()
+    assert list((tmp_path / "t").glob("*.open"))
+
+    s2 = spool.Spool("t", root=tmp_path)
+    assert [r["data"][0]["i"] for r in _records(s2)] == [0, 1, 2, 3, 4]
+    assert not list((tmp_path / "t").glob("*.open"))
+    # 다음 세그먼트 번호는 복구된 것 뒤로
+    assert s2.append("items", []) == 2
+    s2.close()
+
+
+@pytest.mark.parametrize("keep_last", [0.0, 0.3, 0.6])
+def test_recover_truncated_segment(tmp_path, keep_last):
+    lines = [spool._encode({"kind": "items", "data": [{"i": i}]}) for i in range(4)]
+    # 마지막 레코드는 압축 바이트 중간에서 잘린다
+    _open_segment(tmp_path / "t", lines, keep_last=keep_last)
+
+    s = spool.Spool("t", root=tmp_path)
+    got = [r["data"][0]["i"] for r in _records(s)]
+    assert got == [0, 1, 2]
+    s.close()
+
+
+def test_recover_partial_line(tmp_path):
+    good = [spool._encode({"kind": "page", "data": {"p": i}}) for i in range(2)]
+    _open_segment(tmp_path / "t", good + [good[0][:10]])
+
+    s = spool.Spool("t", root=tmp_path)
+    assert [r["data"]["p"] for r in _records(s)] == [0, 1]
+    s.close()
+
+
+def test_sealed_segment_truncation_is_corrupt(tmp_path):
+    path = tmp_path / "seg.seg"
+    with gzip.open(path, "wb") as f:
+        f.write(spool._encode({"kind": "items", "data": []}))
+    path.write_bytes(path.read_bytes()[:-5])
+    with pytest.raises(spool.SpoolCorrupt):
+        list(spool.read_segment(path))
@@ -37,7 +37,7 @@ export default function SidebarMain({
         <RecentTrades3Months selectedApt={selectedApt} dealMode={dealMode} onOpenMore={onOpenTradePanel} />
 
         <UnitTypeInfo />
-        <PredictiveLease />
+        <PredictiveLease selectedApt={selectedApt} />
         <TaxLoanSection />
         <AssetManagement />
       </div>
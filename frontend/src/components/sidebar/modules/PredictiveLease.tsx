@@ -1,10 +1,117 @@
-export default function PredictiveLease() {
+"use client";
+
+import { useEffect, useState } from "react";
+import type { SelectedApt } from "@/app/page";
+
+type Band = { value: number; low: number; high: number }; // 만원
+type PredictionItem = {
+  areaBucket: number;
+  rentType: "jeonse" | "monthly";
+  areaM2: number | null;
+  deposit: Band | null;
+  monthly: Band | null;
+  nObs: number;
+  asOfYm: string;
+};
+
+function formatKoreanMoneyManwon(v: number) {
+  if (!Number.isFinite(v)) return "-";
+  const eok = Math.floor(v / 10000);
+  const rest = v % 10000;
+  if (eok <= 0) return `${v.toLocaleString()}만`;
+  if (rest === 0) return `${eok}억`;
+  const dec = Math.round((rest / 10000) * 10) / 10;
+  const val = (eok + dec).toFixed(dec % 1 === 0 ? 0 : 1);
+  return `${val}억`;
+}
+
+function bandText(b: Band) {
+  return `${formatKoreanMoneyManwon(b.low)} ~ ${formatKoreanMoneyManwon(b.high)}`;
+}
+
+export default function PredictiveLease({ selectedApt }: { selectedApt: SelectedApt | null }) {
+  const [items, setItems] = useState<PredictionItem[]>([]);
+  const [loading, setLoading] = useState(false);
+
+  useEffect(() => {
+    let alive = true;
+
+    async function run() {
+      if (!selectedApt) {
+        setItems([]);
+        return;
+      }
+      setLoading(true);
+
+      const qs = new URLSearchParams({
+        lawdCd: selectedApt.lawdCd,
+        aptNm: selectedApt.aptNm,
+      });
+
+      try {
+        const res = await fetch(`http://localhost:4000/api/map/apt/rent-prediction?${qs.toString()}`, {
+          cache: "no-store",
+        });
+        const json = await res.json();
+        if (!alive) return;
+        setItems(json?.ok ? (json.items as PredictionItem[]) : []);
+      } catch {
+        if (alive) setItems([]);
+      } finally {
+        if (alive) setLoading(false);
+      }
+    }
+
+    run();
+    return () => {
+      alive = false;
+    };
+  }, [selectedApt]);
+
   return (
     <section className="px-5 py-6">
-      <div className="text-[12px] font-bold text-gray-900">전월세 예측</div>
-      <div className="mt-2 text-[12px] text-gray-400">
-        (추후 예측 값/그래프)
+      <div className="flex items-center justify-between">
+        <div className="text-[12px] font-bold text-gray-900">전월세 예측</div>
+        <div className="text-[11px] text-gray-400">
+          {loading ? "로딩…" : items[0] ? `${items[0].asOfYm} 기준` : ""}
+        </div>
       </div>
+
+      {items.length === 0 ? (
+        <div className="mt-2 text-[12px] text-gray-400">
+          {selectedApt ? "예측 데이터 없음" : "단지를 선택하면 예상 보증금/월세가 표시됩니다"}
+        </div>
+      ) : (
+        <div className="mt-3 space-y-2">
+          {items.map((it) => (
+            <div
+              key={`${it.areaBucket}-${it.rentType}`}
+              className="flex items-start justify-between rounded-lg border border-gray-100 px-3 py-2"
+            >
+              <div className="text-[12px] text-gray-700">
+                <span className="font-bold">{it.rentType === "jeonse" ? "전세" : "월세"}</span>
+                <span className="ml-1 text-gray-400">{it.areaM2 !== null ? `${it.areaM2}㎡` : ""}</span>
+              </div>
+              <div className="text-right">
+                {it.deposit && (
+                  <div className="text-[12px] font-bold text-gray-900">
+                    {formatKoreanMoneyManwon(it.deposit.value)}
+                    {it.monthly && ` / ${it.monthly.value.toLocaleString()}만`}
+                  </div>
+                )}
+                <div className="text-[11px] text-gray-400">
+                  {it.rentType === "monthly" && it.monthly
+                    ? `월세 ${it.monthly.low.toLocaleString()}~${it.monthly.high.toLocaleString()}만`
+                    : it.deposit
+                      ? bandText(it.deposit)
+                      : ""}
+                  {` · ${it.nObs}건`}
+                </div>
+              </div>
+            </div>
+          ))}
+        </div>
+      )}
       <div className="mt-5 h-px bg-gray-100" />
     </section>
   );